@@ -13,9 +13,12 @@ import sys
 import threading, webbrowser
 # Import the refactored agent runner
 from src.mcp_client_cli.agent_runner import AgentRunner
+from src.mcp_client_cli.cancellation import CancellationToken
+from src.mcp_client_cli.config import config_service
 from src.secure_config import secure_config
-from src.scheduler import bootstrap as scheduler_bootstrap
+from src.scheduler import bootstrap as scheduler_bootstrap, finish_run, housekeeping
 from src.tasks_routes import tasks_bp
+from src.run_queue import run_queue, PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED
 
 load_dotenv()  # Load environment variables from .env
 
@@ -92,11 +95,26 @@ if ENABLE_GOOGLE_OAUTH:
 
 # Dictionary to hold session-specific queues for SSE
 session_queues: dict[str, Queue] = {}
-# Dictionary to hold references to agent background tasks
-agent_tasks: dict[str, threading.Thread] = {}
-
-def run_async_in_thread(loop, coro):
-    asyncio.set_event_loop(loop)
+# Agent runs are admitted through run_queue (global concurrency limit, fair per user)
+# Overall time budget for one agent run, counted from when it starts executing
+RUN_DEADLINE_SECONDS = float(os.getenv("AGENT_RUN_DEADLINE", "600"))
+# Interactive runs are cancelled once no /stream client has been connected for this long
+STREAM_DISCONNECT_GRACE = float(os.getenv("STREAM_DISCONNECT_GRACE", "30"))
+stream_subscribers: dict[str, int] = {}
+stream_subscribers_lock = threading.Lock()
+
+_worker_loops = threading.local()
+
+def run_async_in_thread(coro):
+    """Run a coroutine on this thread's event loop, created on first use and kept.
+
+    Run queue workers are long-lived, so resources bound to a loop (such as the
+    shared conversations.db connection) survive from one run to the next.
+    """
+    loop = getattr(_worker_loops, "loop", None)
+    if loop is None:
+        loop = _worker_loops.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
     loop.run_until_complete(coro)
 
 # def sse_with_error_handling(fn):
@@ -142,6 +160,10 @@ def send_message():
     data = request.json
     user_message = data.get('message')
     session_id = data.get('session_id')
+    task_run_id = data.get('task_run_id')  # Set when fired by the scheduler
+    cache_responses = bool(data.get('cache_responses'))  # Task opted in to cached model responses
+    # A fresh thread per fire: the session's growing history would make every request unique
+    thread_id = f"task:{data.get('task_id')}:{task_run_id}" if task_run_id and cache_responses else None
 
     if not user_message or not session_id:
         return jsonify({"error": "Message or session_id missing"}), 400
@@ -155,8 +177,8 @@ def send_message():
 
     output_queue = session_queues[session_id]
     
-    # Check if an agent task is already running for this session
-    if session_id in agent_tasks and agent_tasks[session_id].is_alive():
+    # Check if an agent run is already queued or running for this session
+    if run_queue.is_busy(session_id):
          return jsonify({"error": "Agent is currently busy. Please wait."}), 429 
         
     print(f"[App {session_id}] Received message: {user_message}")
@@ -165,17 +187,69 @@ def send_message():
     # This ensures config is loaded relatively fresh and toolkits are managed per run
     agent_runner = AgentRunner(output_queue=output_queue)
 
-    # Run the agent logic in a separate thread to avoid blocking Flask
-    new_loop = asyncio.new_event_loop()
-    # Assuming the web UI doesn't need complex continuation logic like the CLI 'c' prefix yet
-    # Pass is_continuation=False for now. This could be enhanced later.
-    agent_coro = agent_runner.run(user_message, session_id, is_continuation=False)
-    
-    thread = threading.Thread(target=run_async_in_thread, args=(new_loop, agent_coro), daemon=True)
-    agent_tasks[session_id] = thread
-    thread.start()
-
-    return jsonify({"status": "Message received, processing started"})
+    on_finish = None
+    if task_run_id:
+        on_finish = lambda result: finish_run(task_run_id, **result)
+
+    cancel_token = CancellationToken(timeout=RUN_DEADLINE_SECONDS)
+    started = threading.Event()
+
+    def cancel_run():
+        cancel_token.cancel("cancelled")
+        if not started.is_set() and on_finish:
+            # Dropped from the queue; the agent will never report back
+            on_finish({"status": "cancelled", "output": "cancelled before start"})
+
+    def run_agent():
+        started.set()
+        # Run the agent logic on its own event loop in the run queue's worker thread
+        # Assuming the web UI doesn't need complex continuation logic like the CLI 'c' prefix yet
+        # Pass is_continuation=False for now. This could be enhanced later.
+        agent_coro = agent_runner.run(user_message, session_id, is_continuation=False,
+                                      on_finish=on_finish, cancel_token=cancel_token,
+                                      cache_responses=cache_responses, thread_id=thread_id)
+        run_async_in_thread(agent_coro)
+
+    # Scheduled tasks post as their session; fair queuing is per logged-in user when available
+    if ENABLE_GOOGLE_OAUTH and current_user.is_authenticated:
+        user_id = current_user.id
+    else:
+        user_id = session_id
+    priority = PRIORITY_SCHEDULED if task_run_id else PRIORITY_INTERACTIVE
+    position = run_queue.submit(session_id, user_id, run_agent, notify=output_queue.put, priority=priority,
+                                cancel=cancel_run)
+
+    return jsonify({"status": "Message received, processing started", "queue_position": position})
+
+def _cancel_run(session_id: str, priority: int | None = None, reason: str = "Cancelled") -> str | None:
+    state = run_queue.cancel(session_id, priority=priority)
+    if state == "queued" and session_id in session_queues:
+        # The run never started, so nothing else will close the stream
+        session_queues[session_id].put({"type": "status", "content": reason, "session_id": session_id})
+        session_queues[session_id].put(None)
+    return state
+
+@app.route('/cancel/<session_id>', methods=['POST'])
+@login_required
+def cancel(session_id):
+    # Only the browser session that owns the run may cancel it; like the task
+    # routes, other sessions are told there is nothing to find
+    if session.get("session_id") != session_id:
+        return jsonify({"error": "No run in progress for this session"}), 404
+    state = _cancel_run(session_id)
+    if state is None:
+        return jsonify({"error": "No run in progress for this session"}), 404
+    print(f"[App {session_id}] Cancelled {state} run")
+    return jsonify({"status": "cancelled", "state": state})
+
+def _cancel_if_abandoned(session_id: str):
+    with stream_subscribers_lock:
+        if stream_subscribers.get(session_id, 0) > 0:
+            return
+    # Scheduled runs have no subscriber by design; only interactive runs are abandoned
+    state = _cancel_run(session_id, priority=PRIORITY_INTERACTIVE, reason="Cancelled: client disconnected")
+    if state:
+        print(f"[Stream {session_id}] No subscribers for {STREAM_DISCONNECT_GRACE:.0f}s; cancelled {state} run")
 
 # --- Placeholder for Tool Confirmation Route ---
 # @app.route('/confirm_tool', methods=['POST'])
@@ -204,6 +278,8 @@ def stream(session_id):
     
     def event_stream():
         q = session_queues[session_id]
+        with stream_subscribers_lock:
+            stream_subscribers[session_id] = stream_subscribers.get(session_id, 0) + 1
         try:
             while True:
                 try:
@@ -211,8 +287,6 @@ def stream(session_id):
                     if item is None: # End signal
                         print(f"[Stream {session_id}] End signal received.")
                         yield f"data: {json.dumps({'type': 'status', 'content': 'Finished', 'session_id': session_id})}\n\n"
-                        if session_id in agent_tasks:
-                            del agent_tasks[session_id]
                         break
                     print(f"[Stream {session_id}] Yielding: {item}")
                     # Ensure the item is intended for this session (it should be by design here)
@@ -224,7 +298,7 @@ def stream(session_id):
                     # Timeout reached, send keep-alive comment or just continue loop
                     yield ": keepalive\n\n"
                     # Check if the agent task is still alive (optional)
-                    # if session_id in agent_tasks and not agent_tasks[session_id].is_alive():
+                    # if not run_queue.is_busy(session_id):
                     #     print(f"[Stream {session_id}] Agent task finished unexpectedly.")
                     #     break
         except GeneratorExit:
@@ -237,6 +311,11 @@ def stream(session_id):
             # Always send a final Finished status to close client spinner
             yield f"data: {json.dumps({'type': 'status', 'content': 'Finished', 'session_id': session_id})}\n\n"
             print(f"[Stream {session_id}] Cleaning up queue.")
+            with stream_subscribers_lock:
+                stream_subscribers[session_id] -= 1
+                abandoned = stream_subscribers[session_id] == 0
+            if abandoned and run_queue.is_busy(session_id):
+                threading.Timer(STREAM_DISCONNECT_GRACE, _cancel_if_abandoned, args=[session_id]).start()
 
     return Response(event_stream(), mimetype='text/event-stream')
 
@@ -280,13 +359,12 @@ def save_telegram_creds():
 # --- Settings API endpoints ---
 @app.route('/api/settings', methods=['GET'])
 def get_settings():
-    config_path = os.path.join(os.path.dirname(__file__), 'mcp-server-config.json')
     try:
-        with open(config_path) as f:
-            config = json.load(f)
-        vault_args = config.get('mcpServers', {}).get('obsidian', {}).get('args', [])
+        config = config_service.current()
+        obsidian = config.mcp_servers.get('obsidian')
+        vault_args = obsidian.args if obsidian else []
         vault_path = vault_args[-1] if vault_args else ''
-        model = config.get('llm', {}).get('model', '')
+        model = config.llm.model
         openai_api_key = os.getenv('OPENAI_API_KEY', '')
         return jsonify({'vault_path': vault_path, 'model': model, 'openai_api_key': openai_api_key})
     except Exception as e:
@@ -312,12 +390,38 @@ def update_settings():
         # override runtime API key
         os.environ['OPENAI_API_KEY'] = openai_api_key or ''
         os.environ['LLM_API_KEY'] = openai_api_key or ''
+        # Publish the new settings now rather than on the next file-watch event;
+        # forced because the API key is read from the environment at parse time
+        config_service.reload(force=True)
         return jsonify({'status': 'ok'})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/llm_stats', methods=['GET'])
+@login_required
+def llm_stats():
+    """First-chunk latency, hedging outcomes and rate limiter state (incl. queue wait) per model."""
+    from src.mcp_client_cli.rate_limit import limiter_stats
+    from src.mcp_client_cli.routing import latency_stats
+    return jsonify({'models': latency_stats.snapshot(), 'rate_limits': limiter_stats()})
+
+# Parse the config once and pick up edits to it while running
+config_service.watch()
+
 # --- Register scheduler and tasks blueprint ---
 scheduler_bootstrap(app)
+
+def consolidate_memories_job():
+    from src.mcp_client_cli.consolidation import consolidate_memories
+    try:
+        asyncio.run(consolidate_memories())
+    except Exception as e:
+        print(f"Memory consolidation failed: {e}")
+
+from src.mcp_client_cli.const import MEMORY_CONSOLIDATE_INTERVAL
+if MEMORY_CONSOLIDATE_INTERVAL > 0:
+    housekeeping.add_job(consolidate_memories_job, "interval", seconds=MEMORY_CONSOLIDATE_INTERVAL,
+                         id="consolidate_memories", replace_existing=True)
 app.register_blueprint(tasks_bp, url_prefix='/api')
 
 @app.route('/scheduler')
@@ -0,0 +1,295 @@
+"""End-to-end latency of one agent turn, offline.
+
+Runs full turns through the web runner (`AgentRunner.run`) and the CLI
+(`cli.handle_conversation`) against local stand-ins for the expensive parts:
+
+- `fake_mcp_server.py`, a stdio MCP server with `--tools` tools that take
+  `--tool-latency` seconds and return `--payload` bytes,
+- `FakeChatModel`, which asks for `--tool-calls` tool calls and then streams
+  `--tokens` tokens after `--first-token-latency` seconds.
+
+Everything else is the real code path: MCP session start-up and tool
+conversion, the shared SQLite storage, memory retrieval, graph construction,
+checkpointing and event streaming. Each turn is timed as a whole and split into
+phases; what no phase accounts for is framework overhead. With a warm tool
+cache the MCP session is started by the first tool call, so `tool_calls`
+includes server start-up. `--allocations` traces Python allocations (which
+slows the turn down, so compare timings from runs without it).
+
+    python benchmarks/agent_turn.py --turns 20 --tools 30 --tool-calls 2
+    python benchmarks/agent_turn.py --path web --allocations --json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import inspect
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from queue import Queue
+
+ROOT = Path(__file__).resolve().parent
+sys.path.insert(0, str(ROOT.parent / "src"))
+sys.path.insert(0, str(ROOT))
+
+PHASES = ("load_tools", "storage", "memories", "build_agent", "model", "tool_calls", "close_tools")
+
+
+class Turn:
+    """Timings collected while one turn runs."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = defaultdict(float)
+        self.first_token = None
+        self.model_first_token = None
+        self.finished = None
+
+    def saw_token(self) -> None:
+        if self.first_token is None:
+            self.first_token = time.perf_counter()
+
+    def on_model_event(self, kind: str, value: float) -> None:
+        if kind == "call":
+            self.phases["model"] += value
+        elif kind == "first_token" and self.model_first_token is None:
+            self.model_first_token = value
+
+
+current: Turn = None
+
+
+def timed(owner, attr: str, phase: str) -> None:
+    """Replace `owner.attr` with a wrapper adding its duration to `phase` of the current turn."""
+    original = getattr(owner, attr)
+
+    def record(started):
+        if current is not None:
+            current.phases[phase] += time.perf_counter() - started
+
+    if inspect.iscoroutinefunction(original):
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await original(*args, **kwargs)
+            finally:
+                record(started)
+    else:
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                record(started)
+    setattr(owner, attr, wrapper)
+
+
+class TimestampQueue(Queue):
+    """The web runner's output queue, noting when the first answer chunk arrives."""
+
+    def put(self, item, block=True, timeout=None):
+        if current is not None and item and item.get("type") == "message_chunk":
+            current.saw_token()
+        super().put(item, block, timeout)
+
+
+def write_config(directory: Path, args: argparse.Namespace) -> None:
+    server = [sys.executable, str(ROOT / "fake_mcp_server.py"), "--tools", str(args.tools),
+              "--latency", str(args.tool_latency), "--payload", str(args.payload)]
+    config = {
+        "systemPrompt": "You are a benchmark assistant. Today is {today_datetime}. Memories:\n{memories}",
+        "llm": {"provider": "fake", "model": "scripted"},
+        "mcpServers": {f"bench{i}": {"command": server[0], "args": server[1:]}
+                       for i in range(args.servers)},
+    }
+    (directory / "mcp-server-config.json").write_text(json.dumps(config, indent=2))
+
+
+def instrument(args: argparse.Namespace) -> None:
+    """Swap in the fake model and wrap the phases of a turn with timers."""
+    import langgraph.prebuilt
+    from fake_chat_model import FakeChatModel
+    from mcp_client_cli import agent_runner, cli, prompt_builder
+    from mcp_client_cli.output import OutputHandler
+    from mcp_client_cli.storage import Storage
+    from mcp_client_cli.tool import McpTool, McpToolkit
+
+    def fake_model(*_args, **_kwargs):
+        return FakeChatModel(
+            tool_calls=args.tool_calls, tokens=args.tokens,
+            first_token_latency=args.first_token_latency, token_latency=args.token_latency,
+            on_event=lambda kind, value: current and current.on_model_event(kind, value))
+
+    agent_runner.init_chat_model = fake_model
+    cli.create_model = fake_model
+
+    timed(agent_runner.AgentRunner, "_load_tools", "load_tools")
+    timed(cli, "load_tools", "load_tools")
+    timed(Storage, "shared", "storage")
+    timed(agent_runner, "prompt_memories", "memories")
+    timed(prompt_builder, "prompt_memories", "memories")
+    timed(agent_runner, "create_react_agent", "build_agent")
+    timed(langgraph.prebuilt, "create_react_agent", "build_agent")
+    timed(McpTool, "_arun", "tool_calls")
+    timed(McpToolkit, "close", "close_tools")
+
+    update = OutputHandler.update
+
+    def update_and_note_token(self, chunk):
+        # ("messages", (AIMessageChunk, metadata)) chunks carry the streamed answer
+        if current is not None and isinstance(chunk, tuple) and chunk[0] == "messages":
+            message = chunk[1][0]
+            if type(message).__name__ == "AIMessageChunk" and message.content:
+                current.saw_token()
+        return update(self, chunk)
+
+    OutputHandler.update = update_and_note_token
+
+
+async def web_turn(query: str) -> None:
+    from mcp_client_cli.agent_runner import AgentRunner
+
+    queue = TimestampQueue()
+    await AgentRunner(queue).run(query, session_id=uuid.uuid4().hex)
+    events = []
+    while not queue.empty():
+        events.append(queue.get())
+    errors = [e["content"] for e in events if e and e.get("type") == "error"]
+    if errors:
+        raise RuntimeError(errors[0])
+
+
+async def cli_turn(query: str) -> None:
+    from langchain_core.messages import HumanMessage
+    from mcp_client_cli import cli
+    from mcp_client_cli.config import config_service
+
+    args = argparse.Namespace(no_tools=False, force_refresh=False, model=None, text_only=True,
+                              no_intermediates=False, no_confirmations=True, show_usage=False)
+    await cli.handle_conversation(args, HumanMessage(content=query), False, config_service.current())
+
+
+def summarize(samples: list) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"p50_ms": round(pick(0.5), 2), "p99_ms": round(pick(0.99), 2),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 2)}
+
+
+async def run_path(path: str, args: argparse.Namespace) -> dict:
+    global current
+    from mcp_client_cli.storage import Storage
+
+    turn_fn = web_turn if path == "web" else cli_turn
+    turns, peaks, snapshots = [], [], []
+    try:
+        for i in range(args.warmup + args.turns):
+            measured = i >= args.warmup
+            if args.allocations and measured:
+                tracemalloc.reset_peak()
+                if i == args.warmup + args.turns - 1:
+                    snapshots.append(tracemalloc.take_snapshot())
+            current = Turn()
+            # Both paths print every event; keep the terminal quiet
+            with open(os.devnull, "w") as sink, contextlib.redirect_stdout(sink):
+                await turn_fn(f"benchmark question {i}: what is the status of project {i % 7}?")
+            current.finished = time.perf_counter()
+            if measured:
+                turns.append(current)
+                if args.allocations:
+                    peaks.append(tracemalloc.get_traced_memory()[1])
+                    if len(snapshots) == 1:
+                        snapshots.append(tracemalloc.take_snapshot())
+            current = None
+    finally:
+        await Storage.close_shared()
+
+    totals = [t.finished - t.started for t in turns]
+    result = {
+        "path": path,
+        "turns": len(turns),
+        "ttft": summarize([t.first_token - t.started for t in turns if t.first_token]),
+        "total": summarize(totals),
+        # Time between the model yielding its first answer token and the consumer seeing it
+        "first_token_delivery": summarize([t.first_token - t.model_first_token for t in turns
+                                           if t.first_token and t.model_first_token]),
+        "phases": {name: summarize([t.phases.get(name, 0.0) for t in turns]) for name in PHASES},
+        "unaccounted": summarize([total - sum(t.phases.values()) for t, total in zip(turns, totals)]),
+    }
+    if args.allocations:
+        top = snapshots[1].compare_to(snapshots[0], "lineno")[:args.top_allocations]
+        result["allocations"] = {
+            "peak_kb": {"p50": round(sorted(peaks)[len(peaks) // 2] / 1024, 1),
+                        "max": round(max(peaks) / 1024, 1)},
+            "top_sites": [{"site": str(stat.traceback), "size_kb": round(stat.size_diff / 1024, 1),
+                           "count": stat.count_diff} for stat in top],
+        }
+    return result
+
+
+def print_result(r: dict) -> None:
+    print(f"\n{r['path']} ({r['turns']} turns)")
+    print(f"  {'':<22}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    rows = [("time to first token", r["ttft"]), ("total", r["total"]),
+            ("first token delivery", r["first_token_delivery"])]
+    rows += [(f"  {name}", stats) for name, stats in r["phases"].items()]
+    rows.append(("  unaccounted", r["unaccounted"]))
+    for label, stats in rows:
+        if stats:
+            print(f"  {label:<22}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['mean_ms']:>10.2f}")
+    if "allocations" in r:
+        peak = r["allocations"]["peak_kb"]
+        print(f"  traced peak per turn: p50 {peak['p50']} KiB, max {peak['max']} KiB")
+        print("  largest net allocations in the last turn:")
+        for site in r["allocations"]["top_sites"]:
+            print(f"    {site['size_kb']:>9.1f} KiB {site['count']:>7} blocks  {site['site']}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark an agent turn with a fake model and fake MCP servers")
+    parser.add_argument("--path", choices=("web", "cli", "both"), default="both")
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--servers", type=int, default=1, help="Fake MCP servers")
+    parser.add_argument("--tools", type=int, default=10, help="Tools per server")
+    parser.add_argument("--tool-latency", type=float, default=0.01, help="Seconds per tool call")
+    parser.add_argument("--payload", type=int, default=2048, help="Bytes per tool result")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls the model makes per turn")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens in the streamed answer")
+    parser.add_argument("--first-token-latency", type=float, default=0.05, help="Seconds per model call")
+    parser.add_argument("--token-latency", type=float, default=0.001, help="Seconds between tokens")
+    parser.add_argument("--allocations", action="store_true", help="Trace allocations with tracemalloc")
+    parser.add_argument("--top-allocations", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    # A throwaway home and working directory: config, tool cache and databases live there
+    home = Path(tempfile.mkdtemp(prefix="agent-turn-"))
+    os.environ["HOME"] = os.environ["USERPROFILE"] = str(home)
+    write_config(home, args)
+    os.chdir(home)
+    instrument(args)
+
+    if args.allocations:
+        tracemalloc.start()
+    paths = ("web", "cli") if args.path == "both" else (args.path,)
+    results = [asyncio.run(run_path(path, args)) for path in paths]
+
+    if args.json:
+        print(json.dumps({"params": vars(args), "results": results}, indent=2))
+        return
+    for result in results:
+        print_result(result)
+
+
+if __name__ == "__main__":
+    main()
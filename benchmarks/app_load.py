@@ -0,0 +1,415 @@
+"""Multi-session load test for the web app.
+
+Starts `app.py` (OAuth disabled, fake chat model and fake MCP servers as in
+`agent_turn.py`) and drives it like many browser tabs at once:
+
+- `--sessions` chat sessions are opened over `--ramp-up` seconds. Each posts a
+  first message and then keeps an SSE connection to `/stream/<session_id>`
+  open, reconnecting as soon as a run's stream ends, like `EventSource` does.
+- Messages are posted to `/send_message` at `--rate` per second, round robin
+  over the open sessions, whether or not the session is still busy (open-loop
+  load). Posts to a busy session are answered with 429.
+
+Every `--interval` seconds it samples the server's thread count and RSS and
+the client's view: sends, 429s, errors, open streams, and the latency of
+events over that interval. The fake model stamps each token with the time it
+was produced, so token delivery latency is the time from the model yielding a
+token to the client reading it from the stream.
+
+    python benchmarks/app_load.py --sessions 50 --rate 5 --duration 120 --output load.json
+
+The app runs from a temporary copy of `app.py`, `src/`, `templates/` and
+`static/` with a temporary home directory, so the checkout's `tasks.db` and
+`~/.llm` are untouched. Environment variables such as
+`AGENT_MAX_CONCURRENT_RUNS` are passed through to the server. `--url` and
+`--pid` point the client at an already running instance instead.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+BENCHMARKS = Path(__file__).resolve().parent
+ROOT = BENCHMARKS.parent
+
+_STAMP = re.compile(r"@(\d+\.\d+)")
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"count": len(samples), "p50_ms": round(pick(0.5), 2), "p99_ms": round(pick(0.99), 2),
+            "max_ms": round(samples[-1] * 1000, 2)}
+
+
+def process_stats(pid: int):
+    """Thread count and RSS in MB of a process, or (None, None) when unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["Threads"]), round(int(fields["VmRSS"].split()[0]) / 1024, 1)
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import psutil
+        process = psutil.Process(pid)
+        return process.num_threads(), round(process.memory_info().rss / 2**20, 1)
+    except Exception:
+        return None, None
+
+
+class Stats:
+    """Counters and latency samples, totals and per sampling interval."""
+
+    KEYS = ("sent", "ok", "busy_429", "errors", "stream_errors", "reconnects")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.total = dict.fromkeys(self.KEYS, 0)
+        self.latencies = {"post": [], "first_token": [], "token_delivery": [], "turn": []}
+        self.open_streams = 0
+        self.max_open_streams = 0
+        self.in_flight = 0
+        self._reset_interval()
+
+    def _reset_interval(self):
+        self.interval = dict.fromkeys(self.KEYS, 0)
+        self.interval_latencies = {name: [] for name in self.latencies}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.total[key] += n
+            self.interval[key] += n
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self.lock:
+            self.latencies[name].append(seconds)
+            self.interval_latencies[name].append(seconds)
+
+    def streams(self, delta: int) -> None:
+        with self.lock:
+            self.open_streams += delta
+            self.max_open_streams = max(self.max_open_streams, self.open_streams)
+
+    def flush_interval(self) -> dict:
+        with self.lock:
+            sample = {**self.interval, "open_streams": self.open_streams, "in_flight": self.in_flight,
+                      **{name: percentiles(v) for name, v in self.interval_latencies.items()}}
+            self._reset_interval()
+        return sample
+
+
+class ChatSession:
+    """One browser tab: posts messages and keeps reading its event stream."""
+
+    def __init__(self, host: str, port: int, stats: Stats, timeout: float):
+        self.id = str(uuid.uuid4())
+        self.host, self.port = host, port
+        self.stats = stats
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.sent_at = None      # When the message being answered was accepted
+        self.got_token = False
+
+    def send(self, text: str) -> None:
+        body = json.dumps({"message": text, "session_id": self.id})
+        started = time.time()
+        try:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            conn.request("POST", "/send_message", body, {"Content-Type": "application/json"})
+            response = conn.getresponse()
+            response.read()
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            self.stats.count("errors")
+            return
+        finally:
+            self.stats.count("sent")
+        self.stats.observe("post", time.time() - started)
+        if response.status == 429:
+            self.stats.count("busy_429")
+        elif response.status != 200:
+            self.stats.count("errors")
+        else:
+            self.stats.count("ok")
+            with self.lock:
+                if self.sent_at is None:
+                    self.sent_at, self.got_token = started, False
+                    with self.stats.lock:
+                        self.stats.in_flight += 1
+
+    def _finish_turn(self, now: float) -> None:
+        with self.lock:
+            if self.sent_at is None:
+                return
+            turn, self.sent_at = now - self.sent_at, None
+        self.stats.observe("turn", turn)
+        with self.stats.lock:
+            self.stats.in_flight -= 1
+
+    def _handle(self, event: dict, now: float) -> None:
+        kind = event.get("type")
+        if kind == "message_chunk":
+            for stamp in _STAMP.findall(event.get("content", "")):
+                self.stats.observe("token_delivery", now - float(stamp))
+            with self.lock:
+                sent_at = self.sent_at if not self.got_token else None
+                self.got_token = True
+            if sent_at is not None:
+                self.stats.observe("first_token", now - sent_at)
+        elif kind == "error":
+            self.stats.count("stream_errors")
+        elif kind == "status" and (event.get("content") == "Finished"
+                                   or str(event.get("content", "")).startswith("Run stopped")):
+            self._finish_turn(now)
+
+    def stream_forever(self, stop: threading.Event) -> None:
+        first = True
+        while not stop.is_set():
+            if not first:
+                self.stats.count("reconnects")
+            first = False
+            try:
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                conn.request("GET", f"/stream/{self.id}")
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                self.stats.count("stream_errors")
+                stop.wait(1)
+                continue
+            self.stats.streams(1)
+            try:
+                while not stop.is_set():
+                    line = response.readline()
+                    if not line:
+                        break
+                    if line.startswith(b"data: "):
+                        self._handle(json.loads(line[6:]), time.time())
+            except (OSError, http.client.HTTPException, ValueError):
+                if not stop.is_set():
+                    self.stats.count("stream_errors")
+            finally:
+                self.stats.streams(-1)
+                conn.close()
+
+
+def prepare_app(directory: Path, args: argparse.Namespace) -> Path:
+    """Copy the web app into `directory` with a benchmark config next to it."""
+    from agent_turn import write_config
+
+    app_dir = directory / "app"
+    ignore = shutil.ignore_patterns("__pycache__", "*.pyc")
+    for name in ("src", "templates", "static"):
+        shutil.copytree(ROOT / name, app_dir / name, ignore=ignore)
+    shutil.copy2(ROOT / "app.py", app_dir / "app.py")
+    write_config(app_dir, args)
+    return app_dir
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(directory: Path, args: argparse.Namespace):
+    app_dir = prepare_app(directory, args)
+    home = directory / "home"
+    home.mkdir()
+    port = free_port()
+    env = {**os.environ, "HOME": str(home), "USERPROFILE": str(home), "ENABLE_GOOGLE_OAUTH": "false",
+           "FLASK_SECRET_KEY": "benchmark", "MEMORY_CONSOLIDATE_INTERVAL": "0", "PYTHONWARNINGS": "ignore"}
+    log = open(directory / "server.log", "w")
+    command = [sys.executable, __file__, "--serve", str(app_dir), "--port", str(port),
+               "--tool-calls", str(args.tool_calls), "--tokens", str(args.tokens),
+               "--first-token-latency", str(args.first_token_latency),
+               "--token-latency", str(args.token_latency)]
+    # The app prints every event; keep stdout out of the way
+    server = subprocess.Popen(command, cwd=app_dir, env=env, stdout=subprocess.DEVNULL, stderr=log)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if server.poll() is not None:
+            sys.exit(f"Server exited with {server.returncode}, see {directory / 'server.log'}:\n"
+                     f"{(directory / 'server.log').read_text()[-2000:]}")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return server, "127.0.0.1", port
+        except OSError:
+            time.sleep(0.2)
+    server.kill()
+    sys.exit("Server did not start listening within 60s")
+
+
+def serve(args: argparse.Namespace) -> None:
+    """Server process: the app with the fake chat model, on a threaded WSGI server."""
+    sys.path.insert(0, args.serve)
+    from fake_chat_model import FakeChatModel
+    import src.mcp_client_cli.agent_runner as agent_runner
+
+    agent_runner.init_chat_model = lambda *_args, **_kwargs: FakeChatModel(
+        tool_calls=args.tool_calls, tokens=args.tokens, first_token_latency=args.first_token_latency,
+        token_latency=args.token_latency, stamp_tokens=True)
+
+    from werkzeug.serving import make_server
+    import app as web
+
+    make_server("127.0.0.1", args.port, web.app, threaded=True).serve_forever()
+
+
+def run(host: str, port: int, pid, args: argparse.Namespace) -> dict:
+    stats = Stats()
+    stop = threading.Event()
+    sessions = []
+    senders = ThreadPoolExecutor(max_workers=args.max_senders)
+    timeline = []
+    started = time.time()
+
+    def sample(phase: str) -> None:
+        threads, rss = process_stats(pid) if pid else (None, None)
+        timeline.append({"t": round(time.time() - started, 1), "phase": phase,
+                         "server_threads": threads, "server_rss_mb": rss,
+                         "sessions": len(sessions), **stats.flush_interval()})
+        s = timeline[-1]
+        print(f"[load] t={s['t']:>6}s sessions={s['sessions']} streams={s['open_streams']} "
+              f"in_flight={s['in_flight']} sent={s['sent']} 429={s['busy_429']} errors={s['errors']} "
+              f"threads={threads} rss={rss}MB "
+              f"token_p99={s['token_delivery'].get('p99_ms', '-')}ms "
+              f"first_token_p50={s['first_token'].get('p50_ms', '-')}ms", file=sys.stderr)
+
+    def open_session(i: int) -> None:
+        session = ChatSession(host, port, stats, args.timeout)
+        session.send(f"hello from session {i}")
+        threading.Thread(target=session.stream_forever, args=(stop,), daemon=True).start()
+        sessions.append(session)
+
+    next_sample = started + args.interval
+    next_open = started
+    next_send = started + args.ramp_up
+    message = 0
+    end = started + args.ramp_up + args.duration
+    while time.time() < end:
+        now = time.time()
+        if len(sessions) < args.sessions and now >= next_open:
+            open_session(len(sessions))
+            next_open += args.ramp_up / args.sessions if args.ramp_up else 0
+        if sessions and now >= next_send:
+            # Open loop: the schedule does not wait for earlier messages to finish
+            session = sessions[message % len(sessions)]
+            senders.submit(session.send, f"message {message}: summarize my notes about topic {message % 13}")
+            message += 1
+            next_send += 1 / args.rate
+        if now >= next_sample:
+            sample("ramp-up" if len(sessions) < args.sessions else "steady")
+            next_sample += args.interval
+        time.sleep(0.005)
+
+    # Let queued and running turns finish before the final sample
+    drain_end = time.time() + args.drain
+    while stats.in_flight > 0 and time.time() < drain_end:
+        time.sleep(0.2)
+    sample("drain")
+    stop.set()
+    senders.shutdown(wait=False, cancel_futures=True)
+
+    total = stats.total
+    server_samples = [s for s in timeline if s["server_threads"] is not None]
+    return {
+        "sends": {**total, "rate_429": round(total["busy_429"] / max(total["sent"], 1), 4),
+                  "error_rate": round(total["errors"] / max(total["sent"], 1), 4),
+                  "unfinished_turns": stats.in_flight},
+        "latency": {name: percentiles(v) for name, v in stats.latencies.items()},
+        "streams": {"max_open": stats.max_open_streams, "reconnects": total["reconnects"]},
+        "server": {
+            "threads_start": server_samples[0]["server_threads"] if server_samples else None,
+            "threads_max": max((s["server_threads"] for s in server_samples), default=None),
+            "rss_mb_start": server_samples[0]["server_rss_mb"] if server_samples else None,
+            "rss_mb_max": max((s["server_rss_mb"] for s in server_samples), default=None),
+        },
+        "timeline": timeline,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load test the web app with many concurrent chat sessions")
+    parser.add_argument("--sessions", type=int, default=20, help="Concurrent chat sessions (SSE streams)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Messages posted per second, over all sessions")
+    parser.add_argument("--duration", type=float, default=60, help="Seconds of load after ramp-up")
+    parser.add_argument("--ramp-up", type=float, default=10, help="Seconds over which sessions are opened")
+    parser.add_argument("--drain", type=float, default=30, help="Seconds to wait for in-flight turns at the end")
+    parser.add_argument("--interval", type=float, default=5, help="Seconds between samples")
+    parser.add_argument("--timeout", type=float, default=60, help="Socket timeout for requests and streams")
+    parser.add_argument("--max-senders", type=int, default=32, help="Concurrent /send_message requests")
+    parser.add_argument("--servers", type=int, default=1, help="Fake MCP servers")
+    parser.add_argument("--tools", type=int, default=10, help="Tools per fake MCP server")
+    parser.add_argument("--tool-latency", type=float, default=0.05, help="Seconds per tool call")
+    parser.add_argument("--payload", type=int, default=2048, help="Bytes per tool result")
+    parser.add_argument("--tool-calls", type=int, default=1, help="Tool calls the model makes per turn")
+    parser.add_argument("--tokens", type=int, default=50, help="Tokens in each streamed answer")
+    parser.add_argument("--first-token-latency", type=float, default=0.3, help="Seconds per model call")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="Seconds between tokens")
+    parser.add_argument("--url", help="Load an already running app instead of starting one")
+    parser.add_argument("--pid", type=int, help="Process to sample threads and RSS of, with --url")
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--serve", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args)
+        return
+
+    server = None
+    directory = Path(tempfile.mkdtemp(prefix="app-load-"))
+    try:
+        if args.url:
+            url = urlparse(args.url)
+            host, port, pid = url.hostname, url.port or 80, args.pid
+        else:
+            server, host, port = start_server(directory, args)
+            pid = server.pid
+        results = run(host, port, pid, args)
+    finally:
+        if server:
+            server.terminate()
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        shutil.rmtree(directory, ignore_errors=True)
+
+    report = {
+        "benchmark": "app_load",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "serve", "port")},
+        **results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    s = results["sends"]
+    print(f"[load] sent {s['sent']}: {s['ok']} accepted, {s['busy_429']} busy (429), {s['errors']} errors; "
+          f"first token p50 {results['latency']['first_token'].get('p50_ms')} ms, "
+          f"token delivery p99 {results['latency']['token_delivery'].get('p99_ms')} ms; "
+          f"server threads max {results['server']['threads_max']}, RSS max {results['server']['rss_mb_max']} MB",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
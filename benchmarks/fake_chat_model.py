@@ -0,0 +1,102 @@
+"""Scripted chat model for benchmarks: no network, deterministic timing.
+
+Each turn, the model first asks for `tool_calls` tool calls, one per model call,
+cycling through the bound tools, then streams an answer of `tokens` tokens.
+`first_token_latency` is spent before the first chunk of every call and
+`token_latency` between answer tokens, standing in for provider latency.
+With `stamp_tokens`, each token carries the wall-clock time it was produced
+(`token3@1718000000.123456`) so a client can measure delivery latency.
+"""
+
+import asyncio
+import json
+import time
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    tool_calls: int = 1
+    tokens: int = 40
+    first_token_latency: float = 0.05
+    token_latency: float = 0.002
+    stamp_tokens: bool = False
+    tool_names: List[str] = []
+    # Called with ("call", seconds) after each model call and ("first_token", perf_counter())
+    # when the first answer token is yielded
+    on_event: Optional[Callable[[str, float], None]] = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-scripted"
+
+    def bind_tools(self, tools, **kwargs) -> "FakeChatModel":
+        names = [getattr(t, "name", None) or t.get("name") for t in tools]
+        # Prefer the benchmark server's tools over built-ins such as save_memory
+        preferred = [n for n in names if n.startswith("tool_")] or names
+        return self.model_copy(update={"tool_names": preferred})
+
+    def _tool_results_this_turn(self, messages: List[BaseMessage]) -> int:
+        count = 0
+        if len(messages) >= 2 and isinstance(messages[-1], HumanMessage) and isinstance(messages[-2], ToolMessage):
+            messages = messages[:-1]  # Context the prompt builder appends after tool results
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                break
+            count += isinstance(message, ToolMessage)
+        return count
+
+    def _script(self, messages: List[BaseMessage]) -> Optional[dict]:
+        done = self._tool_results_this_turn(messages)
+        if done >= self.tool_calls or not self.tool_names:
+            return None
+        query = messages[-1].content if isinstance(messages[-1].content, str) else "query"
+        return {"name": self.tool_names[done % len(self.tool_names)],
+                "args": {"query": query[:64]}, "id": f"call_{done}_{time.monotonic_ns()}"}
+
+    def _emit(self, kind: str, value: float) -> None:
+        if self.on_event:
+            self.on_event(kind, value)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        started = time.perf_counter()
+        await asyncio.sleep(self.first_token_latency)
+        call = self._script(messages)
+        prompt_tokens = sum(len(str(m.content).split()) for m in messages)
+        if call:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="",
+                tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]),
+                                   "id": call["id"], "index": 0}],
+                usage_metadata={"input_tokens": prompt_tokens, "output_tokens": 8,
+                                "total_tokens": prompt_tokens + 8},
+            ))
+        else:
+            for i in range(self.tokens):
+                if i == 0:
+                    self._emit("first_token", time.perf_counter())
+                elif self.token_latency:
+                    await asyncio.sleep(self.token_latency)
+                stamp = f"@{time.time():.6f}" if self.stamp_tokens else ""
+                yield ChatGenerationChunk(message=AIMessageChunk(content=f"token{i}{stamp} "))
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", usage_metadata={"input_tokens": prompt_tokens, "output_tokens": self.tokens,
+                                            "total_tokens": prompt_tokens + self.tokens}))
+        self._emit("call", time.perf_counter() - started)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        call = self._script(messages)
+        if call:
+            message = AIMessage(content="", tool_calls=[call])
+        else:
+            message = AIMessage(content="".join(f"token{i} " for i in range(self.tokens)))
+        return ChatResult(generations=[ChatGeneration(message=message)])
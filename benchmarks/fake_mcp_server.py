@@ -0,0 +1,60 @@
+"""Stand-in stdio MCP server for benchmarks.
+
+Serves `--tools` tools named tool_0, tool_1, ... that each take a `query`
+string, sleep `--latency` seconds and return `--payload` bytes of text.
+
+    python benchmarks/fake_mcp_server.py --tools 20 --latency 0.05 --payload 4096
+"""
+
+import argparse
+import asyncio
+
+import mcp.types as types
+from mcp.server.lowlevel import Server
+from mcp.server.stdio import stdio_server
+
+
+def build_server(tools: int, latency: float, payload: int) -> Server:
+    server = Server("bench")
+    body = ("lorem ipsum dolor sit amet " * (payload // 27 + 1))[:payload]
+
+    @server.list_tools()
+    async def list_tools() -> list[types.Tool]:
+        return [
+            types.Tool(
+                name=f"tool_{i}",
+                description=f"Benchmark tool {i}: looks up the query and returns a fixed-size text.",
+                inputSchema={
+                    "type": "object",
+                    "properties": {"query": {"type": "string", "description": "What to look up"}},
+                    "required": ["query"],
+                },
+            )
+            for i in range(tools)
+        ]
+
+    @server.call_tool()
+    async def call_tool(name: str, arguments: dict) -> list[types.TextContent]:
+        if latency:
+            await asyncio.sleep(latency)
+        return [types.TextContent(type="text", text=f"{name}({arguments.get('query', '')}): {body}")]
+
+    return server
+
+
+async def serve(args: argparse.Namespace) -> None:
+    server = build_server(args.tools, args.latency, args.payload)
+    async with stdio_server() as (read, write):
+        await server.run(read, write, server.create_initialization_options())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake MCP server for benchmarks")
+    parser.add_argument("--tools", type=int, default=10, help="Number of tools to expose")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds each tool call takes")
+    parser.add_argument("--payload", type=int, default=1024, help="Bytes of text each call returns")
+    asyncio.run(serve(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Benchmark suite for memory.SqliteStore.
+
+For each store size (default 1k, 10k and 100k items spread over namespaces) a
+fresh worker process seeds a temporary database through `storage.Storage`, the
+same WAL connection the CLI and web app use, then measures:
+
+- seeding throughput (batched puts),
+- latency of single get, put, search (with a query) and list_namespaces calls,
+- throughput and batch latency of `abatch` with a mix of Get/Put/Search/ListNamespaces ops,
+- peak RSS of the worker.
+
+Results are written as JSON, tagged with the git commit, so runs can be compared:
+
+    python benchmarks/sqlite_store.py --output before.json
+    python benchmarks/sqlite_store.py --output after.json --compare before.json
+
+Memories are embedded with the local hashing embedder when `--index` is set
+(`exact`, `int8` or `pq`); the default `none` measures FTS5 ranking only. An
+exact index scans every vector on each search and is slow at 100k items.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+WORDS = ("user prefers dark mode project deadline friday meeting notes python rust database "
+         "migration deploy staging production coffee tea berlin london paris weekend flight hotel "
+         "budget report invoice client review design api latency cache index query memory vector "
+         "search ranking model prompt token stream server tool schedule reminder birthday gift").split()
+
+
+def percentiles(samples: list) -> dict:
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+    return {"count": len(samples), "p50_ms": round(pick(0.5), 3), "p99_ms": round(pick(0.99), 3),
+            "mean_ms": round(sum(samples) / len(samples) * 1000, 3)}
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def sentence(rng: random.Random) -> str:
+    return " ".join(rng.choices(WORDS, k=rng.randint(6, 16)))
+
+
+def index_config(kind: str):
+    if kind == "none":
+        return {}
+    from mcp_client_cli.config import EmbeddingConfig
+    from mcp_client_cli.embeddings import memory_index_config
+    return memory_index_config(EmbeddingConfig(
+        provider="local", quantization=None if kind == "exact" else kind))
+
+
+async def run_size(size: int, args: argparse.Namespace) -> dict:
+    from langgraph.store.base import GetOp, ListNamespacesOp, PutOp, SearchOp
+    from mcp_client_cli.storage import Storage
+
+    rng = random.Random(args.seed)
+    namespaces = [("memories", f"user{n}") for n in range(args.namespaces)]
+    result = {"size": size}
+    with tempfile.TemporaryDirectory() as tmp:
+        async with Storage(Path(tmp) / "bench.db", index=index_config(args.index)) as storage:
+            store = storage.store
+
+            started = time.perf_counter()
+            for start in range(0, size, args.seed_batch):
+                await store.abatch([
+                    PutOp(namespaces[i % len(namespaces)], f"memory_{i}", {"data": sentence(rng)})
+                    for i in range(start, min(start + args.seed_batch, size))
+                ])
+            seconds = time.perf_counter() - started
+            result["seed"] = {"seconds": round(seconds, 3), "items_per_s": round(size / seconds, 1)}
+            # Let lazily built state (vector codes, codebooks) settle before timing
+            await store.asearch(namespaces[0], query=sentence(rng), limit=10)
+
+            def random_key():
+                i = rng.randrange(size)
+                return namespaces[i % len(namespaces)], f"memory_{i}"
+
+            single = {"get": [], "put": [], "search": [], "list_namespaces": []}
+            for _ in range(args.ops):
+                namespace, key = random_key()
+                calls = {
+                    "get": lambda: store.aget(namespace, key),
+                    "put": lambda: store.aput(namespace, key, {"data": sentence(rng)}),
+                    "search": lambda: store.asearch(namespace, query=sentence(rng), limit=10),
+                    "list_namespaces": lambda: store.alist_namespaces(prefix=("memories",)),
+                }
+                for name, call in calls.items():
+                    started = time.perf_counter()
+                    await call()
+                    single[name].append(time.perf_counter() - started)
+            result["ops"] = {name: percentiles(samples) for name, samples in single.items()}
+
+            kinds, weights = zip(*args.mix.items())
+            batches, op_count = [], 0
+            mixed_started = time.perf_counter()
+            for _ in range(max(args.ops // args.batch_size, 1)):
+                ops = []
+                for kind in rng.choices(kinds, weights, k=args.batch_size):
+                    namespace, key = random_key()
+                    ops.append({
+                        "get": lambda: GetOp(namespace, key),
+                        "put": lambda: PutOp(namespace, key, {"data": sentence(rng)}),
+                        "search": lambda: SearchOp(namespace, query=sentence(rng), limit=10),
+                        "list": lambda: ListNamespacesOp(match_conditions=None, max_depth=None,
+                                                         limit=100, offset=0),
+                    }[kind]())
+                started = time.perf_counter()
+                await store.abatch(ops)
+                batches.append(time.perf_counter() - started)
+                op_count += len(ops)
+            seconds = time.perf_counter() - mixed_started
+            result["mixed_abatch"] = {
+                "batch_size": args.batch_size, "mix": args.mix,
+                "ops_per_s": round(op_count / seconds, 1), **percentiles(batches),
+            }
+            result["db_mb"] = round(sum(p.stat().st_size for p in Path(tmp).glob("bench.db*")) / 2**20, 1)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(report: dict, baseline: dict, threshold: float) -> list:
+    """Lines describing metrics that moved by more than `threshold` (a fraction)."""
+    lines = []
+    old = {r["size"]: r for r in baseline["results"]}
+    for new in report["results"]:
+        before = old.get(new["size"])
+        if not before:
+            continue
+        metrics = [(f"{name}.p99_ms", new["ops"][name].get("p99_ms"), before["ops"].get(name, {}).get("p99_ms"), False)
+                   for name in new["ops"]]
+        metrics += [
+            ("mixed_abatch.ops_per_s", new["mixed_abatch"]["ops_per_s"], before["mixed_abatch"]["ops_per_s"], True),
+            ("seed.items_per_s", new["seed"]["items_per_s"], before["seed"]["items_per_s"], True),
+            ("peak_rss_mb", new["peak_rss_mb"], before["peak_rss_mb"], False),
+        ]
+        for name, value, previous, higher_is_better in metrics:
+            if not value or not previous:
+                continue
+            change = (value - previous) / previous
+            if abs(change) > threshold:
+                better = (change > 0) == higher_is_better
+                lines.append(f"size={new['size']} {name}: {previous} -> {value} "
+                             f"({change:+.0%}, {'better' if better else 'WORSE'})")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark memory.SqliteStore")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated item counts")
+    parser.add_argument("--namespaces", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=500, help="Timed calls per op type")
+    parser.add_argument("--batch-size", type=int, default=16, help="Ops per mixed abatch call")
+    parser.add_argument("--seed-batch", type=int, default=500, help="Puts per seeding batch")
+    parser.add_argument("--mix", default="get=50,put=20,search=20,list=10",
+                        help="Weights of op kinds in mixed batches")
+    parser.add_argument("--index", choices=("none", "exact", "int8", "pq"), default="none")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here (default: stdout)")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change worth reporting")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.mix = {kind: float(weight) for kind, _, weight in
+                (pair.partition("=") for pair in args.mix.split(","))}
+
+    if args.worker:
+        print(json.dumps(asyncio.run(run_size(args.worker, args))))
+        return
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(",")):
+        print(f"[bench] {size} items...", file=sys.stderr)
+        # A fresh process per size so peak RSS belongs to that size alone
+        worker = subprocess.run(
+            [sys.executable, __file__, *sys.argv[1:], "--worker", str(size)],
+            capture_output=True, text=True, env={**os.environ, "PYTHONWARNINGS": "ignore"})
+        if worker.returncode:
+            sys.exit(f"Worker for {size} items failed:\n{worker.stderr}")
+        results.append(json.loads(worker.stdout.strip().splitlines()[-1]))
+        r = results[-1]
+        print(f"[bench] {size}: seed {r['seed']['items_per_s']} items/s, "
+              f"search p99 {r['ops']['search']['p99_ms']} ms, "
+              f"mixed {r['mixed_abatch']['ops_per_s']} ops/s, peak RSS {r['peak_rss_mb']} MB",
+              file=sys.stderr)
+
+    report = {
+        "benchmark": "sqlite_store",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "worker")},
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        changes = compare(report, json.loads(Path(args.compare).read_text()), args.threshold)
+        print("\n".join(changes) or f"[bench] No change above {args.threshold:.0%}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
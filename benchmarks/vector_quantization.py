@@ -0,0 +1,158 @@
+"""Recall and latency of quantized memory search.
+
+Generates clustered unit vectors, then compares for each method:
+
+- exact: cosine similarity against every full-precision float32 vector
+- int8 / pq: scores over compressed codes, shortlist of `rerank * k` candidates
+  re-ranked against their full-precision vectors
+
+and reports recall@k against the exact top k, p50/p99 query latency and the
+bytes held in memory per vector. `--store` runs the same queries through a
+SqliteStore in a temporary database, including reading vectors from disk.
+
+    python benchmarks/vector_quantization.py --n 50000 --dims 256 --json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from mcp_client_cli.quantization import (  # noqa: E402
+    Int8Quantizer, ProductQuantizer, normalize, top_candidates)
+
+
+def clustered_vectors(n: int, dims: int, clusters: int, noise: float, seed: int) -> np.ndarray:
+    """Unit vectors around random centers; `noise` is the norm of the offset from the center."""
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.standard_normal((clusters, dims)))
+    X = centers[rng.integers(0, clusters, n)] + noise * rng.standard_normal((n, dims)) / np.sqrt(dims)
+    return normalize(X)
+
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def run_in_memory(X: np.ndarray, queries: np.ndarray, k: int, rerank: int, subspaces: int) -> list:
+    exact = [top_candidates(X @ q, k) for q in queries]
+    results = []
+
+    latencies = []
+    for q in queries:
+        started = time.perf_counter()
+        top_candidates(X @ q, k)
+        latencies.append(time.perf_counter() - started)
+    results.append({"method": "exact", "recall": 1.0, "bytes_per_vector": X.shape[1] * 4,
+                    "p50_ms": percentile(latencies, 0.5) * 1000,
+                    "p99_ms": percentile(latencies, 0.99) * 1000})
+
+    train_started = time.perf_counter()
+    quantizers = {
+        "int8": Int8Quantizer(),
+        "pq": ProductQuantizer.fit(X[np.random.default_rng(0).choice(len(X), min(len(X), 20000), replace=False)],
+                                   subspaces),
+    }
+    train_seconds = time.perf_counter() - train_started
+    for name, quantizer in quantizers.items():
+        codes, scales = quantizer.encode(X)
+        bytes_per_vector = codes.shape[1] * codes.itemsize + (4 if scales is not None else 0)
+        hits, latencies = 0, []
+        for q, truth in zip(queries, exact):
+            started = time.perf_counter()
+            shortlist = top_candidates(quantizer.scores(q, codes, scales), k * rerank)
+            # Re-rank the shortlist at full precision
+            found = shortlist[top_candidates(X[shortlist] @ q, k)]
+            latencies.append(time.perf_counter() - started)
+            hits += len(set(found.tolist()) & set(truth.tolist()))
+        results.append({
+            "method": name, "recall": hits / (k * len(queries)), "bytes_per_vector": bytes_per_vector,
+            "p50_ms": percentile(latencies, 0.5) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+            **({"train_seconds": train_seconds} if name == "pq" else {}),
+        })
+    return results
+
+
+async def run_store(X: np.ndarray, queries: np.ndarray, k: int, rerank: int) -> list:
+    """End-to-end search latency through SqliteStore, vectors stored as given."""
+    from langchain_core.embeddings import Embeddings
+    from langgraph.store.base import PutOp
+    from mcp_client_cli.memory import SqliteStore
+
+    lookup = {f"q{i}": q.tolist() for i, q in enumerate(queries)}
+
+    class Fixed(Embeddings):
+        # Documents carry their vector index; queries are looked up by name
+        def embed_documents(self, texts):
+            return [X[int(t)].tolist() if t.isdigit() else lookup[t] for t in texts]
+
+        def embed_query(self, text):
+            return self.embed_documents([text])[0]
+
+    results = []
+    for method in (None, "int8", "pq"):
+        with tempfile.TemporaryDirectory() as tmp:
+            index = {"dims": X.shape[1], "embed": Fixed(), "fields": ["data"]}
+            if method:
+                index["quantization"] = {"method": method, "rerank": rerank}
+            store = SqliteStore(Path(tmp) / "bench.db", index=index)
+            for start in range(0, len(X), 1000):
+                await store.abatch([PutOp(("memories", "bench"), f"m{i}", {"data": str(i)})
+                                    for i in range(start, min(start + 1000, len(X)))])
+            await store.asearch(("memories", "bench"), query="q0", limit=k)  # encode / train
+            hits, latencies = 0, []
+            for q, name in zip(queries, lookup):
+                started = time.perf_counter()
+                found = await store.asearch(("memories", "bench"), query=name, limit=k)
+                latencies.append(time.perf_counter() - started)
+                truth = {f"m{i}" for i in top_candidates(X @ q, k).tolist()}
+                hits += len(truth & {item.key for item in found})
+            results.append({"method": f"store-{method or 'exact'}", "recall": hits / (k * len(queries)),
+                            "p50_ms": percentile(latencies, 0.5) * 1000,
+                            "p99_ms": percentile(latencies, 0.99) * 1000})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=20000, help="Stored vectors")
+    parser.add_argument("--dims", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank", type=int, default=4)
+    parser.add_argument("--subspaces", type=int, help="PQ subspaces (default dims / 8)")
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--noise", type=float, default=1.0, help="Spread of the clusters")
+    parser.add_argument("--store", action="store_true", help="Also measure search through SqliteStore")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    # Queries come from the same clusters as the stored vectors
+    vectors = clustered_vectors(args.n + args.queries, args.dims, args.clusters, args.noise, seed=1)
+    X, queries = vectors[:args.n], vectors[args.n:]
+    results = run_in_memory(X, queries, args.k, args.rerank, args.subspaces or args.dims // 8)
+    if args.store:
+        results += asyncio.run(run_store(X, queries[:min(len(queries), 20)], args.k, args.rerank))
+
+    report = {"n": args.n, "dims": args.dims, "k": args.k, "rerank": args.rerank, "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"n={args.n} dims={args.dims} k={args.k} rerank={args.rerank}")
+    print(f"{'method':<14}{'recall':>8}{'bytes/vec':>11}{'p50 ms':>9}{'p99 ms':>9}")
+    for r in results:
+        recall = f"{r['recall']:.3f}" if "recall" in r else "-"
+        size = r.get("bytes_per_vector", "-")
+        print(f"{r['method']:<14}{recall:>8}{size:>11}{r['p50_ms']:>9.2f}{r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
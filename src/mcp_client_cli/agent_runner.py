@@ -1,30 +1,31 @@
 # src/mcp_client_cli/agent_runner.py
 
 import asyncio
-import os
 import uuid
-from datetime import datetime
 from queue import Queue
-from typing import Annotated, TypedDict, Any
+from typing import Annotated, TypedDict, Any, Callable, Optional
 
 from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, ToolMessage, AIMessageChunk
-from langchain_core.prompts import ChatPromptTemplate
 from langgraph.prebuilt import create_react_agent
 from langgraph.managed import IsLastStep
 from langgraph.graph.message import add_messages
 from langchain.chat_models import init_chat_model
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
 
-from .config import AppConfig
-from .const import SQLITE_DB
-from .memory import AgentState, SqliteStore, get_memories, save_memory
-from .storage import ConversationManager
-from .tool import McpServerConfig, convert_mcp_to_langchain_tools, McpTool, StdioServerParameters, McpToolkit
+from .cancellation import CancellationToken
+from .cli import build_server_configs
+from .config import AppConfig, LLMConfig, config_service
+from .memory import AgentState, save_memory
+from .prompt_builder import TokenUsage, build_prompt, prompt_memories, prompt_time, stream_usage_kwargs
+from .response_cache import with_response_cache
+from .routing import init_routed_model
+from .storage import Storage
+from .tool import McpServerConfig, convert_mcp_to_langchain_tools, McpTool, McpToolkit
 
 class AgentRunner:
     def __init__(self, output_queue: Queue):
         self.output_queue = output_queue
-        self.app_config = AppConfig.load()
+        # Immutable snapshot: a config reload mid-run does not affect this run
+        self.app_config: AppConfig = config_service.current()
         self.toolkits: list[McpToolkit] = [] # To manage toolkit lifecycle
 
     async def _load_tools(self, no_tools: bool = False, force_refresh: bool = False) -> tuple[list, list]:
@@ -32,18 +33,7 @@ class AgentRunner:
         if no_tools:
             return [], []
         
-        server_configs = [
-            McpServerConfig(
-                server_name=name,
-                server_param=StdioServerParameters(
-                    command=config.command,
-                    args=config.args or [],
-                    env={**(config.env or {}), **os.environ}
-                ),
-                exclude_tools=config.exclude_tools or []
-            )
-            for name, config in self.app_config.get_enabled_servers().items()
-        ]
+        server_configs = build_server_configs(self.app_config)
         
         langchain_tools = []
         self.toolkits = [] # Reset toolkits list
@@ -61,6 +51,8 @@ class AgentRunner:
             # Depending on desired behavior, maybe return empty tools or raise
             return [], [] 
             
+        # Servers finish loading in any order; a fixed order keeps the prompt prefix cacheable
+        langchain_tools.sort(key=lambda t: t.name)
         langchain_tools.append(save_memory)
         return self.toolkits, langchain_tools
 
@@ -93,10 +85,67 @@ class AgentRunner:
     def _emit_tool_confirm(self, tool_name: str, args: dict, session_id: str):
          self._emit({"type": "tool_confirm", "tool_name": tool_name, "args": args, "session_id": session_id})
 
-    async def run(self, query_text: str, session_id: str, is_continuation: bool = False):
-        """Runs the agent for a given query and session, putting results onto the queue."""
+    def _bind_cancellation(self, cancel_token: CancellationToken) -> Optional[asyncio.TimerHandle]:
+        """Cancel the current task when the token is cancelled or its deadline passes.
+
+        Returns the deadline timer, to be cancelled when the run ends, since the
+        worker's event loop outlives the run.
+        """
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+
+        def cancel_task():
+            try:
+                loop.call_soon_threadsafe(task.cancel)
+            except RuntimeError:
+                pass  # Loop already closed; the run is over
+
+        cancel_token.start()
+        cancel_token.on_cancel(cancel_task)
+        remaining = cancel_token.remaining()
+        if remaining is not None:
+            return loop.call_later(remaining, cancel_token.cancel, "deadline exceeded")
+        return None
+
+    def _init_model(self, llm: LLMConfig):
+        """Builds one chat model from an LLM config."""
+        extra_body = {}
+        if llm.base_url and "openrouter" in llm.base_url:
+            extra_body = {"transforms": ["middle-out"]}
+        return init_chat_model(
+            model=llm.model,
+            model_provider=llm.provider,
+            api_key=llm.api_key,
+            temperature=llm.temperature,
+            base_url=llm.base_url,
+            timeout=llm.timeout,
+            default_headers={
+                "X-Title": "mcp-client-cli-web", # Identify web UI
+                "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
+            },
+            extra_body=extra_body,
+            **stream_usage_kwargs(llm.provider),
+        )
+
+    async def run(self, query_text: str, session_id: str, is_continuation: bool = False,
+                  on_finish: Optional[Callable[[dict], None]] = None,
+                  cancel_token: Optional[CancellationToken] = None, cache_responses: bool = False,
+                  thread_id: Optional[str] = None):
+        """Runs the agent for a given query and session, putting results onto the queue.
+
+        If `on_finish` is given it is called once with a summary of the run
+        (status, final output and token usage), e.g. to record scheduled task runs.
+        Cancelling `cancel_token` (or reaching its deadline) stops the run, including
+        in-flight model and tool calls. `cache_responses` lets the response cache
+        (when enabled in the config) answer this run even at a non-zero temperature.
+        `thread_id` runs the query in that conversation thread instead of the session's.
+        """
         
         self._emit_status("Initializing agent...", session_id)
+        final_output: list[str] = []
+        usage = TokenUsage()
+        status = "succeeded"
+        deadline_timer = self._bind_cancellation(cancel_token) if cancel_token else None
         try:
             # --- Configuration & Tool Loading ---
             # TODO: Add options from CLI args if needed (e.g., force_refresh, no_tools)
@@ -109,133 +158,146 @@ class AgentRunner:
 
             # --- Model Initialization ---
             # TODO: Allow model override if needed
-            extra_body = {}
-            if self.app_config.llm.base_url and "openrouter" in self.app_config.llm.base_url:
-                extra_body = {"transforms": ["middle-out"]}
-            
-            model = init_chat_model(
-                model=self.app_config.llm.model,
-                model_provider=self.app_config.llm.provider,
-                api_key=self.app_config.llm.api_key,
-                temperature=self.app_config.llm.temperature,
-                base_url=self.app_config.llm.base_url,
-                default_headers={
-                    "X-Title": "mcp-client-cli-web", # Identify web UI
-                    "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
-                },
-                extra_body=extra_body,
-                 # streaming=True # Ensure streaming is enabled for LangChain model
-            )
+            model = init_routed_model(self.app_config.llm, self._init_model)
+            model = with_response_cache(model, self.app_config, opt_in=cache_responses)
             
             # --- Prompt & Agent Setup ---
-            prompt = ChatPromptTemplate.from_messages([
-                ("system", self.app_config.system_prompt),
-                ("placeholder", "{messages}")
-            ])
+            # Stable content first, so the provider can reuse its cached prompt prefix
+            prompt = build_prompt(self.app_config.system_prompt)
 
-            conversation_manager = ConversationManager(SQLITE_DB)
-            store = SqliteStore(SQLITE_DB) # Assumes DB path from const.py
+            # Long-lived connection owned by this worker thread's event loop
+            storage = await Storage.shared()
+            checkpointer, store = storage.checkpointer, storage.store
 
-            async with AsyncSqliteSaver.from_conn_string(str(SQLITE_DB)) as checkpointer:
-                # --- Memory & State --- 
-                memories = await get_memories(store, user_id=session_id) # Use session_id as user_id
-                formatted_memories = "\n".join(f"- {memory}" for memory in memories)
+            # --- Memory & State --- 
+            memories, context_memories = await prompt_memories(store, user_id=session_id, query=query_text) # Use session_id as user_id
+            
+            agent_executor = create_react_agent(
+                model, tools, state_schema=AgentState, 
+                state_modifier=prompt, # Changed back from messages_modifier
+                checkpointer=checkpointer, 
+                store=store,
+                # TODO: Add interrupt logic if needed
+            )
+
+            # --- Conversation Thread ID --- 
+            thread_id = thread_id or session_id # Default to the web session ID as the conversation thread ID
+            if is_continuation:
+                 # Verify thread exists, or start new if not found?
+                 # last_id = await conversation_manager.get_last_id() # Original CLI logic
+                 # For web, we rely on the session_id provided
+                 pass 
+            else:
+                # This is likely a new session/conversation on the web
+                pass
                 
-                agent_executor = create_react_agent(
-                    model, tools, state_schema=AgentState, 
-                    state_modifier=prompt, # Changed back from messages_modifier
-                    checkpointer=checkpointer, 
-                    store=store,
-                    # TODO: Add interrupt logic if needed
-                )
+            # Save the current ID as the 'last' for potential CLI continuation? Or manage separately?
+            # await conversation_manager.save_id(thread_id, db=checkpointer.conn) # Maybe not needed for web?
 
-                # --- Conversation Thread ID --- 
-                thread_id = session_id # Use web session ID as the conversation thread ID
-                if is_continuation:
-                     # Verify thread exists, or start new if not found?
-                     # last_id = await conversation_manager.get_last_id() # Original CLI logic
-                     # For web, we rely on the session_id provided
-                     pass 
-                else:
-                    # This is likely a new session/conversation on the web
-                    pass
-                    
-                # Save the current ID as the 'last' for potential CLI continuation? Or manage separately?
-                # await conversation_manager.save_id(thread_id, db=checkpointer.conn) # Maybe not needed for web?
+            # --- Input Preparation ---
+            query_message = HumanMessage(content=query_text)
+            input_messages = AgentState(
+                messages=[query_message],
+                today_datetime=prompt_time(),
+                memories=memories,
+                context_memories=context_memories,
+                # remaining_steps=5 # TODO: Configure max steps?
+            )
+            
+            self._emit_status("Processing message...", session_id)
+            config = {"configurable": {"thread_id": thread_id, "user_id": session_id}}
+            if cancel_token and cancel_token.deadline:
+                # Lets tools cap their own timeouts to the time left
+                config["configurable"]["deadline"] = cancel_token.deadline
 
-                # --- Input Preparation ---
-                query_message = HumanMessage(content=query_text)
-                input_messages = AgentState(
-                    messages=[query_message],
-                    today_datetime=datetime.now().isoformat(),
-                    memories=formatted_memories,
-                    # remaining_steps=5 # TODO: Configure max steps?
-                )
+            # --- Streaming Agent Execution --- 
+            async for event in agent_executor.astream_events(input_messages, config=config, version="v2"):
+                kind = event["event"]
+                # print(f"DEBUG Event: {kind}, Data: {event[\"data\"]}") # For debugging
                 
-                self._emit_status("Processing message...", session_id)
-                config = {"configurable": {"thread_id": thread_id, "user_id": session_id}}
+                if kind == "on_chat_model_start":
+                    # Only the last model call holds the final answer
+                    final_output.clear()
 
-                # --- Streaming Agent Execution --- 
-                async for event in agent_executor.astream_events(input_messages, config=config, version="v2"):
-                    kind = event["event"]
-                    # print(f"DEBUG Event: {kind}, Data: {event[\"data\"]}") # For debugging
-                    
-                    if kind == "on_chat_model_stream":
-                        chunk = event["data"]["chunk"]
-                        if isinstance(chunk, AIMessageChunk) and chunk.content:
-                            self._emit_chunk(str(chunk.content), session_id)
-                            
-                    elif kind == "on_tool_start":
-                         tool_input = event["data"].get("input")
-                         tool_name = event["name"]
-                         print(f"[AgentRunner:{session_id}] Event 'on_tool_start': name={tool_name}, input={tool_input}, full_event={event}") # Added log
-                         self._emit_status(f"Calling tool: {tool_name}...", session_id)
-                         # --- Tool Confirmation Logic --- 
-                         # Check if this tool requires confirmation based on app_config
-                         # if tool_name in self.app_config.tools_requires_confirmation:
-                         #     self._emit_tool_confirm(tool_name, tool_input, session_id)
-                         #     # --- PAUSE execution and wait for confirmation ---
-                         #     # This requires a mechanism (e.g., asyncio.Event, queue)
-                         #     # signaled by the /confirm_tool route in app.py
-                         #     # confirmed = await wait_for_confirmation(session_id, tool_name)
-                         #     # if not confirmed:
-                         #     #     # TODO: Inject a ToolMessage indicating denial? How to interrupt?
-                         #     #     self._emit_status(f"Tool call {tool_name} denied by user.", session_id)
-                         #     #     # Need a way to stop the agent gracefully here or raise specific exception
-                         #     #     raise ToolDeniedException(f"Tool {tool_name} denied.")
-                         #     # else:
-                         #     #     self._emit_status(f"Tool call {tool_name} confirmed.", session_id)
-                         pass # Continue tool execution if confirmed or not needed
+                elif kind == "on_chat_model_stream":
+                    chunk = event["data"]["chunk"]
+                    if isinstance(chunk, AIMessageChunk) and chunk.content:
+                        self._emit_chunk(str(chunk.content), session_id)
+                        final_output.append(str(chunk.content))
 
-                    elif kind == "on_tool_end":
-                        tool_output = event["data"].get("output")
-                        tool_name = event["name"]
-                        print(f"[AgentRunner:{session_id}] Event 'on_tool_end': name={tool_name}, output={tool_output}, full_event={event}") # Added log
-                        # Check if output is ToolMessage and status is error?
-                        if isinstance(tool_output, ToolMessage) and tool_output.status != 'success':
-                            self._emit_status(f"Tool {tool_name} failed: {tool_output.content}", session_id)
-                        else:
-                            # Optionally show tool output (can be large)
-                            # self._emit_status(f"Tool {tool_name} finished.", session_id)
-                            pass
-                            
-                    elif kind == "on_chain_end":
-                         # Can check event["name"] == "agent" to confirm it's the main agent loop
-                         # print(f"DEBUG Chain End: {event[\"name\"]}")
-                         pass
-                    
-                    elif kind == "on_chain_error" or kind == "on_tool_error" or kind == "on_chat_model_error" or kind == "on_retriever_error":
-                         # Handle various errors
-                         error_content = event["data"].get("error", "Unknown error")
-                         print(f"[AgentRunner:{session_id}] Event 'error': kind={kind}, error={error_content}, full_event={event}") # Added log
-                         self._emit_error(f"Error during execution: {error_content}", session_id)
-                         # Decide whether to break or continue
-                         break
+                elif kind == "on_chat_model_end":
+                    usage.add(getattr(event["data"].get("output"), "usage_metadata", None))
+                        
+                elif kind == "on_tool_start":
+                     tool_input = event["data"].get("input")
+                     tool_name = event["name"]
+                     print(f"[AgentRunner:{session_id}] Event 'on_tool_start': name={tool_name}, input={tool_input}, full_event={event}") # Added log
+                     self._emit_status(f"Calling tool: {tool_name}...", session_id)
+                     # --- Tool Confirmation Logic --- 
+                     # Check if this tool requires confirmation based on app_config
+                     # if tool_name in self.app_config.tools_requires_confirmation:
+                     #     self._emit_tool_confirm(tool_name, tool_input, session_id)
+                     #     # --- PAUSE execution and wait for confirmation ---
+                     #     # This requires a mechanism (e.g., asyncio.Event, queue)
+                     #     # signaled by the /confirm_tool route in app.py
+                     #     # confirmed = await wait_for_confirmation(session_id, tool_name)
+                     #     # if not confirmed:
+                     #     #     # TODO: Inject a ToolMessage indicating denial? How to interrupt?
+                     #     #     self._emit_status(f"Tool call {tool_name} denied by user.", session_id)
+                     #     #     # Need a way to stop the agent gracefully here or raise specific exception
+                     #     #     raise ToolDeniedException(f"Tool {tool_name} denied.")
+                     #     # else:
+                     #     #     self._emit_status(f"Tool call {tool_name} confirmed.", session_id)
+                     pass # Continue tool execution if confirmed or not needed
+
+                elif kind == "on_tool_end":
+                    tool_output = event["data"].get("output")
+                    tool_name = event["name"]
+                    print(f"[AgentRunner:{session_id}] Event 'on_tool_end': name={tool_name}, output={tool_output}, full_event={event}") # Added log
+                    # Check if output is ToolMessage and status is error?
+                    if isinstance(tool_output, ToolMessage) and tool_output.status != 'success':
+                        self._emit_status(f"Tool {tool_name} failed: {tool_output.content}", session_id)
+                    else:
+                        # Optionally show tool output (can be large)
+                        # self._emit_status(f"Tool {tool_name} finished.", session_id)
+                        pass
+                        
+                elif kind == "on_chain_end":
+                     # Can check event["name"] == "agent" to confirm it's the main agent loop
+                     # print(f"DEBUG Chain End: {event[\"name\"]}")
+                     pass
+                
+                elif kind == "on_chain_error" or kind == "on_tool_error" or kind == "on_chat_model_error" or kind == "on_retriever_error":
+                     # Handle various errors
+                     error_content = event["data"].get("error", "Unknown error")
+                     print(f"[AgentRunner:{session_id}] Event 'error': kind={kind}, error={error_content}, full_event={event}") # Added log
+                     self._emit_error(f"Error during execution: {error_content}", session_id)
+                     status = "failed"
+                     final_output[:] = [str(error_content)]
+                     # Decide whether to break or continue
+                     break
 
+        except asyncio.CancelledError:
+            reason = cancel_token.reason if cancel_token and cancel_token.reason else "cancelled"
+            self._emit_status(f"Run stopped: {reason}", session_id)
+            status = "cancelled"
+            final_output[:] = [reason]
         except Exception as e:
             import traceback
             self._emit_error(f"Agent run failed: {e}\n{traceback.format_exc()}", session_id)
+            status = "failed"
+            final_output[:] = [str(e)]
         finally:
+            if deadline_timer:
+                deadline_timer.cancel()
+            if usage.input_tokens:
+                print(f"[AgentRunner:{session_id}] Usage: {usage}")
+            if on_finish:
+                try:
+                    on_finish({"status": status, "output": "".join(final_output),
+                               "input_tokens": usage.input_tokens, "output_tokens": usage.output_tokens})
+                except Exception as e:
+                    print(f"[AgentRunner:{session_id}] on_finish callback failed: {e}")
             self._emit_status("Finished", session_id)
             # Signal end of stream for this request
             self.output_queue.put(None)
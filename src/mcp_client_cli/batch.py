@@ -0,0 +1,205 @@
+"""Non-interactive batch mode: run many prompts from a JSONL file with one set of tools and model.
+
+Each input line is either a JSON string or an object with a "prompt" field and an
+optional "id". Results are written as JSONL in completion order:
+
+    {"line": 3, "id": "...", "thread_id": "...", "answer": "...",
+     "tool_calls": [{"name": ..., "args": {...}}], "latency_ms": 1234,
+     "usage": {"input_tokens": 10, "cached_input_tokens": 0, "output_tokens": 20}, "error": null}
+
+`cached_input_tokens` counts input tokens the provider read from its prompt cache.
+A line that cannot be parsed gets a result with only "line" and "error" set.
+
+When the output is a file that already has results, lines recorded there are
+skipped, so a crashed batch resumes where it stopped. Everything else the run
+prints (tool calls, fallbacks, rate limiting) goes to stderr, so results written
+to stdout stay valid JSONL.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import dataclasses
+import json
+import sys
+import time
+import uuid
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+from .config import AppConfig
+
+
+class StartRateLimiter:
+    """Spaces out prompt starts to at most `per_minute` per minute (`--rate`).
+
+    Model calls are limited separately by `rate_limit.RateLimiter`.
+    """
+
+    def __init__(self, per_minute: Optional[float]):
+        self.interval = 60.0 / per_minute if per_minute else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def completed_lines(output_path: Optional[Path]) -> set[int]:
+    """Line numbers that already have a result in an existing output file."""
+    done = set()
+    if not output_path or not output_path.exists():
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["line"])
+            except (ValueError, KeyError, TypeError):
+                # A partially written last line from a crash
+                continue
+    return done
+
+
+def iter_prompts(path: Path, skip: set[int], offset: int = 0) -> Iterator[tuple[int, Optional[dict], Optional[str]]]:
+    """Yield (line number, item, error) for every prompt still to run, reading the file lazily.
+
+    A line that is not a JSON string or an object with a string "prompt" comes
+    with an error message instead of an item, so one bad line doesn't stop the batch.
+    """
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, start=1):
+            if number <= offset or number in skip or not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield number, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(item, str):
+                item = {"prompt": item}
+            if not isinstance(item, dict) or not isinstance(item.get("prompt"), str):
+                yield number, None, 'Expected a JSON string or an object with a string "prompt"'
+                continue
+            yield number, item, None
+
+
+def summarize_messages(messages: list) -> dict:
+    """Answer, tool calls and token usage from the messages of one run."""
+    from langchain_core.messages import AIMessage
+    from .prompt_builder import TokenUsage
+
+    tool_calls, usage = [], TokenUsage()
+    answer = ""
+    for message in messages:
+        if not isinstance(message, AIMessage):
+            continue
+        usage.add(message.usage_metadata)
+        tool_calls.extend({"name": tc.get("name"), "args": tc.get("args")}
+                          for tc in message.tool_calls)
+        if message.content and not message.tool_calls:
+            answer = message.content if isinstance(message.content, str) else str(message.content)
+    return {
+        "answer": answer,
+        "tool_calls": tool_calls,
+        "usage": usage.as_dict(),
+    }
+
+
+async def run_batch(args: argparse.Namespace, app_config: AppConfig) -> None:
+    """Run every prompt in `args.batch` with `args.concurrency` concurrent agents."""
+    results = sys.stdout
+    # Tools and the model wrappers log with print; keep their lines out of the results
+    with contextlib.redirect_stdout(sys.stderr):
+        await _run_batch(args, app_config, results)
+
+
+async def _run_batch(args: argparse.Namespace, app_config: AppConfig, results: TextIO) -> None:
+    from langchain_core.messages import HumanMessage
+    from langgraph.prebuilt import create_react_agent
+    from .cli import build_server_configs, create_model, load_tools
+    from .memory import AgentState
+    from .prompt_builder import build_prompt, prompt_memories, prompt_time
+    from .storage import Storage
+
+    if args.model:
+        app_config = dataclasses.replace(
+            app_config, llm=dataclasses.replace(app_config.llm, model=args.model))
+    output_path = Path(args.batch_output) if args.batch_output else None
+    skip = completed_lines(output_path)
+    if skip:
+        print(f"[batch] Resuming: {len(skip)} prompts already have results in {output_path}", file=sys.stderr)
+
+    toolkits, tools = await load_tools(build_server_configs(app_config), args.no_tools, args.force_refresh)
+    if not args.no_confirmations:
+        # Nobody is there to confirm, so leave those tools out
+        tools = [t for t in tools if t.name not in app_config.tools_requires_confirmation]
+    model = create_model(app_config)
+    prompt = build_prompt(app_config.system_prompt)
+    limiter = StartRateLimiter(args.rate)
+    out: TextIO = open(output_path, "a", encoding="utf-8") if output_path else results
+    if skip or (output_path and output_path.stat().st_size):
+        with open(output_path, "rb") as f:
+            f.seek(-1, 2)
+            if f.read(1) != b"\n":
+                out.write("\n")  # Terminate a line cut off by a crash
+    counts = {"ok": 0, "failed": 0}
+
+    try:
+        storage = await Storage.shared()
+        checkpointer, store = storage.checkpointer, storage.store
+        memories, _ = await prompt_memories(store)
+        agent_executor = create_react_agent(
+            model, tools, state_schema=AgentState,
+            state_modifier=prompt, checkpointer=checkpointer, store=store
+        )
+        prompts = iter_prompts(Path(args.batch), skip, args.batch_offset)
+
+        async def run_one(number: int, item: dict) -> dict:
+            thread_id = uuid.uuid4().hex
+            result = {"line": number, "id": item.get("id"), "thread_id": thread_id}
+            await limiter.acquire()
+            started = time.monotonic()
+            try:
+                state = await agent_executor.ainvoke(
+                    AgentState(
+                        messages=[HumanMessage(content=item["prompt"])],
+                        today_datetime=prompt_time(),
+                        memories=memories,
+                        remaining_steps=3
+                    ),
+                    config={"configurable": {"thread_id": thread_id, "user_id": "myself"},
+                            "recursion_limit": 100}
+                )
+                result.update(summarize_messages(state["messages"][1:]))
+                result["error"] = None
+            except Exception as e:
+                result.update(answer=None, tool_calls=[], usage=None, error=str(e))
+            result["latency_ms"] = int((time.monotonic() - started) * 1000)
+            return result
+
+        async def worker() -> None:
+            # Prompts are pulled lazily, so the input file is never loaded at once
+            for number, item, error in prompts:
+                if error:
+                    result = {"line": number, "id": None, "thread_id": None, "answer": None,
+                              "tool_calls": [], "usage": None, "error": error, "latency_ms": 0}
+                else:
+                    result = await run_one(number, item)
+                counts["failed" if result["error"] else "ok"] += 1
+                out.write(json.dumps(result, ensure_ascii=False) + "\n")
+                out.flush()
+
+        await asyncio.gather(*(worker() for _ in range(max(args.concurrency, 1))))
+    finally:
+        if out is not results:
+            out.close()
+        for toolkit in toolkits:
+            await toolkit.close()
+    print(f"[batch] Done: {counts['ok']} succeeded, {counts['failed']} failed", file=sys.stderr)
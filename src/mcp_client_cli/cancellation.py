@@ -0,0 +1,58 @@
+"""Cancellation and deadlines for agent runs."""
+
+import threading
+import time
+from typing import Callable, Optional
+
+
+class CancellationToken:
+    """Thread-safe cancellation signal with an optional overall deadline.
+
+    The deadline is counted from `start()`, so time spent waiting in a queue
+    does not count against the run. Callbacks registered with `on_cancel` run
+    once, on the thread that cancels the token.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout
+        self.deadline: Optional[float] = None
+        self.reason: Optional[str] = None
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list[Callable[[], None]] = []
+
+    def start(self) -> None:
+        """Start the deadline clock (wall-clock epoch seconds)."""
+        if self.timeout is not None and self.deadline is None:
+            self.deadline = time.time() + self.timeout
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def remaining(self) -> Optional[float]:
+        """Seconds left until the deadline, or None if there is no deadline."""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.time(), 0.0)
+
+    def on_cancel(self, callback: Callable[[], None]) -> None:
+        """Register a callback; it runs immediately if already cancelled."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def cancel(self, reason: str = "cancelled") -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"[CancellationToken] Cancel callback failed: {e}")
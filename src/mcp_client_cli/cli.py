@@ -2,42 +2,31 @@
 
 """
 Simple llm CLI that acts as TeleVault.
+
+Heavy dependencies (langchain, langgraph, rich, provider SDKs, MCP) are imported
+inside the functions that need them, so paths like `--list-prompts` or handing a
+query to the local agent daemon start quickly.
 """
 
-from datetime import datetime
 import argparse
 import asyncio
+import dataclasses
 import os
-from typing import Annotated, TypedDict
+from typing import TYPE_CHECKING
 import uuid
 import sys
 import re
-import anyio
-from langchain_core.messages import BaseMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.language_models.chat_models import BaseChatModel
-from langgraph.prebuilt import create_react_agent
-from langgraph.managed import IsLastStep
-from langgraph.graph.message import add_messages
-from langchain.chat_models import init_chat_model
-from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
-from rich.console import Console
-from rich.table import Table
 import base64
-import imghdr as imghdr
-import mimetypes
 
-from .input import *
+from .input import get_clipboard_content, read_stdin
 from .const import *
-from .output import *
-from .storage import *
-from .tool import *
 from .prompt import *
-from .memory import *
-from .config import AppConfig
+from .config import AppConfig, config_service
 
-# Import AgentState from memory.py
-from .memory import AgentState 
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+    from langchain_core.messages import HumanMessage
+    from .tool import McpServerConfig
 
 # The AgentState class definition is removed from here
 # class AgentState(TypedDict):
@@ -54,22 +43,55 @@ from .memory import AgentState
 async def run() -> None:
     """Run the LLM agent."""
     args = setup_argument_parser()
-    query, is_conversation_continuation = parse_query(args)
-    app_config = AppConfig.load()
-    
+    try:
+        await dispatch(args)
+    finally:
+        # Close the shared conversations.db connection if this run opened it
+        storage_module = sys.modules.get(f"{__package__}.storage")
+        if storage_module:
+            await storage_module.Storage.close_shared()
+
+async def dispatch(args: argparse.Namespace) -> None:
+    """Run the command selected by the arguments."""
+    if args.list_prompts:
+        handle_list_prompts()
+        return
+
+    if args.daemon:
+        from .daemon import serve
+        await serve()
+        return
+
+    if args.batch:
+        from .batch import run_batch
+        await run_batch(args, config_service.current())
+        return
+
     if args.list_tools:
-        await handle_list_tools(app_config, args)
+        await handle_list_tools(config_service.current(), args)
         return
     
     if args.show_memories:
         await handle_show_memories()
         return
-        
-    if args.list_prompts:
-        handle_list_prompts()
+
+    if args.consolidate_memories:
+        from .consolidation import consolidate_memories
+        from .storage import Storage
+        stats = await consolidate_memories(await Storage.shared())
+        print(f"Consolidated {stats['namespaces']} namespaces: "
+              f"{stats['merged']} duplicates merged, {stats['dropped']} stale memories dropped")
         return
-        
-    await handle_conversation(args, query, is_conversation_continuation, app_config)
+
+    content, is_conversation_continuation = await parse_query_content(args)
+    if not args.no_daemon and not args.force_refresh:
+        from .daemon import run_via_daemon
+        if await run_via_daemon(args, content, is_conversation_continuation):
+            return
+
+    from langchain_core.messages import HumanMessage
+    query = HumanMessage(content=content)
+    await handle_conversation(args, query, is_conversation_continuation, config_service.current())
 
 def setup_argument_parser() -> argparse.Namespace:
     """Setup and return the argument parser."""
@@ -106,15 +128,38 @@ Examples:
                        help='Do not add any tools')
     parser.add_argument('--no-intermediates', action='store_true',
                        help='Only print the final message')
+    parser.add_argument('--consolidate-memories', action='store_true',
+                       help='Merge near-duplicate memories and drop stale ones, then exit')
     parser.add_argument('--show-memories', action='store_true',
                        help='Show user memories')
     parser.add_argument('--model',
                        help='Override the model specified in config')
+    parser.add_argument('--show-usage', action='store_true',
+                       help="Print token usage, including the share of input tokens read from the provider's prompt cache")
+    parser.add_argument('--daemon', action='store_true',
+                       help='Run a local agent daemon that keeps MCP servers and the model warm')
+    parser.add_argument('--no-daemon', action='store_true',
+                       help='Run in this process even if an agent daemon is running')
+    parser.add_argument('--batch', metavar='PROMPTS_JSONL',
+                       help='Run every prompt in a JSONL file and write results as JSONL')
+    parser.add_argument('--batch-output', metavar='RESULTS_JSONL',
+                       help='Append batch results to this file (default: stdout); prompts already in it are skipped')
+    parser.add_argument('--batch-offset', type=int, default=0,
+                       help='Skip the first N lines of the batch file')
+    parser.add_argument('--concurrency', type=int, default=4,
+                       help='Prompts run at once in batch mode')
+    parser.add_argument('--rate', type=float,
+                       help='Maximum prompts started per minute in batch mode')
+    parser.add_argument('--chunk-size', type=int, default=INPUT_CHUNK_CHARS,
+                       help='Characters per chunk when condensing piped text that is too large to send at once')
+    parser.add_argument('--map-concurrency', type=int, default=MAP_CONCURRENCY,
+                       help='Concurrent model calls when condensing large piped text')
     return parser.parse_args()
 
-async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) -> None:
-    """Handle the --list-tools command."""
-    server_configs = [
+def build_server_configs(app_config: AppConfig) -> list["McpServerConfig"]:
+    """Build MCP server configs for all enabled servers."""
+    from .tool import McpServerConfig, StdioServerParameters
+    return [
         McpServerConfig(
             server_name=name,
             server_param=StdioServerParameters(
@@ -122,10 +167,47 @@ async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) ->
                 args=config.args or [],
                 env={**(config.env or {}), **os.environ}
             ),
-            exclude_tools=config.exclude_tools or []
+            exclude_tools=config.exclude_tools or [],
+            tool_timeout=config.tool_timeout,
         )
         for name, config in app_config.get_enabled_servers().items()
     ]
+
+def create_model(app_config: AppConfig) -> "BaseChatModel":
+    """Initialize the chat model described by the config."""
+    from langchain.chat_models import init_chat_model
+    from .prompt_builder import stream_usage_kwargs
+    from .response_cache import with_response_cache
+    from .routing import init_routed_model
+
+    def init(llm):
+        extra_body = {}
+        if llm.base_url and "openrouter" in llm.base_url:
+            extra_body = {"transforms": ["middle-out"]}
+        return init_chat_model(
+            model=llm.model,
+            model_provider=llm.provider,
+            api_key=llm.api_key,
+            temperature=llm.temperature,
+            base_url=llm.base_url,
+            timeout=llm.timeout,
+            default_headers={
+                "X-Title": "mcp-client-cli",
+                "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
+            },
+            extra_body=extra_body,
+            **stream_usage_kwargs(llm.provider),
+        )
+
+    return with_response_cache(init_routed_model(app_config.llm, init), app_config)
+
+async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) -> None:
+    """Handle the --list-tools command."""
+    from rich.console import Console
+    from rich.table import Table
+    from .tool import McpTool
+
+    server_configs = build_server_configs(app_config)
     toolkits, tools = await load_tools(server_configs, args.no_tools, args.force_refresh)
     
     console = Console()
@@ -145,8 +227,13 @@ async def handle_list_tools(app_config: AppConfig, args: argparse.Namespace) ->
 
 async def handle_show_memories() -> None:
     """Handle the --show-memories command."""
-    store = SqliteStore(SQLITE_DB)
-    memories = await get_memories(store)
+    from rich.console import Console
+    from rich.table import Table
+    from .memory import get_memories
+    from .storage import Storage
+
+    store = (await Storage.shared()).store
+    memories = await get_memories(store, limit=1000)
     console = Console()
     table = Table(title="My LLM Memories")
     for memory in memories:
@@ -155,6 +242,9 @@ async def handle_show_memories() -> None:
 
 def handle_list_prompts() -> None:
     """Handle the --list-prompts command."""
+    from rich.console import Console
+    from rich.table import Table
+
     console = Console()
     table = Table(title="Available Prompt Templates")
     table.add_column("Name", style="cyan")
@@ -166,15 +256,18 @@ def handle_list_prompts() -> None:
         
     console.print(table)
 
-async def load_tools(server_configs: list[McpServerConfig], no_tools: bool, force_refresh: bool) -> tuple[list, list]:
+async def load_tools(server_configs: list["McpServerConfig"], no_tools: bool, force_refresh: bool) -> tuple[list, list]:
     """Load and convert MCP tools to LangChain tools."""
     if no_tools:
         return [], []
+    import anyio
+    from .memory import save_memory
+    from .tool import convert_mcp_to_langchain_tools
         
     toolkits = []
     langchain_tools = []
     
-    async def convert_toolkit(server_config: McpServerConfig):
+    async def convert_toolkit(server_config: "McpServerConfig"):
         toolkit = await convert_mcp_to_langchain_tools(server_config, force_refresh)
         toolkits.append(toolkit)
         langchain_tools.extend(toolkit.get_tools())
@@ -183,103 +276,101 @@ async def load_tools(server_configs: list[McpServerConfig], no_tools: bool, forc
         for server_param in server_configs:
             tg.start_soon(convert_toolkit, server_param)
             
+    # Servers finish loading in any order; a fixed order keeps the prompt prefix cacheable
+    langchain_tools.sort(key=lambda t: t.name)
     langchain_tools.append(save_memory)
     return toolkits, langchain_tools
 
-async def handle_conversation(args: argparse.Namespace, query: HumanMessage, 
+async def handle_conversation(args: argparse.Namespace, query: "HumanMessage", 
                             is_conversation_continuation: bool, app_config: AppConfig) -> None:
     """Handle the main conversation flow."""
-    server_configs = [
-        McpServerConfig(
-            server_name=name,
-            server_param=StdioServerParameters(
-                command=config.command,
-                args=config.args or [],
-                env={**(config.env or {}), **os.environ}
-            ),
-            exclude_tools=config.exclude_tools or []
-        )
-        for name, config in app_config.get_enabled_servers().items()
-    ]
+    from langgraph.prebuilt import create_react_agent
+    from .memory import AgentState
+    from .output import OutputHandler
+    from .prompt_builder import TokenUsage, build_prompt, prompt_memories, prompt_time
+    from .storage import Storage
+
+    server_configs = build_server_configs(app_config)
     toolkits, tools = await load_tools(server_configs, args.no_tools, args.force_refresh)
     
-    extra_body = {}
-    if app_config.llm.base_url and "openrouter" in app_config.llm.base_url:
-        extra_body = {"transforms": ["middle-out"]}
     # Override model if specified in command line
     if args.model:
-        app_config.llm.model = args.model
-        
-    model: BaseChatModel = init_chat_model(
-        model=app_config.llm.model,
-        model_provider=app_config.llm.provider,
-        api_key=app_config.llm.api_key,
-        temperature=app_config.llm.temperature,
-        base_url=app_config.llm.base_url,
-        default_headers={
-            "X-Title": "mcp-client-cli",
-            "HTTP-Referer": "https://github.com/adhikasp/mcp-client-cli",
-        },
-        extra_body=extra_body
+        app_config = dataclasses.replace(
+            app_config, llm=dataclasses.replace(app_config.llm, model=args.model))
+    model = create_model(app_config)
+
+    # Stable content first, so the provider can reuse its cached prompt prefix
+    prompt = build_prompt(app_config.system_prompt)
+
+    storage = await Storage.shared()
+    checkpointer, store = storage.checkpointer, storage.store
+    conversation_manager = storage.conversations
+    memories, context_memories = await prompt_memories(
+        store, query=query.content if isinstance(query.content, str) else None)
+    agent_executor = create_react_agent(
+        model, tools, state_schema=AgentState, 
+        state_modifier=prompt, checkpointer=checkpointer, store=store
     )
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", app_config.system_prompt),
-        ("placeholder", "{messages}")
-    ])
-
-    conversation_manager = ConversationManager(SQLITE_DB)
     
-    async with AsyncSqliteSaver.from_conn_string(SQLITE_DB) as checkpointer:
-        store = SqliteStore(SQLITE_DB)
-        memories = await get_memories(store)
-        formatted_memories = "\n".join(f"- {memory}" for memory in memories)
-        agent_executor = create_react_agent(
-            model, tools, state_schema=AgentState, 
-            state_modifier=prompt, checkpointer=checkpointer, store=store
-        )
-        
-        thread_id = (await conversation_manager.get_last_id() if is_conversation_continuation 
-                    else uuid.uuid4().hex)
-
-        input_messages = AgentState(
-            messages=[query], 
-            today_datetime=datetime.now().isoformat(),
-            memories=formatted_memories,
-            remaining_steps=3
-        )
+    thread_id = (await conversation_manager.get_last_id() if is_conversation_continuation 
+                else uuid.uuid4().hex)
+
+    input_messages = AgentState(
+        messages=[query], 
+        today_datetime=prompt_time(),
+        memories=memories,
+        context_memories=context_memories,
+        remaining_steps=3
+    )
 
-        output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
-        output.start()
-        try:
-            async for chunk in agent_executor.astream(
-                input_messages,
-                stream_mode=["messages", "values"],
-                config={"configurable": {"thread_id": thread_id, "user_id": "myself"}, 
-                       "recursion_limit": 100}
-            ):
-                output.update(chunk)
-                if not args.no_confirmations:
-                    if not output.confirm_tool_call(app_config.__dict__, chunk):
-                        break
-        except Exception as e:
-            output.update_error(e)
-        finally:
-            output.finish()
-
-        await conversation_manager.save_id(thread_id, checkpointer.conn)
+    output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
+    output.start()
+    usage = TokenUsage()
+    try:
+        async for chunk in agent_executor.astream(
+            input_messages,
+            stream_mode=["messages", "values"],
+            config={"configurable": {"thread_id": thread_id, "user_id": "myself"}, 
+                   "recursion_limit": 100}
+        ):
+            if chunk[0] == "messages":
+                usage.add(getattr(chunk[1][0], "usage_metadata", None))
+            output.update(chunk)
+            if not args.no_confirmations:
+                if not output.confirm_tool_call(app_config.__dict__, chunk):
+                    break
+    except Exception as e:
+        output.update_error(e)
+    finally:
+        output.finish()
+    if args.show_usage:
+        print(f"Usage: {usage}", file=sys.stderr)
+
+    await conversation_manager.save_id(thread_id)
 
     for toolkit in toolkits:
         await toolkit.close()
 
-def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
+async def parse_query(args: argparse.Namespace) -> tuple["HumanMessage", bool]:
     """
     Parse the query from command line arguments.
     Returns a tuple of (HumanMessage, is_conversation_continuation).
     """
+    from langchain_core.messages import HumanMessage
+    content, is_continuation = await parse_query_content(args)
+    return HumanMessage(content=content), is_continuation
+
+async def parse_query_content(args: argparse.Namespace) -> tuple[str | list, bool]:
+    """
+    Parse the query from command line arguments into message content.
+    Returns a tuple of (content, is_conversation_continuation).
+
+    Piped text too large to send at once is condensed map-reduce style first.
+    """
     query_parts = ' '.join(args.query).split()
     stdin_content = ""
     stdin_image = None
+    stdin_chunks = None
     is_continuation = False
 
     # Handle clipboard content if requested
@@ -299,16 +390,17 @@ def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
             raise Exception("Clipboard is empty")
     # Check if there's input from pipe
     elif not sys.stdin.isatty():
-        stdin_data = sys.stdin.buffer.read()
-        # Try to detect if it's an image
-        image_type = imghdr.what(None, h=stdin_data)
-        if image_type:
+        stdin_input = read_stdin(sys.stdin.buffer, MAX_INLINE_INPUT_BYTES, args.chunk_size)
+        if stdin_input.image:
             # It's an image, encode it as base64
-            stdin_image = base64.b64encode(stdin_data).decode('utf-8')
-            mime_type = mimetypes.guess_type(f"dummy.{image_type}")[0] or f"image/{image_type}"
+            stdin_image = base64.b64encode(stdin_input.image).decode('utf-8')
+            mime_type = stdin_input.mime_type
+        elif stdin_input.chunks:
+            # Too large for one message, condensed once the query is known
+            stdin_chunks = stdin_input.chunks
         else:
             # It's text
-            stdin_content = stdin_data.decode('utf-8').strip()
+            stdin_content = stdin_input.text.strip()
 
     # Process the query text
     query_text = ""
@@ -321,7 +413,7 @@ def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
             if template_name not in prompt_templates:
                 print(f"Error: Prompt template '{template_name}' not found.")
                 print("Available templates:", ", ".join(prompt_templates.keys()))
-                return HumanMessage(content=""), False
+                return "", False
 
             template = prompt_templates[template_name]
             template_args = query_parts[2:]
@@ -333,17 +425,22 @@ def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
                 query_text = template.format(**template_vars)
             except KeyError as e:
                 print(f"Error: Missing argument {e}")
-                return HumanMessage(content=""), False
+                return "", False
         else:
             query_text = ' '.join(query_parts)
 
+    if stdin_chunks:
+        stdin_content = await condense_stdin(args, stdin_chunks, query_text)
+        if stdin_content is None:
+            return "", False
+
     # Combine stdin content with query text if both exist
     if stdin_content and query_text:
         query_text = f"{stdin_content}\n\n{query_text}"
     elif stdin_content:
         query_text = stdin_content
     elif not query_text and not stdin_image:
-        return HumanMessage(content=""), False
+        return "", False
 
     # Create the message content
     if stdin_image:
@@ -354,7 +451,27 @@ def parse_query(args: argparse.Namespace) -> tuple[HumanMessage, bool]:
     else:
         content = query_text
 
-    return HumanMessage(content=content), is_continuation
+    return content, is_continuation
+
+async def condense_stdin(args: argparse.Namespace, chunks, query_text: str) -> str | None:
+    """Condense large piped text into notes with concurrent model calls.
+
+    Returns None, after printing why, if the input could not be condensed.
+    """
+    from .condense import CondenseError, condense
+
+    app_config = config_service.current()
+    if args.model:
+        app_config = dataclasses.replace(
+            app_config, llm=dataclasses.replace(app_config.llm, model=args.model))
+    try:
+        notes, parts = await condense(chunks, query_text, create_model(app_config),
+                                      max_chars=args.chunk_size, concurrency=args.map_concurrency)
+    except CondenseError as e:
+        print(f"Error: Could not condense the piped input: {e}", file=sys.stderr)
+        return None
+    return (f"The piped input was too large to include directly. These notes were extracted "
+            f"from its {parts} parts:\n\n{notes}")
 
 def main() -> None:
     """Entry point of the script."""
@@ -0,0 +1,124 @@
+"""Map-reduce condensing of input too large to send to the model in one message."""
+
+import asyncio
+import sys
+from typing import Iterator
+
+MAP_PROMPT = (
+    "You are reading part {index} of a larger input. The user's request about the whole input is:\n"
+    "{question}\n\n"
+    "Extract everything from this part that is relevant to the request: facts, errors, numbers, "
+    "names and short verbatim quotes where they matter. Be concise and do not answer the request yet.\n\n"
+    "Part {index}:\n{chunk}"
+)
+
+REDUCE_PROMPT = (
+    "The notes below were extracted from consecutive parts of a larger input. The user's request is:\n"
+    "{question}\n\n"
+    "Merge them into one set of notes, keeping every detail relevant to the request and dropping "
+    "repetition. Do not answer the request yet.\n\n{notes}"
+)
+
+
+class CondenseError(Exception):
+    """Condensing gave up because the model could not produce any notes."""
+
+
+async def condense(chunks: Iterator[str], question: str, model, max_chars: int,
+                   concurrency: int = 4) -> tuple[str, int]:
+    """Condense a stream of text chunks into notes of at most about `max_chars`.
+
+    Map calls run concurrently, at most `concurrency` at a time, and the next
+    chunk is only read from the iterator when a slot is free, so memory stays
+    bounded however long the input is. Notes are then merged in groups until
+    they fit.
+
+    A part whose map call fails is left out with a "[Part N] failed" note, unless
+    no part has succeeded yet: then reading stops and the pending calls are
+    cancelled. A failed merge keeps the notes as they are.
+
+    Returns:
+        The notes and the number of chunks read.
+
+    Raises:
+        CondenseError: If no part could be condensed.
+    """
+    question = question or "Summarize the input."
+    slots = asyncio.Semaphore(concurrency)
+
+    async def invoke(prompt: str) -> str:
+        response = await model.ainvoke(prompt)
+        return response.content if isinstance(response.content, str) else str(response.content)
+
+    succeeded = 0
+    failure: list[Exception] = []
+
+    async def map_chunk(index: int, chunk: str) -> str:
+        nonlocal succeeded
+        try:
+            note = await invoke(MAP_PROMPT.format(index=index, question=question, chunk=chunk))
+            succeeded += 1
+            return f"[Part {index}]\n" + note
+        except Exception as e:
+            print(f"[condense] Part {index} failed: {e}", file=sys.stderr)
+            if not succeeded:
+                failure.append(e)
+            return f"[Part {index}] failed"
+        finally:
+            slots.release()
+
+    tasks = []
+    while not failure:
+        await slots.acquire()
+        if failure:
+            slots.release()
+            break
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            slots.release()
+            break
+        tasks.append(asyncio.create_task(map_chunk(len(tasks) + 1, chunk)))
+        print(f"[condense] Reading input: part {len(tasks)}...", end="\r", flush=True, file=sys.stderr)
+    if failure:
+        # Every call so far failed; the rest would most likely fail the same way
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise CondenseError(f"the first model call failed: {failure[0]}") from failure[0]
+    print(f"[condense] Read {len(tasks)} parts, waiting for notes...", file=sys.stderr)
+    notes = list(await asyncio.gather(*tasks))
+    if tasks and not succeeded:
+        raise CondenseError(f"none of the {len(tasks)} parts could be condensed")
+
+    async def reduce_group(group: list[str]) -> str:
+        async with slots:
+            return await invoke(REDUCE_PROMPT.format(question=question, notes="\n\n".join(group)))
+
+    while len(notes) > 1 and sum(len(note) for note in notes) > max_chars:
+        groups, group, size = [], [], 0
+        for note in notes:
+            if group and size + len(note) > max_chars:
+                groups.append(group)
+                group, size = [], 0
+            group.append(note[:max_chars])
+            size += len(group[-1])
+        groups.append(group)
+        if len(groups) == len(notes):
+            # Every note fills a group on its own; merge pairs to make progress
+            groups = [notes[i:i + 2] for i in range(0, len(notes), 2)]
+        else:
+            for note in notes:
+                if len(note) > max_chars:
+                    print(f"[condense] Truncating a {len(note)}-character note to {max_chars}", file=sys.stderr)
+        print(f"[condense] Merging {len(notes)} notes into {len(groups)}...", file=sys.stderr)
+        merged = await asyncio.gather(*(reduce_group(g) for g in groups), return_exceptions=True)
+        error = next((m for m in merged if isinstance(m, Exception)), None)
+        if error:
+            print(f"[condense] Merging notes failed: {error}; keeping them unmerged", file=sys.stderr)
+            break
+        notes = merged
+
+    result = "\n\n".join(notes)
+    if len(result) > max_chars:
+        print(f"[condense] Truncating {len(result)} characters of notes to {max_chars}", file=sys.stderr)
+    return result[:max_chars], len(tasks)
@@ -2,13 +2,36 @@
 
 from dataclasses import dataclass
 from pathlib import Path
+import logging
 import os
+import threading
+import time
 import commentjson
-from typing import Dict, List, Optional
+from typing import Callable, Dict, FrozenSet, List, Optional, Tuple
 
 from .const import CONFIG_FILE, CONFIG_DIR
 
-@dataclass
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RateLimitConfig:
+    """Client-side limits on calls to one model, shared by the whole process."""
+    requests_per_minute: Optional[int] = None
+    tokens_per_minute: Optional[int] = None
+    max_concurrency: int = 8
+    max_retries: int = 3
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "RateLimitConfig":
+        """Create RateLimitConfig from dictionary."""
+        return cls(
+            requests_per_minute=config.get("requests_per_minute"),
+            tokens_per_minute=config.get("tokens_per_minute"),
+            max_concurrency=config.get("max_concurrency", cls.max_concurrency),
+            max_retries=config.get("max_retries", cls.max_retries),
+        )
+
+@dataclass(frozen=True)
 class LLMConfig:
     """Configuration for the LLM model."""
     model: str = "gpt-4o"
@@ -16,19 +39,76 @@ class LLMConfig:
     api_key: Optional[str] = None
     temperature: float = 0
     base_url: Optional[str] = None
+    timeout: Optional[float] = None
+    # Models tried after this one, in order (their own fallbacks are ignored)
+    fallbacks: Tuple["LLMConfig", ...] = ()
+    # Percentile of recent first-chunk latencies after which a fallback is hedged; None disables hedging
+    hedge_percentile: Optional[float] = 95
+    # Seconds to wait before hedging while latencies are unknown, and at most once they are
+    hedge_delay: float = 5.0
+    rate_limit: RateLimitConfig = RateLimitConfig()
 
     @classmethod
     def from_dict(cls, config: dict) -> "LLMConfig":
         """Create LLMConfig from dictionary."""
+        temperature = config.get("temperature", cls.temperature)
         return cls(
             model=config.get("model", cls.model),
             provider=config.get("provider", cls.provider),
             api_key=config.get("api_key", os.getenv("LLM_API_KEY", os.getenv("OPENAI_API_KEY", ""))),
-            temperature=config.get("temperature", cls.temperature),
+            temperature=temperature,
             base_url=config.get("base_url"),
+            timeout=config.get("timeout"),
+            # Fallbacks inherit the temperature; without an api_key the provider reads its own variable
+            fallbacks=tuple(cls.from_dict({"api_key": None, "temperature": temperature, **fallback,
+                                           "fallbacks": []})
+                            for fallback in config.get("fallbacks", [])),
+            hedge_percentile=config.get("hedge_percentile", cls.hedge_percentile),
+            hedge_delay=config.get("hedge_delay", cls.hedge_delay),
+            rate_limit=RateLimitConfig.from_dict(config.get("rate_limit", {})),
         )
 
-@dataclass
+@dataclass(frozen=True)
+class EmbeddingConfig:
+    """Configuration for the embedder used by semantic memory search."""
+    provider: Optional[str] = None
+    dims: int = 256
+    model_path: Optional[str] = None
+    batch_size: int = 256
+    quantization: Optional[str] = None
+    rerank: int = 4
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "EmbeddingConfig":
+        """Create EmbeddingConfig from dictionary."""
+        return cls(
+            provider=config.get("provider", cls.provider),
+            dims=config.get("dims", cls.dims),
+            model_path=config.get("model_path"),
+            batch_size=config.get("batch_size", cls.batch_size),
+            quantization=config.get("quantization"),
+            rerank=config.get("rerank", cls.rerank),
+        )
+
+@dataclass(frozen=True)
+class ResponseCacheConfig:
+    """Configuration for the cache of deterministic model responses."""
+    enabled: bool = False
+    ttl_seconds: float = 86400
+    max_mb: float = 64
+    path: Optional[str] = None
+
+    @classmethod
+    def from_dict(cls, config: dict) -> "ResponseCacheConfig":
+        """Create ResponseCacheConfig from dictionary."""
+        return cls(
+            enabled=config.get("enabled", cls.enabled),
+            ttl_seconds=config.get("ttl_seconds", cls.ttl_seconds),
+            max_mb=config.get("max_mb", cls.max_mb),
+            path=config.get("path"),
+        )
+
+@dataclass(frozen=True)
 class ServerConfig:
     """Configuration for an MCP server."""
     command: str
@@ -37,6 +117,7 @@ class ServerConfig:
     enabled: bool = True
     exclude_tools: List[str] = None
     requires_confirmation: List[str] = None
+    tool_timeout: Optional[float] = None
 
     @classmethod
     def from_dict(cls, config: dict) -> "ServerConfig":
@@ -47,27 +128,44 @@ class ServerConfig:
             env=config.get("env", {}),
             enabled=config.get("enabled", True),
             exclude_tools=config.get("exclude_tools", []),
-            requires_confirmation=config.get("requires_confirmation", [])
+            requires_confirmation=config.get("requires_confirmation", []),
+            tool_timeout=config.get("tool_timeout"),
         )
 
-@dataclass
+@dataclass(frozen=True)
 class AppConfig:
-    """Main application configuration."""
+    """Main application configuration.
+
+    Instances are immutable snapshots; `version` increases each time the
+    config service publishes a changed file.
+    """
     llm: LLMConfig
     system_prompt: str
     mcp_servers: Dict[str, ServerConfig]
     tools_requires_confirmation: List[str]
+    embeddings: EmbeddingConfig = EmbeddingConfig()
+    response_cache: ResponseCacheConfig = ResponseCacheConfig()
+    version: int = 0
 
-    @classmethod
-    def load(cls) -> "AppConfig":
-        """Load configuration from file."""
+    @staticmethod
+    def find_path() -> Path:
+        """Return the first existing config file."""
         config_paths = [CONFIG_FILE, CONFIG_DIR / "config.json"]
         chosen_path = next((path for path in config_paths if os.path.exists(path)), None)
         
         if chosen_path is None:
             raise FileNotFoundError(f"Could not find config file in any of: {', '.join(map(str, config_paths))}")
+        return Path(chosen_path)
 
-        with open(chosen_path, 'r') as f:
+    @classmethod
+    def load(cls) -> "AppConfig":
+        """Load configuration from file."""
+        return cls.from_file(cls.find_path())
+
+    @classmethod
+    def from_file(cls, path: Path, version: int = 0) -> "AppConfig":
+        """Parse a config file."""
+        with open(path, 'r') as f:
             config = commentjson.load(f)
 
         # Extract tools requiring confirmation
@@ -82,7 +180,10 @@ class AppConfig:
                 name: ServerConfig.from_dict(server_config)
                 for name, server_config in config["mcpServers"].items()
             },
-            tools_requires_confirmation=tools_requires_confirmation
+            tools_requires_confirmation=tools_requires_confirmation,
+            embeddings=EmbeddingConfig.from_dict(config.get("embeddings", {})),
+            response_cache=ResponseCacheConfig.from_dict(config.get("responseCache", {})),
+            version=version,
         )
 
     def get_enabled_servers(self) -> Dict[str, ServerConfig]:
@@ -91,4 +192,143 @@ class AppConfig:
             name: config 
             for name, config in self.mcp_servers.items() 
             if config.enabled
-        } 
\ No newline at end of file
+        }
+
+@dataclass(frozen=True)
+class ConfigChange:
+    """What differs between two published config snapshots."""
+    old: Optional[AppConfig]
+    new: AppConfig
+    # Changed top-level fields: "llm", "system_prompt", "mcp_servers",
+    # "tools_requires_confirmation", "embeddings", "response_cache"
+    sections: FrozenSet[str] = frozenset()
+    # Names of MCP servers that were added, removed or changed
+    servers: FrozenSet[str] = frozenset()
+
+def _diff(old: Optional[AppConfig], new: AppConfig) -> ConfigChange:
+    if old is None:
+        return ConfigChange(old, new, frozenset({"llm", "system_prompt", "mcp_servers",
+                                                 "tools_requires_confirmation", "embeddings",
+                                                 "response_cache"}),
+                            frozenset(new.mcp_servers))
+    sections = {
+        name for name in ("llm", "system_prompt", "mcp_servers", "tools_requires_confirmation",
+                     "embeddings", "response_cache")
+        if getattr(old, name) != getattr(new, name)
+    }
+    servers = {
+        name for name in old.mcp_servers.keys() | new.mcp_servers.keys()
+        if old.mcp_servers.get(name) != new.mcp_servers.get(name)
+    }
+    return ConfigChange(old, new, frozenset(sections), frozenset(servers))
+
+class ConfigService:
+    """Process-wide source of the parsed application config.
+
+    The file is parsed once and re-parsed only when its mtime or size changes.
+    `watch()` starts a background watcher (inotify/FSEvents through the optional
+    `watchdog` package, polling otherwise) that publishes new snapshots and
+    notifies subscribers with a `ConfigChange`, so long-lived components can
+    rebuild only what changed.
+    """
+
+    def __init__(self, poll_interval: float = 2.0):
+        self.poll_interval = poll_interval
+        self._lock = threading.RLock()
+        self._path: Optional[Path] = None
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._snapshot: Optional[AppConfig] = None
+        self._subscribers: List[Callable[[ConfigChange], None]] = []
+        self._watching = False
+
+    def current(self) -> AppConfig:
+        """Return the latest snapshot, loading it on first use."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.reload()
+        return snapshot
+
+    def subscribe(self, callback: Callable[[ConfigChange], None]) -> None:
+        """Call `callback` with a ConfigChange whenever a new snapshot is published."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def reload(self, force: bool = False) -> AppConfig:
+        """Re-parse the file if it changed on disk (or `force`), publishing a new snapshot."""
+        with self._lock:
+            path = self._path or AppConfig.find_path()
+            stat = os.stat(path)
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            if self._snapshot is not None and stamp == self._stamp and not force:
+                return self._snapshot
+            old = self._snapshot
+            version = old.version + 1 if old else 1
+            try:
+                new = AppConfig.from_file(path, version=version)
+            except Exception as e:
+                if old is None:
+                    raise
+                # Keep serving the last good config while the file is mid-edit or broken
+                logger.error(f"Failed to reload config {path}: {e}")
+                self._stamp = stamp
+                return old
+            self._path, self._stamp = Path(path), stamp
+            change = _diff(old, new)
+            if old is not None and not change.sections:
+                # Touched but equivalent; keep the existing snapshot and version
+                return old
+            self._snapshot = new
+            subscribers = list(self._subscribers)
+        if old is not None:
+            logger.info(f"Config reloaded (version {new.version}): changed {sorted(change.sections)}")
+        for callback in subscribers:
+            try:
+                callback(change)
+            except Exception as e:
+                logger.error(f"Config subscriber {callback!r} failed: {e}", exc_info=True)
+        return new
+
+    def watch(self) -> None:
+        """Start watching the config file for changes (idempotent)."""
+        with self._lock:
+            if self._watching:
+                return
+            self._watching = True
+        self.current()
+        try:
+            self._watch_events()
+        except ImportError:
+            logger.info("watchdog not installed; polling config file for changes")
+            threading.Thread(target=self._poll, daemon=True, name="config-poll").start()
+
+    def _watch_events(self) -> None:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        service = self
+        target = self._path.resolve()
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                paths = {getattr(event, "src_path", None), getattr(event, "dest_path", None)}
+                if any(p and Path(p).resolve() == target for p in paths):
+                    try:
+                        service.reload()
+                    except Exception as e:
+                        logger.error(f"Config reload failed: {e}")
+
+        observer = Observer()
+        observer.daemon = True
+        # Watch the directory: editors often replace the file rather than write in place
+        observer.schedule(Handler(), str(target.parent), recursive=False)
+        observer.start()
+
+    def _poll(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Config reload failed: {e}")
+
+config_service = ConfigService()
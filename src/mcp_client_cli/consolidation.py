@@ -0,0 +1,276 @@
+"""Background consolidation of long-term memories.
+
+`save_memory` stores every fact as a new item, so the memory namespaces slowly fill
+with near-duplicates that all end up in the prompt. A consolidation pass:
+
+- finds near-duplicate memories (cosine similarity of their embeddings when the
+  store has an embedder, word-shingle Jaccard similarity otherwise); starting from
+  the newest, each memory supersedes the older ones that are similar to it
+  directly, and inherits their usage counts (similarity is not transitive, so a
+  chain of paraphrases never merges two unrelated facts);
+- drops stale memories that have not been used or updated for a while;
+- optionally caps each namespace at a maximum size, dropping the least used
+  memories first.
+
+Passes are incremental: only memories updated since the previous pass of a
+namespace are compared (against the whole namespace), and the time of each pass is
+kept in the `memory_consolidation` table.
+"""
+
+import json
+import logging
+import os
+import re
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from langgraph.store.base import PutOp
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ConsolidationSettings:
+    # Cosine similarity above which two embedded memories are duplicates
+    similarity_threshold: float = 0.92
+    # Jaccard similarity of word shingles used when the store has no embedder
+    lexical_threshold: float = 0.8
+    # Memories neither updated nor used for this long are dropped...
+    stale_days: float = 90.0
+    # ...unless they were used at least this often
+    min_uses: int = 1
+    # Upper bound on memories kept per namespace (None for no bound)
+    max_items: Optional[int] = None
+
+    @classmethod
+    def from_env(cls) -> "ConsolidationSettings":
+        max_items = int(os.getenv("MEMORY_MAX_ITEMS", "0"))
+        return cls(
+            similarity_threshold=float(os.getenv("MEMORY_DEDUP_THRESHOLD", "0.92")),
+            lexical_threshold=float(os.getenv("MEMORY_LEXICAL_DEDUP_THRESHOLD", "0.8")),
+            stale_days=float(os.getenv("MEMORY_STALE_DAYS", "90")),
+            min_uses=int(os.getenv("MEMORY_MIN_USES", "1")),
+            max_items=max_items if max_items > 0 else None,
+        )
+
+
+@dataclass
+class _Memory:
+    key: str
+    text: str
+    updated_at: str
+    access_count: int
+    last_used: str
+
+
+def _memory_text(value: dict) -> str:
+    return value["data"] if isinstance(value.get("data"), str) else json.dumps(value, sort_keys=True)
+
+
+def _shingles(text: str, size: int = 2) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < size:
+        return {tuple(words)}
+    return {tuple(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+class MemoryConsolidator:
+    """Runs consolidation passes over the memory namespaces of a `storage.Storage`."""
+
+    def __init__(self, storage, settings: Optional[ConsolidationSettings] = None):
+        self.storage = storage
+        self.store = storage.store
+        self.settings = settings or ConsolidationSettings.from_env()
+
+    async def _setup(self) -> None:
+        await self.store.conn.execute("""
+            CREATE TABLE IF NOT EXISTS memory_consolidation (
+                namespace TEXT PRIMARY KEY,
+                last_pass_at TEXT NOT NULL
+            )
+        """)
+
+    async def run(self, namespace_prefix: Tuple[str, ...] = ("memories",)) -> Dict[str, int]:
+        """Consolidate every namespace under `namespace_prefix`.
+
+        Returns:
+            Dict[str, int]: Number of memories merged and dropped
+        """
+        stats = {"namespaces": 0, "merged": 0, "dropped": 0}
+        for namespace in await self.store.alist_namespaces(prefix=namespace_prefix):
+            merged, dropped = await self.consolidate_namespace(namespace)
+            stats["namespaces"] += 1
+            stats["merged"] += merged
+            stats["dropped"] += dropped
+        if stats["merged"] or stats["dropped"]:
+            logger.info(f"Memory consolidation: {stats}")
+        return stats
+
+    async def consolidate_namespace(self, namespace: Tuple[str, ...]) -> Tuple[int, int]:
+        """Run one incremental pass over a namespace.
+
+        Returns:
+            Tuple[int, int]: Number of memories merged into others and dropped as stale
+        """
+        ns = "/".join(namespace)
+        pass_started = datetime.now(timezone.utc).isoformat()
+        async with self.store.lock:
+            await self._setup()
+            async with self.store.conn.execute(
+                "SELECT last_pass_at FROM memory_consolidation WHERE namespace = ?", (ns,)
+            ) as cursor:
+                row = await cursor.fetchone()
+            last_pass = row[0] if row else ""
+            async with self.store.conn.execute(
+                """
+                SELECT i.key, i.value, i.updated_at, COALESCE(u.access_count, 0),
+                       MAX(i.updated_at, COALESCE(u.last_accessed_at, ''))
+                FROM items i
+                LEFT JOIN item_usage u ON u.namespace = i.namespace AND u.key = i.key
+                WHERE i.namespace = ?
+                """,
+                (ns,),
+            ) as cursor:
+                memories = [
+                    _Memory(key, _memory_text(json.loads(value)), updated_at, uses, last_used)
+                    for key, value, updated_at, uses, last_used in await cursor.fetchall()
+                ]
+
+        changed = [m for m in memories if m.updated_at > last_pass]
+        superseded = await self._merge_duplicates(namespace, memories, changed)
+        remaining = [m for m in memories if m.key not in superseded]
+        stale = self._stale(remaining)
+
+        to_delete = list(superseded) + list(stale)
+        if to_delete:
+            await self.store.abatch([PutOp(namespace, key, None) for key in to_delete])
+        async with self.store.lock:
+            for survivor, uses in self._inherited_uses(memories, superseded).items():
+                await self.store.conn.execute(
+                    """
+                    INSERT INTO item_usage (namespace, key, access_count, last_accessed_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT (namespace, key) DO UPDATE SET
+                        access_count = access_count + excluded.access_count
+                    """,
+                    (ns, survivor, uses, pass_started),
+                )
+            await self.store.conn.execute(
+                """
+                INSERT INTO memory_consolidation (namespace, last_pass_at) VALUES (?, ?)
+                ON CONFLICT (namespace) DO UPDATE SET last_pass_at = excluded.last_pass_at
+                """,
+                (ns, pass_started),
+            )
+            await self.store.conn.commit()
+        return len(superseded), len(stale)
+
+    async def _merge_duplicates(
+        self, namespace: Tuple[str, ...], memories: List[_Memory], changed: List[_Memory]
+    ) -> Dict[str, str]:
+        """Find the memories superseded by a newer near-duplicate of themselves.
+
+        Memories are taken newest first; each one not yet superseded absorbs the
+        remaining memories similar to it. A memory is therefore only replaced by
+        one it is itself similar to, however the duplicates chain together.
+
+        Returns:
+            Dict[str, str]: Superseded memory key -> key of the memory that replaces it
+        """
+        if not changed or len(memories) < 2:
+            return {}
+        pairs = (await self._similar_pairs_by_embedding(namespace, memories, changed)
+                 if self.store.embeddings else self._similar_pairs_by_shingles(memories, changed))
+        similar: Dict[str, set] = {}
+        for a, b in pairs:
+            similar.setdefault(a, set()).add(b)
+            similar.setdefault(b, set()).add(a)
+        superseded: Dict[str, str] = {}
+        survivors = set()
+        # Newer facts supersede older ones
+        for m in sorted(memories, key=lambda m: (m.updated_at, m.access_count), reverse=True):
+            if m.key in superseded or m.key not in similar:
+                continue
+            survivors.add(m.key)
+            for other in similar[m.key]:
+                if other not in superseded and other not in survivors:
+                    superseded[other] = m.key
+        return superseded
+
+    def _similar_pairs_by_shingles(self, memories: List[_Memory], changed: List[_Memory]):
+        shingles = {m.key: _shingles(m.text) for m in memories}
+        for m in changed:
+            a = shingles[m.key]
+            for other in memories:
+                if other.key == m.key:
+                    continue
+                b = shingles[other.key]
+                if a and b and len(a & b) / len(a | b) >= self.settings.lexical_threshold:
+                    yield m.key, other.key
+
+    async def _similar_pairs_by_embedding(
+        self, namespace: Tuple[str, ...], memories: List[_Memory], changed: List[_Memory]
+    ) -> List[Tuple[str, str]]:
+        import numpy as np
+
+        vectors = await self._vectors(namespace, memories)
+        keys = [m.key for m in memories if m.key in vectors]
+        if len(keys) < 2:
+            return []
+        matrix = np.array([vectors[k] for k in keys], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        index = {k: i for i, k in enumerate(keys)}
+        rows = [index[m.key] for m in changed if m.key in index]
+        similarities = matrix[rows] @ matrix.T
+        pairs = []
+        for row, sims in zip(rows, similarities):
+            for col in np.nonzero(sims >= self.settings.similarity_threshold)[0]:
+                if col != row:
+                    pairs.append((keys[row], keys[col]))
+        return pairs
+
+    async def _vectors(self, namespace: Tuple[str, ...], memories: List[_Memory]) -> Dict[str, list]:
+        """Stored vectors of the memories, embedding those that have none."""
+        vectors = {}
+        async with self.store.lock:
+            async with self.store.conn.execute(
+                "SELECT key, vector FROM vectors WHERE namespace = ?", ("/".join(namespace),)
+            ) as cursor:
+                for key, vector in await cursor.fetchall():
+                    vectors.setdefault(key, json.loads(vector))
+        missing = [m for m in memories if m.key not in vectors]
+        if missing:
+            embedded = await self.store.embeddings.aembed_documents([m.text for m in missing])
+            vectors.update((m.key, v) for m, v in zip(missing, embedded))
+        return vectors
+
+    def _stale(self, memories: List[_Memory]) -> List[str]:
+        settings = self.settings
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=settings.stale_days)).isoformat()
+        stale = [m.key for m in memories
+                 if m.last_used < cutoff and m.access_count < settings.min_uses]
+        if settings.max_items is not None:
+            kept = [m for m in memories if m.key not in set(stale)]
+            if len(kept) > settings.max_items:
+                kept.sort(key=lambda m: (m.access_count, m.last_used))
+                stale.extend(m.key for m in kept[:len(kept) - settings.max_items])
+        return stale
+
+    @staticmethod
+    def _inherited_uses(memories: List[_Memory], superseded: Dict[str, str]) -> Dict[str, int]:
+        uses = {m.key: m.access_count for m in memories}
+        inherited: Dict[str, int] = {}
+        for key, survivor in superseded.items():
+            if uses[key]:
+                inherited[survivor] = inherited.get(survivor, 0) + uses[key]
+        return inherited
+
+
+async def consolidate_memories(storage=None, settings: Optional[ConsolidationSettings] = None) -> Dict[str, int]:
+    """Run one consolidation pass, opening a storage connection if none is given."""
+    if storage is None:
+        from .storage import Storage
+        async with Storage() as storage:
+            return await MemoryConsolidator(storage, settings).run()
+    return await MemoryConsolidator(storage, settings).run()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 CACHE_EXPIRY_HOURS = 24
@@ -5,4 +6,12 @@ DEFAULT_QUERY = "Summarize https://www.youtube.com/watch?v=NExtKbS1Ljc"
 CONFIG_FILE = 'mcp-server-config.json'
 CONFIG_DIR = Path.home() / ".llm"
 SQLITE_DB = CONFIG_DIR / "conversations.db"
-CACHE_DIR = CONFIG_DIR / "mcp-tools"
\ No newline at end of file
+RESPONSE_CACHE_DB = CONFIG_DIR / "responses.db"
+CACHE_DIR = CONFIG_DIR / "mcp-tools"
+DEFAULT_TOOL_TIMEOUT = 120
+DAEMON_SOCKET = CONFIG_DIR / "agent.sock"
+# Seconds between memory consolidation passes in long-running processes (0 disables)
+MEMORY_CONSOLIDATE_INTERVAL = int(os.getenv("MEMORY_CONSOLIDATE_INTERVAL", "3600"))
+MAX_INLINE_INPUT_BYTES = 200 * 1024
+INPUT_CHUNK_CHARS = 24000
+MAP_CONCURRENCY = 4
@@ -0,0 +1,296 @@
+"""Local agent daemon for the `llm` CLI.
+
+`llm --daemon` keeps MCP tool sessions, chat model clients, the checkpointer and
+the memory store warm between invocations. Later `llm` calls hand their query to
+it over a Unix socket instead of starting MCP servers and importing LangChain
+from scratch.
+
+The protocol is one JSON object per line. The client sends a single request:
+
+    {"content": ..., "continuation": bool, "no_tools": bool, "model": str|null,
+     "no_confirmations": bool, "config_path": str}
+
+and the daemon streams events back:
+
+    {"type": "md", "text": ...}           rendered markdown to append
+    {"type": "confirm"}                   client answers {"confirmed": bool}
+    {"type": "error", "message": ...}
+    {"type": "unsupported", "reason": ...} client should run the query itself
+    {"type": "done", "last_message": ..., "usage": {"input_tokens": int,
+     "cached_input_tokens": int, "output_tokens": int}}
+"""
+
+import argparse
+import asyncio
+import dataclasses
+import json
+import os
+import sys
+import uuid
+from typing import Any, Optional
+
+from .config import AppConfig, ConfigChange, config_service
+from .const import DAEMON_SOCKET, MEMORY_CONSOLIDATE_INTERVAL
+
+
+class AgentDaemon:
+    """Serves agent runs from long-lived tools, models and storage."""
+
+    def __init__(self, socket_path=DAEMON_SOCKET):
+        self.socket_path = socket_path
+        self.app_config: AppConfig = config_service.current()
+        self.config_path = str(AppConfig.find_path().resolve())
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._models: dict[str, Any] = {}
+        self._toolkits: list = []
+        self._tools: Optional[list] = None
+        self._tools_lock = asyncio.Lock()
+        # Toolkits replaced by a config change, closed once no run uses them
+        self._retired: list = []
+        self._inflight = 0
+        self._consolidation: Optional[asyncio.Task] = None
+        self.checkpointer = None
+        self.store = None
+        self.conversation_manager = None
+
+    async def start(self) -> None:
+        from .storage import Storage
+
+        self._loop = asyncio.get_running_loop()
+        storage = await Storage.shared()
+        self.checkpointer = storage.checkpointer
+        self.store = storage.store
+        self.conversation_manager = storage.conversations
+        config_service.subscribe(self._on_config_change)
+        config_service.watch()
+        await self._get_tools()
+        self._get_model(self.app_config.llm.model)
+        if MEMORY_CONSOLIDATE_INTERVAL > 0:
+            self._consolidation = asyncio.create_task(self._consolidate_periodically(storage))
+
+    async def _consolidate_periodically(self, storage) -> None:
+        from .consolidation import MemoryConsolidator
+        consolidator = MemoryConsolidator(storage)
+        while True:
+            await asyncio.sleep(MEMORY_CONSOLIDATE_INTERVAL)
+            try:
+                await consolidator.run()
+            except Exception as e:
+                print(f"[AgentDaemon] Memory consolidation failed: {e}")
+
+    async def close(self) -> None:
+        if self._consolidation:
+            self._consolidation.cancel()
+        for toolkit in self._toolkits + self._retired:
+            await toolkit.close()
+        from .storage import Storage
+        await Storage.close_shared()
+
+    # --- Warm resources ---
+    def _on_config_change(self, change: ConfigChange) -> None:
+        # Called from the config watcher thread
+        self._loop.call_soon_threadsafe(self._apply_config_change, change)
+
+    def _apply_config_change(self, change: ConfigChange) -> None:
+        self.app_config = change.new
+        if change.sections & {"llm", "response_cache"}:
+            print("[AgentDaemon] Model config changed, dropping model clients.")
+            self._models.clear()
+        if "mcp_servers" in change.sections:
+            print(f"[AgentDaemon] MCP servers changed ({', '.join(sorted(change.servers))}), reloading tools.")
+            self._retired.extend(self._toolkits)
+            self._toolkits, self._tools = [], None
+
+    def _get_model(self, model_name: str):
+        model = self._models.get(model_name)
+        if model is None:
+            from .cli import create_model
+            app_config = self.app_config
+            if model_name != app_config.llm.model:
+                app_config = dataclasses.replace(
+                    app_config, llm=dataclasses.replace(app_config.llm, model=model_name))
+            model = self._models[model_name] = create_model(app_config)
+        return model
+
+    async def _get_tools(self) -> list:
+        async with self._tools_lock:
+            if self._tools is None:
+                from .cli import build_server_configs, load_tools
+                self._toolkits, self._tools = await load_tools(
+                    build_server_configs(self.app_config), False, False)
+            return self._tools
+
+    async def _close_retired(self) -> None:
+        if self._inflight or not self._retired:
+            return
+        retired, self._retired = self._retired, []
+        for toolkit in retired:
+            await toolkit.close()
+
+    # --- Serving ---
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        async def send(event: dict) -> None:
+            writer.write(json.dumps(event).encode() + b"\n")
+            await writer.drain()
+
+        self._inflight += 1
+        try:
+            request = json.loads(await reader.readline())
+            if request.get("config_path") != self.config_path:
+                await send({"type": "unsupported",
+                            "reason": f"daemon serves {self.config_path}"})
+                return
+            await self._run(request, send, reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception as e:
+            try:
+                await send({"type": "error", "message": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            self._inflight -= 1
+            writer.close()
+            await self._close_retired()
+
+    async def _run(self, request: dict, send, reader: asyncio.StreamReader) -> None:
+        from langchain_core.messages import HumanMessage
+        from langgraph.prebuilt import create_react_agent
+        from .memory import AgentState
+        from .output import OutputHandler
+        from .prompt_builder import TokenUsage, build_prompt, prompt_memories, prompt_time
+
+        app_config = self.app_config
+        tools = [] if request.get("no_tools") else await self._get_tools()
+        model = self._get_model(request.get("model") or app_config.llm.model)
+        prompt = build_prompt(app_config.system_prompt)
+        content = request["content"]
+        memories, context_memories = await prompt_memories(
+            self.store, query=content if isinstance(content, str) else None)
+        agent_executor = create_react_agent(
+            model, tools, state_schema=AgentState,
+            state_modifier=prompt, checkpointer=self.checkpointer, store=self.store
+        )
+        thread_id = (await self.conversation_manager.get_last_id() if request.get("continuation")
+                     else uuid.uuid4().hex)
+        input_messages = AgentState(
+            messages=[HumanMessage(content=request["content"])],
+            today_datetime=prompt_time(),
+            memories=memories,
+            context_memories=context_memories,
+            remaining_steps=3
+        )
+
+        # Only used to render chunks; the client owns the terminal
+        renderer = OutputHandler(text_only=True)
+        usage = TokenUsage()
+        try:
+            async for chunk in agent_executor.astream(
+                input_messages,
+                stream_mode=["messages", "values"],
+                config={"configurable": {"thread_id": thread_id, "user_id": "myself"},
+                        "recursion_limit": 100}
+            ):
+                if chunk[0] == "messages":
+                    usage.add(getattr(chunk[1][0], "usage_metadata", None))
+                delta = renderer.render_chunk(chunk)
+                if delta:
+                    await send({"type": "md", "text": delta})
+                if (not request.get("no_confirmations")
+                        and renderer.needs_confirmation(app_config.__dict__, chunk)):
+                    await send({"type": "confirm"})
+                    reply = json.loads(await reader.readline() or "{}")
+                    if not reply.get("confirmed"):
+                        break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            raise
+        except Exception as e:
+            await send({"type": "error", "message": str(e)})
+
+        await self.conversation_manager.save_id(thread_id)
+        await send({"type": "done", "last_message": renderer.last_message, "usage": usage.as_dict()})
+
+
+async def serve(socket_path=DAEMON_SOCKET) -> None:
+    """Run the daemon in the foreground until interrupted."""
+    if not hasattr(asyncio, "start_unix_server"):
+        print("The agent daemon needs Unix domain sockets, which this platform does not support.")
+        return
+    daemon = AgentDaemon(socket_path)
+    await daemon.start()
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if socket_path.exists():
+        socket_path.unlink()  # left over from a daemon that did not shut down cleanly
+    # Create the socket owner-only from the start; a chmod after bind leaves a window
+    # in which other local users could connect
+    umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(daemon.handle, path=str(socket_path))
+    finally:
+        os.umask(umask)
+    print(f"[AgentDaemon] Listening on {socket_path}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if socket_path.exists():
+            socket_path.unlink()
+        await daemon.close()
+
+
+async def run_via_daemon(args: argparse.Namespace, content, is_continuation: bool,
+                         socket_path=DAEMON_SOCKET) -> bool:
+    """Send a query to a running daemon and render its output.
+
+    Returns False, without printing anything, if no daemon is reachable or it
+    cannot serve this request; the caller then runs the query itself.
+    """
+    if not hasattr(asyncio, "open_unix_connection") or not socket_path.exists():
+        return False
+    try:
+        reader, writer = await asyncio.open_unix_connection(str(socket_path))
+    except OSError:
+        return False
+
+    request = {
+        "content": content,
+        "continuation": is_continuation,
+        "no_tools": args.no_tools,
+        "model": args.model,
+        "no_confirmations": args.no_confirmations,
+        "config_path": str(AppConfig.find_path().resolve()),
+    }
+    output = usage = None
+    try:
+        writer.write(json.dumps(request).encode() + b"\n")
+        await writer.drain()
+        while line := await reader.readline():
+            event = json.loads(line)
+            if event["type"] == "unsupported":
+                return False
+            if output is None:
+                from .output import OutputHandler
+                output = OutputHandler(text_only=args.text_only, only_last_message=args.no_intermediates)
+                output.start()
+            if event["type"] == "md":
+                output.update_markdown(event["text"])
+            elif event["type"] == "confirm":
+                confirmed = output.ask_confirmation()
+                writer.write(json.dumps({"confirmed": confirmed}).encode() + b"\n")
+                await writer.drain()
+            elif event["type"] == "error":
+                output.update_markdown(f"Error: {event['message']}\n")
+            elif event["type"] == "done":
+                output.last_message = event.get("last_message", "")
+                usage = event.get("usage")
+                break
+        return output is not None
+    except (OSError, ValueError):
+        return output is not None
+    finally:
+        if output is not None:
+            output.finish()
+        if usage and args.show_usage:
+            from .prompt_builder import TokenUsage
+            print(f"Usage: {TokenUsage.from_dict(usage)}", file=sys.stderr)
+        writer.close()
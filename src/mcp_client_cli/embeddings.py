@@ -0,0 +1,210 @@
+"""Local, offline embedders for semantic memory search.
+
+Selected with the `embeddings` section of the config file:
+
+- `HashingEmbeddings` hashes word unigrams and character n-grams into a fixed
+  number of signed buckets (a sparse random projection of the n-gram counts).
+  It needs nothing but NumPy and embeds a batch of texts with a handful of array
+  operations.
+- `StaticEmbeddings` mean-pools rows of a word vector table saved as `.npz`
+  (`vocab` and `vectors` arrays), such as a distilled static model.
+- A directory `model_path` is loaded with `sentence-transformers` when it is
+  installed.
+
+No embedder makes network calls, so puts and queries cost microseconds to
+milliseconds instead of a provider round trip.
+"""
+
+import logging
+import re
+import zlib
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from .config import EmbeddingConfig
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=1 << 17)
+def _bucket(gram: str, dims: int) -> int:
+    """Signed bucket of a feature: the index is the absolute value minus one."""
+    h = zlib.crc32(gram.encode("utf-8"))
+    index = (h >> 1) % dims + 1
+    return index if h & 1 else -index
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed word and character n-gram vectors.
+
+    Args:
+        dims (int): Vector size
+        ngram_range (tuple[int, int]): Smallest and largest character n-gram,
+            taken within word boundaries
+        batch_size (int): Texts embedded per array operation
+    """
+
+    def __init__(self, dims: int = 256, ngram_range: tuple = (3, 4), batch_size: int = 256):
+        import numpy  # noqa: F401 - fail early when NumPy is missing
+
+        self.dims = dims
+        self.ngram_range = ngram_range
+        self.batch_size = batch_size
+
+    def _features(self, text: str) -> List[int]:
+        low, high = self.ngram_range
+        features = []
+        for word in _WORD.findall(text.lower()):
+            features.append(_bucket(word, self.dims))
+            padded = f"<{word}>"
+            for n in range(low, min(high, len(padded)) + 1):
+                features.extend(_bucket(padded[i:i + n], self.dims)
+                                for i in range(len(padded) - n + 1))
+        return features
+
+    def _embed(self, texts: List[str]):
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            batch = [self._features(t) for t in texts[start:start + self.batch_size]]
+            rows = np.repeat(np.arange(start, start + len(batch)), [len(f) for f in batch])
+            signed = np.fromiter((b for f in batch for b in f), dtype=np.int64, count=len(rows))
+            np.add.at(out, (rows, np.abs(signed) - 1), np.sign(signed).astype(np.float32))
+        # Dampen repeated n-grams, then normalize so dot products are cosines
+        out = np.sign(out) * np.log1p(np.abs(out))
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    # Cheap enough to run on the event loop; skip the default thread pool hop
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+class StaticEmbeddings(Embeddings):
+    """Mean of the word vectors of a text, looked up in an on-disk table.
+
+    Args:
+        path (Path): `.npz` file with a `vocab` string array and a `vectors`
+            matrix with one row per vocabulary entry
+        batch_size (int): Texts embedded per array operation
+    """
+
+    def __init__(self, path: Path, batch_size: int = 256):
+        import numpy as np
+
+        with np.load(path, allow_pickle=False) as table:
+            self.vectors = table["vectors"].astype(np.float32)
+            self.index = {word: i for i, word in enumerate(table["vocab"].tolist())}
+        self.dims = self.vectors.shape[1]
+        self.batch_size = batch_size
+
+    def _embed(self, texts: List[str]):
+        import numpy as np
+
+        out = np.zeros((len(texts), self.dims), dtype=np.float32)
+        for start in range(0, len(texts), self.batch_size):
+            ids = [[self.index[w] for w in _WORD.findall(t.lower()) if w in self.index]
+                   for t in texts[start:start + self.batch_size]]
+            rows = np.repeat(np.arange(start, start + len(ids)), [len(i) for i in ids])
+            cols = np.fromiter((i for row in ids for i in row), dtype=np.int64, count=len(rows))
+            np.add.at(out, rows, self.vectors[cols])
+        out /= np.maximum(np.linalg.norm(out, axis=1, keepdims=True), 1e-12)
+        return out
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
+
+
+class SentenceTransformerEmbeddings(Embeddings):
+    """A local `sentence-transformers` model directory."""
+
+    def __init__(self, path: Path, batch_size: int = 256):
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(str(path), device="cpu")
+        self.dims = self.model.get_sentence_embedding_dimension()
+        self.batch_size = batch_size
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.model.encode(list(texts), batch_size=self.batch_size,
+                                 normalize_embeddings=True).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+@lru_cache(maxsize=None)
+def create_embeddings(config: EmbeddingConfig) -> Optional[Embeddings]:
+    """Build the embedder selected in the config, once per distinct config.
+
+    Returns:
+        Optional[Embeddings]: The embedder, or None when semantic search is disabled
+            or its dependencies are missing
+    """
+    if config.provider in (None, "none"):
+        return None
+    if config.provider != "local":
+        raise ValueError(f"Unsupported embeddings provider: {config.provider}")
+    try:
+        if config.model_path:
+            path = Path(config.model_path).expanduser()
+            if path.is_dir():
+                try:
+                    return SentenceTransformerEmbeddings(path, config.batch_size)
+                except ImportError:
+                    logger.warning(f"sentence-transformers is not installed, cannot load {path}; "
+                                   "falling back to hashed n-gram embeddings")
+            elif path.exists():
+                return StaticEmbeddings(path, config.batch_size)
+            else:
+                logger.warning(f"Embedding model {path} not found; falling back to hashed n-gram embeddings")
+        return HashingEmbeddings(config.dims, batch_size=config.batch_size)
+    except ImportError:
+        logger.warning("NumPy is not installed; semantic memory search is disabled. "
+                       "Install it with: pip install mcp_client_cli[embeddings]")
+        return None
+
+
+def memory_index_config(config: Optional[EmbeddingConfig] = None) -> Optional[dict]:
+    """`IndexConfig` for the memory store, from the given or the current app config.
+
+    Returns:
+        Optional[dict]: The index config, or None to store memories without vectors
+    """
+    if config is None:
+        from .config import config_service
+        try:
+            config = config_service.current().embeddings
+        except FileNotFoundError:
+            return None
+    embeddings = create_embeddings(config)
+    if embeddings is None:
+        return None
+    index = {"dims": embeddings.dims, "embed": embeddings, "fields": ["data"]}
+    if config.quantization:
+        index["quantization"] = {"method": config.quantization, "rerank": config.rerank}
+    return index
@@ -1,7 +1,20 @@
 import io
+import codecs
 import platform
 import subprocess
 import base64
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, Optional
+
+STDIN_BLOCK_SIZE = 64 * 1024
+
+# Magic numbers of the image formats chat models accept
+_IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+]
 
 def get_clipboard_content() -> tuple[str | bytes, str | None] | None:
     """Get content from clipboard, handling both text and images in native and WSL environments.
@@ -95,4 +108,76 @@ def get_clipboard_content() -> tuple[str | bytes, str | None] | None:
             print(f"Error accessing Linux clipboard: {e}")
             raise e
 
-    raise Exception("Clipboard is empty")
\ No newline at end of file
+    raise Exception("Clipboard is empty")
+
+
+def detect_image_type(header: bytes) -> Optional[str]:
+    """Return the image mime type for the first bytes of a stream, or None for other data."""
+    for signature, mime_type in _IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+@dataclass
+class StdinInput:
+    """Piped input, read only as far as needed.
+
+    Exactly one of `image`, `text` or `chunks` is set. `chunks` is used when text
+    exceeds the inline limit; it lazily yields the whole input in pieces, reading
+    the pipe as it goes, so large input never sits in memory at once.
+    """
+    image: Optional[bytes] = None
+    mime_type: Optional[str] = None
+    text: Optional[str] = None
+    chunks: Optional[Iterator[str]] = None
+
+
+def read_stdin(stream: BinaryIO, max_inline_bytes: int, chunk_chars: int,
+               max_image_bytes: int = 20 * 1024 * 1024) -> StdinInput:
+    """Read piped input with a bounded buffer.
+
+    The type is detected from the header bytes. Images are read whole (up to
+    `max_image_bytes`). Text up to `max_inline_bytes` is returned as is; longer
+    text is returned as an iterator of chunks of about `chunk_chars` characters.
+    """
+    buffer = bytearray(stream.read(STDIN_BLOCK_SIZE))
+    mime_type = detect_image_type(bytes(buffer[:16]))
+    if mime_type:
+        while block := stream.read(STDIN_BLOCK_SIZE):
+            buffer += block
+            if len(buffer) > max_image_bytes:
+                raise ValueError(f"Piped image is larger than {max_image_bytes} bytes")
+        return StdinInput(image=bytes(buffer), mime_type=mime_type)
+
+    while len(buffer) <= max_inline_bytes:
+        block = stream.read(STDIN_BLOCK_SIZE)
+        if not block:
+            return StdinInput(text=buffer.decode("utf-8", errors="replace"))
+        buffer += block
+    return StdinInput(chunks=iter_text_chunks(stream, bytes(buffer), chunk_chars))
+
+
+def iter_text_chunks(stream: BinaryIO, prefix: bytes, chunk_chars: int) -> Iterator[str]:
+    """Decode `prefix` followed by the rest of `stream` into chunks of at most `chunk_chars`.
+
+    Chunks end at a line break where possible. At most one chunk plus one read
+    block is held in memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = decoder.decode(prefix)
+    while True:
+        while len(pending) >= chunk_chars:
+            cut = pending.rfind("\n", 0, chunk_chars)
+            cut = cut + 1 if cut > 0 else chunk_chars
+            yield pending[:cut]
+            pending = pending[cut:]
+        block = stream.read(STDIN_BLOCK_SIZE)
+        if not block:
+            break
+        pending += decoder.decode(block)
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending
@@ -4,9 +4,11 @@ This store provides persistent storage using SQLite with optional vector search
 It implements the BaseStore interface from langgraph.
 """
 
+import asyncio
 from datetime import datetime, timezone
 import json
 import logging
+import re
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple, Union, TypedDict
 from typing_extensions import Annotated
@@ -41,6 +43,11 @@ from langgraph.store.base import (
 
 logger = logging.getLogger(__name__)
 
+# Vectors needed before product quantization codebooks are trained; until then int8 codes are used
+PQ_MIN_TRAINING_VECTORS = 2048
+# Vectors sampled to train the codebooks
+PQ_TRAINING_SAMPLE = 20000
+
 # Moved AgentState definition here from cli.py
 class AgentState(TypedDict):
     # A list of messages exchanged in the conversation.
@@ -51,6 +58,8 @@ class AgentState(TypedDict):
     today_datetime: str
     # The user's memories.
     memories: str = "no memories"
+    # Memories relevant to the current query, added at the end of the prompt.
+    context_memories: str = ""
     remaining_steps: int = 5
         
 
@@ -64,29 +73,70 @@ async def save_memory(memories: List[str], *, config: RunnableConfig, store: Ann
         await store.aput(namespace, f"memory_{id}", {"data": memory})
     return f"Saved memories: {memories}"
 
-async def get_memories(store: BaseStore, user_id: str = "myself", query: str = None) -> List[str]:
+async def get_memories(store: BaseStore, user_id: str = "myself", query: str = None,
+                       limit: int = 10) -> List[str]:
+    """Return up to `limit` memories, the most relevant to `query` first.
+
+    When fewer than `limit` memories match the query, the rest of the list is
+    filled with other memories so the prompt still gets general context.
+    """
     namespace = ("memories", user_id)
-    memories = [m.value["data"] for m in await store.asearch(namespace, query=query)]
-    return memories
+    found = await store.asearch(namespace, query=query, limit=limit) if query else []
+    if len(found) < limit:
+        seen = {m.key for m in found}
+        found += [m for m in await store.asearch(namespace, limit=limit + len(found))
+                  if m.key not in seen][:limit - len(found)]
+    return [m.value["data"] for m in found]
 
 class SqliteStore(BaseStore):
     """SQLite-based store with optional vector search.
 
     This store provides persistent storage using SQLite with optional vector search functionality.
-    Data is stored in two tables:
+    Data is stored in these tables:
     - items: Stores the actual key-value pairs with their metadata
     - vectors: Stores vector embeddings for semantic search
+    - item_usage: How often and when items were last returned by get/search,
+      used by memory consolidation
+    - items_fts: FTS5 index of the items' text, kept in sync on put/delete; its
+      rowids are those of the matching items rows
+    - vector_codes, vector_codebooks: Compressed copies of the vectors and the
+      product quantization codebooks, when quantization is enabled
+
+    Searches with a query are ranked by BM25 in SQL, with the top-k limit applied
+    there. With an embedder configured, the BM25 ranking is fused with the cosine
+    similarity ranking by reciprocal rank fusion. If the SQLite build lacks FTS5,
+    queries fall back to cosine similarity only (or no ranking without an embedder).
+
+    With `index["quantization"] = {"method": "int8" | "pq", "rerank": 4}`, searches
+    without a filter score compressed codes instead of loading every vector (see
+    `quantization`), then re-rank the best `rerank * (offset + limit)` candidates
+    against their full-precision vectors, read from disk only for those candidates.
 
     Args:
         db_path (Union[str, Path]): Path to the SQLite database file
         index (Optional[IndexConfig]): Configuration for vector search functionality
+        conn (Optional[aiosqlite.Connection]): Long-lived connection to use instead of
+            opening one per batch (see `storage.Storage`)
+        lock (Optional[asyncio.Lock]): Lock serializing transactions on `conn`
     """
 
     def __init__(
-        self, db_path: Union[str, Path], *, index: Optional[IndexConfig] = None
+        self, db_path: Union[str, Path], *, index: Optional[IndexConfig] = None,
+        conn: Optional[aiosqlite.Connection] = None, lock: Optional[asyncio.Lock] = None,
     ) -> None:
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = conn
+        self.lock = lock or asyncio.Lock()
+        self._is_setup = False
+        # Whether the FTS5 index is available, decided when the schema is created
+        self._fts: Optional[bool] = None
+        self._vectors_backfilled = False
+        self.quantization: Optional[dict] = None
+        self._quantizer = None
+        # Whether every vector has a code of the current quantizer
+        self._codes_ready = False
+        self._vectors_since_training = 0
         self.index_config = index
         if self.index_config:
             self.index_config = self.index_config.copy()
@@ -97,6 +147,10 @@ class SqliteStore(BaseStore):
                 (p, tokenize_path(p)) if p != "$" else (p, p)
                 for p in (self.index_config.get("fields") or ["$"])
             ]
+            if self.index_config.get("quantization"):
+                self.quantization = {"rerank": 4, **self.index_config["quantization"]}
+                if self.quantization["method"] not in ("int8", "pq"):
+                    raise ValueError(f"Unsupported quantization method: {self.quantization['method']}")
         else:
             self.index_config = None
             self.embeddings = None
@@ -117,6 +171,16 @@ class SqliteStore(BaseStore):
                 PRIMARY KEY (namespace, key)
             )
         """)
+        await self._init_fts(db)
+        await db.execute("""
+            CREATE TABLE IF NOT EXISTS item_usage (
+                namespace TEXT,
+                key TEXT,
+                access_count INTEGER NOT NULL DEFAULT 0,
+                last_accessed_at TEXT,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
         if self.index_config:
             await db.execute("""
                 CREATE TABLE IF NOT EXISTS vectors (
@@ -129,8 +193,144 @@ class SqliteStore(BaseStore):
                         ON DELETE CASCADE
                 )
             """)
+            if self.quantization:
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS vector_codes (
+                        namespace TEXT,
+                        key TEXT,
+                        path TEXT,
+                        method TEXT,
+                        code BLOB,
+                        scale REAL,
+                        PRIMARY KEY (namespace, key, path)
+                    )
+                """)
+                await db.execute("""
+                    CREATE TABLE IF NOT EXISTS vector_codebooks (
+                        method TEXT PRIMARY KEY,
+                        data BLOB
+                    )
+                """)
+            if self.embeddings and not self._vectors_backfilled:
+                await self._backfill_vectors(db)
+                self._vectors_backfilled = True
         await db.commit()
 
+    async def _backfill_vectors(self, db: aiosqlite.Connection) -> None:
+        """Embed items stored before an embedder was configured.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        async with db.execute("""
+            SELECT namespace, key, value FROM items
+            WHERE NOT EXISTS (
+                SELECT 1 FROM vectors
+                WHERE vectors.namespace = items.namespace AND vectors.key = items.key
+            )
+        """) as cursor:
+            rows = await cursor.fetchall()
+        put_ops = {
+            (tuple(ns.split("/")), key): PutOp(tuple(ns.split("/")), key, json.loads(value))
+            for ns, key, value in rows
+        }
+        to_embed = self._extract_texts(put_ops)
+        if to_embed:
+            logger.info(f"Embedding {len(put_ops)} stored items for semantic search")
+            embeddings = await self.embeddings.aembed_documents(list(to_embed))
+            await self._insert_vectors(db, to_embed, embeddings)
+
+    async def _init_fts(self, db: aiosqlite.Connection) -> None:
+        """Create the FTS5 index, filling it from existing items the first time.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        if self._fts is False:
+            return
+        try:
+            await db.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+                    namespace UNINDEXED,
+                    key UNINDEXED,
+                    text
+                )
+            """)
+        except aiosqlite.OperationalError as e:
+            logger.warning(f"SQLite FTS5 is unavailable, memory search will not be ranked lexically: {e}")
+            self._fts = False
+            return
+        if self._fts is None:
+            async with db.execute("SELECT 1 FROM items_fts LIMIT 1") as cursor:
+                indexed = await cursor.fetchone()
+            if indexed:
+                # Rows whose rowid does not point at their item, e.g. from an older index layout
+                async with db.execute("""
+                    SELECT 1 FROM items_fts LEFT JOIN items ON items.rowid = items_fts.rowid
+                        AND items.namespace = items_fts.namespace AND items.key = items_fts.key
+                    WHERE items.rowid IS NULL LIMIT 1
+                """) as cursor:
+                    if await cursor.fetchone():
+                        await db.execute("DELETE FROM items_fts")
+                        indexed = None
+            if not indexed:
+                async with db.execute("SELECT rowid, namespace, key, value FROM items") as cursor:
+                    rows = await cursor.fetchall()
+                await db.executemany(
+                    "INSERT INTO items_fts (rowid, namespace, key, text) VALUES (?, ?, ?, ?)",
+                    [(rowid, ns, key, self._fts_text(json.loads(value)))
+                     for rowid, ns, key, value in rows],
+                )
+        self._fts = True
+
+    def _fts_text(self, value: dict) -> str:
+        """Text of an item to index: the configured index fields, or every string in it.
+
+        Args:
+            value (dict): Item value
+
+        Returns:
+            str: Text to index
+        """
+        if self.index_config:
+            texts = []
+            for _, field in self.index_config["__tokenized_fields"]:
+                texts.extend(get_text_at_path(value, field))
+            return "\n".join(texts)
+
+        texts = []
+        def collect(node: Any) -> None:
+            if isinstance(node, str):
+                texts.append(node)
+            elif isinstance(node, dict):
+                for child in node.values():
+                    collect(child)
+            elif isinstance(node, list):
+                for child in node:
+                    collect(child)
+        collect(value)
+        return "\n".join(texts)
+
+    @staticmethod
+    def _match_query(query: str) -> Optional[str]:
+        """FTS5 MATCH expression matching any word of a free-text query.
+
+        Args:
+            query (str): Free-text query
+
+        Returns:
+            Optional[str]: The expression, or None if the query has no words
+        """
+        words = re.findall(r"\w+", query.lower())
+        return " OR ".join(f'"{word}"' for word in dict.fromkeys(words)) or None
+
+    async def setup(self) -> None:
+        """Create the schema on the shared connection once."""
+        async with self.lock:
+            if not self._is_setup:
+                await self._init_db(self.conn)
+                self._is_setup = True
+
     def batch(self, ops: List[Op]) -> List[Result]:
         """Execute a batch of operations synchronously.
 
@@ -151,42 +351,103 @@ class SqliteStore(BaseStore):
         Returns:
             List[Result]: Results of the operations
         """
+        if self.conn is not None:
+            await self.setup()
+            async with self.lock:
+                try:
+                    return await self._abatch(self.conn, ops)
+                except BaseException:
+                    await self.conn.rollback()
+                    raise
         async with aiosqlite.connect(self.db_path) as db:
             await self._init_db(db)
-            results: List[Result] = []
-            put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp] = {}
-            search_ops: Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]] = {}
-
-            for i, op in enumerate(ops):
-                if isinstance(op, GetOp):
-                    item = await self._get_item(db, op.namespace, op.key)
-                    results.append(item)
-                elif isinstance(op, SearchOp):
-                    candidates = await self._filter_items(db, op)
-                    search_ops[i] = (op, candidates)
-                    results.append(None)
-                elif isinstance(op, ListNamespacesOp):
-                    namespaces = await self._list_namespaces(db, op)
-                    results.append(namespaces)
-                elif isinstance(op, PutOp):
-                    put_ops[(op.namespace, op.key)] = op
+            return await self._abatch(db, ops)
+
+    async def _abatch(self, db: aiosqlite.Connection, ops: List[Op]) -> List[Result]:
+        """Run a batch on a connection and commit it.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            ops (List[Op]): List of operations to execute
+
+        Returns:
+            List[Result]: Results of the operations
+        """
+        results: List[Result] = []
+        put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp] = {}
+        search_ops: Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]] = {}
+        lexical_ranks: Dict[int, Dict[Tuple[str, str], int]] = {}
+
+        for i, op in enumerate(ops):
+            if isinstance(op, GetOp):
+                item = await self._get_item(db, op.namespace, op.key)
+                results.append(item)
+            elif isinstance(op, SearchOp):
+                match = self._match_query(op.query) if op.query and self._fts else None
+                if match and not self.embeddings:
+                    results.append(await self._lexical_search(db, op, match))
+                    continue
+                if match:
+                    lexical_ranks[i] = await self._lexical_ranks(db, op, match)
+                if op.query and self.quantization and self.embeddings and not op.filter:
+                    # Candidates come from the compressed codes in _batch_search
+                    search_ops[i] = (op, None)
                     results.append(None)
-                else:
-                    raise ValueError(f"Unknown operation type: {type(op)}")
+                    continue
+                candidates = await self._filter_items(db, op)
+                search_ops[i] = (op, candidates)
+                results.append(None)
+            elif isinstance(op, ListNamespacesOp):
+                namespaces = await self._list_namespaces(db, op)
+                results.append(namespaces)
+            elif isinstance(op, PutOp):
+                put_ops[(op.namespace, op.key)] = op
+                results.append(None)
+            else:
+                raise ValueError(f"Unknown operation type: {type(op)}")
 
-            if search_ops:
-                query_vectors = await self._embed_search_queries(search_ops)
-                await self._batch_search(db, search_ops, query_vectors, results)
+        if search_ops:
+            query_vectors = await self._embed_search_queries(search_ops)
+            await self._batch_search(db, search_ops, query_vectors, results, lexical_ranks)
 
-            to_embed = self._extract_texts(put_ops)
-            if to_embed and self.index_config and self.embeddings:
-                embeddings = await self.embeddings.aembed_documents(list(to_embed))
-                await self._insert_vectors(db, to_embed, embeddings)
+        to_embed = self._extract_texts(put_ops)
+        if to_embed and self.index_config and self.embeddings:
+            embeddings = await self.embeddings.aembed_documents(list(to_embed))
+            await self._insert_vectors(db, to_embed, embeddings)
 
-            await self._apply_put_ops(db, put_ops)
-            await db.commit()
+        await self._apply_put_ops(db, put_ops)
+        await self._record_usage(db, ops, results)
+        await db.commit()
+
+        return results
+
+    async def _record_usage(self, db: aiosqlite.Connection, ops: List[Op], results: List[Result]) -> None:
+        """Count the items returned by get and search operations.
 
-            return results
+        Args:
+            db (aiosqlite.Connection): Database connection
+            ops (List[Op]): Operations of the batch
+            results (List[Result]): Their results
+        """
+        used = []
+        for op, result in zip(ops, results):
+            if isinstance(op, GetOp) and result is not None:
+                used.append(result)
+            elif isinstance(op, SearchOp) and result:
+                used.extend(result)
+        if not used:
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        await db.executemany(
+            """
+            INSERT INTO item_usage (namespace, key, access_count, last_accessed_at)
+            VALUES (?, ?, 1, ?)
+            ON CONFLICT (namespace, key) DO UPDATE SET
+                access_count = access_count + 1,
+                last_accessed_at = excluded.last_accessed_at
+            """,
+            [("/".join(item.namespace), item.key, now) for item in used],
+        )
 
     async def _get_item(
         self, db: aiosqlite.Connection, namespace: Tuple[str, ...], key: str
@@ -251,32 +512,105 @@ class SqliteStore(BaseStore):
                     self._compare_values(item.value.get(key), filter_value)
                     for key, filter_value in op.filter.items()
                 ):
-                    if op.query and self.index_config:
-                        vectors = await self._get_vectors(db, item.namespace, item.key)
-                        filtered.append((item, vectors))
-                    else:
-                        filtered.append((item, []))
-            return filtered
+                    filtered.append(item)
+        if not (op.query and self.index_config):
+            return [(item, []) for item in filtered]
+        # One query per namespace chunk rather than one per item
+        vectors = await self._get_vectors_for(
+            db, {("/".join(item.namespace), item.key) for item in filtered})
+        return [(item, vectors.get(("/".join(item.namespace), item.key), [])) for item in filtered]
+
+    @staticmethod
+    def _namespace_condition(
+        namespace_prefix: Tuple[str, ...], column: str = "items_fts.namespace"
+    ) -> Tuple[str, list]:
+        """SQL condition on a namespace column for a namespace prefix.
 
-    async def _get_vectors(
-        self, db: aiosqlite.Connection, namespace: Tuple[str, ...], key: str
-    ) -> List[List[float]]:
-        """Get vectors for an item.
+        Args:
+            namespace_prefix (Tuple[str, ...]): Namespace prefix
+            column (str): Namespace column to test
+
+        Returns:
+            Tuple[str, list]: Condition and its parameters
+        """
+        prefix = "/".join(namespace_prefix)
+        if not prefix:
+            return "1", []
+        return f"({column} = ? OR {column} LIKE ?)", [prefix, f"{prefix}/%"]
+
+    async def _lexical_search(
+        self, db: aiosqlite.Connection, op: SearchOp, match: str
+    ) -> List[SearchItem]:
+        """Rank items by BM25, applying the limit in SQL.
 
         Args:
             db (aiosqlite.Connection): Database connection
-            namespace (Tuple[str, ...]): Item namespace
-            key (str): Item key
+            op (SearchOp): Search operation
+            match (str): FTS5 MATCH expression
 
         Returns:
-            List[List[float]]: List of vectors
+            List[SearchItem]: The page of results, best first
         """
+        condition, params = self._namespace_condition(op.namespace_prefix)
+        query = f"""
+            SELECT items.namespace, items.key, items.value, items.created_at, items.updated_at,
+                   bm25(items_fts) AS rank
+            FROM items_fts
+            JOIN items ON items.rowid = items_fts.rowid
+            WHERE items_fts MATCH ? AND {condition}
+            ORDER BY rank
+        """
+        params = [match, *params]
+        if not op.filter:
+            # Filters are evaluated in Python, so only unfiltered pages can be cut in SQL
+            query += " LIMIT ? OFFSET ?"
+            params += [op.limit, op.offset]
+        async with db.execute(query, params) as cursor:
+            rows = await cursor.fetchall()
+        found = []
+        for namespace, key, value, created_at, updated_at, rank in rows:
+            value = json.loads(value)
+            if op.filter and not all(
+                self._compare_values(value.get(k), v) for k, v in op.filter.items()
+            ):
+                continue
+            found.append(SearchItem(
+                namespace=tuple(namespace.split("/")),
+                key=key,
+                value=value,
+                created_at=datetime.fromisoformat(created_at),
+                updated_at=datetime.fromisoformat(updated_at),
+                # bm25() is lower for better matches
+                score=-float(rank),
+            ))
+        return found[op.offset:op.offset + op.limit] if op.filter else found
+
+    async def _lexical_ranks(
+        self, db: aiosqlite.Connection, op: SearchOp, match: str
+    ) -> Dict[Tuple[str, str], int]:
+        """BM25 rank (0 is best) of the top lexical matches, for fusion with vector scores.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            op (SearchOp): Search operation
+            match (str): FTS5 MATCH expression
+
+        Returns:
+            Dict[Tuple[str, str], int]: (namespace, key) -> rank
+        """
+        condition, params = self._namespace_condition(op.namespace_prefix)
+        # Items ranked lower than this hardly change the fused order
+        depth = max((op.offset + op.limit) * 4, 50)
         async with db.execute(
-            "SELECT vector FROM vectors WHERE namespace = ? AND key = ?",
-            ("/".join(namespace), key)
+            f"""
+            SELECT namespace, key FROM items_fts
+            WHERE items_fts MATCH ? AND {condition}
+            ORDER BY bm25(items_fts) LIMIT ?
+            """,
+            [match, *params, depth],
         ) as cursor:
             rows = await cursor.fetchall()
-            return [json.loads(row[0]) for row in rows]
+        return {(namespace, key): rank for rank, (namespace, key) in enumerate(rows)}
 
     async def _list_namespaces(
         self, db: aiosqlite.Connection, op: ListNamespacesOp
@@ -333,6 +667,7 @@ class SqliteStore(BaseStore):
         ops: Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]],
         query_vectors: Dict[str, List[float]],
         results: List[Result],
+        lexical_ranks: Optional[Dict[int, Dict[Tuple[str, str], int]]] = None,
     ) -> None:
         """Perform batch similarity search.
 
@@ -341,8 +676,15 @@ class SqliteStore(BaseStore):
             ops (Dict[int, Tuple[SearchOp, List[Tuple[Item, List[List[float]]]]]]): Search operations
             query_vectors (Dict[str, List[float]]): Query embeddings
             results (List[Result]): Results list to update
+            lexical_ranks (Optional[Dict[int, Dict[Tuple[str, str], int]]]): BM25 ranks per
+                search op, fused with the cosine ranking when present
         """
+        lexical_ranks = lexical_ranks or {}
         for i, (op, candidates) in ops.items():
+            if candidates is None:
+                results[i] = await self._quantized_search(
+                    db, op, query_vectors[op.query], lexical_ranks.get(i))
+                continue
             if not candidates:
                 results[i] = []
                 continue
@@ -363,6 +705,9 @@ class SqliteStore(BaseStore):
                 sorted_results = sorted(
                     zip(scores, flat_items), key=lambda x: x[0], reverse=True
                 )
+                if i in lexical_ranks:
+                    sorted_results = self._fuse_ranks(sorted_results, scoreless, lexical_ranks[i])
+                    scoreless = []
 
                 seen = set()
                 kept = []
@@ -406,6 +751,38 @@ class SqliteStore(BaseStore):
                     for (item, _) in candidates[op.offset:op.offset + op.limit]
                 ]
 
+    @staticmethod
+    def _fuse_ranks(
+        vector_results: List[Tuple[float, Item]],
+        scoreless: List[Item],
+        lexical: Dict[Tuple[str, str], int],
+        k: int = 60,
+    ) -> List[Tuple[float, Item]]:
+        """Reciprocal rank fusion of cosine and BM25 rankings.
+
+        Args:
+            vector_results (List[Tuple[float, Item]]): Items by descending cosine score,
+                possibly repeated once per vector
+            scoreless (List[Item]): Items without vectors
+            lexical (Dict[Tuple[str, str], int]): BM25 rank per (namespace, key)
+            k (int): RRF constant damping the weight of top ranks
+
+        Returns:
+            List[Tuple[float, Item]]: Items by descending fused score
+        """
+        fused: Dict[Tuple[str, str], List] = {}
+        for _, item in vector_results:
+            key = ("/".join(item.namespace), item.key)
+            if key not in fused:
+                fused[key] = [1.0 / (k + len(fused) + 1), item]
+        for item in scoreless:
+            fused.setdefault(("/".join(item.namespace), item.key), [0.0, item])
+        for key, rank in lexical.items():
+            if key in fused:
+                fused[key][0] += 1.0 / (k + rank + 1)
+        return sorted(((score, item) for score, item in fused.values()),
+                      key=lambda x: x[0], reverse=True)
+
     async def _apply_put_ops(
         self, db: aiosqlite.Connection, put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp]
     ) -> None:
@@ -416,11 +793,32 @@ class SqliteStore(BaseStore):
             put_ops (Dict[Tuple[Tuple[str, ...], str], PutOp]): Put operations
         """
         for (namespace, key), op in put_ops.items():
-            if op.value is None:
+            if self._fts:
+                # By rowid: the namespace and key columns of the FTS table are not indexed
                 await db.execute(
-                    "DELETE FROM items WHERE namespace = ? AND key = ?",
+                    """
+                    DELETE FROM items_fts WHERE rowid =
+                        (SELECT rowid FROM items WHERE namespace = ? AND key = ?)
+                    """,
                     ("/".join(namespace), key)
                 )
+            if op.value is None:
+                for table in ("items", "item_usage"):
+                    await db.execute(
+                        f"DELETE FROM {table} WHERE namespace = ? AND key = ?",
+                        ("/".join(namespace), key)
+                    )
+                if self.index_config:
+                    # The foreign key cascade only applies with PRAGMA foreign_keys=ON
+                    await db.execute(
+                        "DELETE FROM vectors WHERE namespace = ? AND key = ?",
+                        ("/".join(namespace), key)
+                    )
+                if self.quantization:
+                    await db.execute(
+                        "DELETE FROM vector_codes WHERE namespace = ? AND key = ?",
+                        ("/".join(namespace), key)
+                    )
             else:
                 now = datetime.now(timezone.utc)
                 await db.execute(
@@ -439,6 +837,14 @@ class SqliteStore(BaseStore):
                         now.isoformat(),
                     )
                 )
+                if self._fts:
+                    await db.execute(
+                        """
+                        INSERT INTO items_fts (rowid, namespace, key, text)
+                        SELECT rowid, namespace, key, ? FROM items WHERE namespace = ? AND key = ?
+                        """,
+                        (self._fts_text(op.value), "/".join(namespace), key)
+                    )
 
     async def _insert_vectors(
         self,
@@ -470,6 +876,286 @@ class SqliteStore(BaseStore):
                 """,
                 ("/".join(ns), key, path, json.dumps(embedding))
             )
+        if self.quantization and indices:
+            # Encode on write even if this instance has not searched yet: other
+            # instances sharing the database only backfill codes when they start
+            if self._quantizer is None:
+                # Picks the quantizer and encodes every vector without a code, these included
+                await self._ensure_codes(db)
+            else:
+                await self._write_codes(
+                    db, [("/".join(ns), key, path) for ns, key, path in indices], embeddings)
+            if self.quantization["method"] == "pq" and self._quantizer is not None \
+                    and self._quantizer.method != "pq":
+                self._vectors_since_training += len(indices)
+                if self._vectors_since_training >= PQ_MIN_TRAINING_VECTORS // 4:
+                    # Enough new vectors to try training the codebooks again
+                    self._vectors_since_training = 0
+                    self._codes_ready = False
+
+    async def _write_codes(
+        self, db: aiosqlite.Connection, rows: List[Tuple[str, str, str]], vectors: List[List[float]]
+    ) -> None:
+        """Store the quantized codes of vectors.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            rows (List[Tuple[str, str, str]]): (namespace, key, path) of each vector
+            vectors (List[List[float]]): Full-precision vectors
+        """
+        import numpy as np
+
+        codes, scales = self._quantizer.encode(np.asarray(vectors, dtype=np.float32))
+        await db.executemany(
+            """
+            INSERT INTO vector_codes (namespace, key, path, method, code, scale)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (namespace, key, path) DO UPDATE SET
+                method = excluded.method,
+                code = excluded.code,
+                scale = excluded.scale
+            """,
+            [
+                (ns, key, path, self._quantizer.method, codes[j].tobytes(),
+                 float(scales[j]) if scales is not None else None)
+                for j, (ns, key, path) in enumerate(rows)
+            ],
+        )
+
+    async def _ensure_codes(self, db: aiosqlite.Connection) -> None:
+        """Pick the quantizer and encode the vectors that have no code from it.
+
+        Product quantization falls back to int8 codes until there are
+        PQ_MIN_TRAINING_VECTORS vectors to train its codebooks on.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        if self._codes_ready:
+            return
+        from .quantization import Int8Quantizer
+
+        if self.quantization["method"] == "pq":
+            self._quantizer = await self._product_quantizer(db) or Int8Quantizer()
+        else:
+            self._quantizer = Int8Quantizer()
+        async with db.execute(
+            """
+            SELECT v.namespace, v.key, v.path, v.vector FROM vectors v
+            LEFT JOIN vector_codes c
+                ON c.namespace = v.namespace AND c.key = v.key AND c.path = v.path
+                AND c.method = ?
+            WHERE c.key IS NULL
+            """,
+            (self._quantizer.method,),
+        ) as cursor:
+            rows = await cursor.fetchall()
+        for start in range(0, len(rows), 4096):
+            batch = rows[start:start + 4096]
+            await self._write_codes(
+                db, [(ns, key, path) for ns, key, path, _ in batch],
+                [json.loads(vector) for *_, vector in batch],
+            )
+        if rows:
+            logger.info(f"Encoded {len(rows)} vectors with {self._quantizer.method} quantization")
+        self._codes_ready = True
+
+    async def _has_uncoded_vectors(self, db: aiosqlite.Connection) -> bool:
+        """Whether some vectors have no code from the current quantizer.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+        """
+        async with db.execute(
+            """
+            SELECT EXISTS (
+                SELECT 1 FROM vectors v
+                LEFT JOIN vector_codes c
+                    ON c.namespace = v.namespace AND c.key = v.key AND c.path = v.path
+                    AND c.method = ?
+                WHERE c.key IS NULL
+            )
+            """,
+            (self._quantizer.method,),
+        ) as cursor:
+            (missing,) = await cursor.fetchone()
+        return bool(missing)
+
+    async def _product_quantizer(self, db: aiosqlite.Connection):
+        """Load the stored codebooks, training them if there are enough vectors.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+
+        Returns:
+            Optional[ProductQuantizer]: The quantizer, or None if it cannot be trained yet
+        """
+        from .quantization import ProductQuantizer
+
+        async with db.execute("SELECT data FROM vector_codebooks WHERE method = 'pq'") as cursor:
+            row = await cursor.fetchone()
+        if row:
+            return ProductQuantizer.from_bytes(row[0])
+        async with db.execute("SELECT COUNT(*) FROM vectors") as cursor:
+            (count,) = await cursor.fetchone()
+        if count < PQ_MIN_TRAINING_VECTORS:
+            return None
+        async with db.execute(
+            "SELECT vector FROM vectors ORDER BY RANDOM() LIMIT ?", (PQ_TRAINING_SAMPLE,)
+        ) as cursor:
+            sample = [json.loads(vector) for (vector,) in await cursor.fetchall()]
+        dims = len(sample[0])
+        subspaces = self.quantization.get("subspaces") or next(
+            dims // width for width in (8, 4, 2, 1) if dims % width == 0)
+        logger.info(f"Training product quantization codebooks on {len(sample)} vectors")
+        quantizer = await asyncio.to_thread(ProductQuantizer.fit, sample, subspaces)
+        await db.execute(
+            "INSERT OR REPLACE INTO vector_codebooks (method, data) VALUES ('pq', ?)",
+            (quantizer.to_bytes(),),
+        )
+        return quantizer
+
+    async def _quantized_search(
+        self,
+        db: aiosqlite.Connection,
+        op: SearchOp,
+        query_vector: List[float],
+        lexical: Optional[Dict[Tuple[str, str], int]] = None,
+    ) -> List[SearchItem]:
+        """Shortlist by compressed codes, then re-rank with full-precision vectors.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            op (SearchOp): Search operation, without a filter
+            query_vector (List[float]): Query embedding
+            lexical (Optional[Dict[Tuple[str, str], int]]): BM25 ranks to fuse with
+
+        Returns:
+            List[SearchItem]: The page of results, best first
+        """
+        import numpy as np
+        from .quantization import top_candidates
+
+        if self._codes_ready and await self._has_uncoded_vectors(db):
+            # Written by an instance encoding with another method (or before it could encode)
+            self._codes_ready = False
+        await self._ensure_codes(db)
+        quantizer = self._quantizer
+        condition, params = self._namespace_condition(op.namespace_prefix, "namespace")
+        async with db.execute(
+            f"SELECT namespace, key, code, scale FROM vector_codes WHERE method = ? AND {condition}",
+            [quantizer.method, *params],
+        ) as cursor:
+            rows = await cursor.fetchall()
+
+        shortlist: Dict[Tuple[str, str], None] = {}
+        if rows:
+            codes = np.frombuffer(b"".join(row[2] for row in rows), dtype=quantizer.dtype)
+            scales = np.array([row[3] or 0.0 for row in rows], dtype=np.float32)
+            approx = quantizer.scores(
+                np.asarray(query_vector, dtype=np.float32), codes.reshape(len(rows), -1), scales)
+            depth = (op.offset + op.limit) * self.quantization["rerank"]
+            for j in top_candidates(approx, depth):
+                shortlist.setdefault((rows[j][0], rows[j][1]), None)
+
+        items = await self._get_items(db, set(shortlist) | set(lexical or {}))
+        vectors = await self._get_vectors_for(db, set(shortlist))
+        ranked = sorted(
+            (
+                (max(self._cosine_similarity(query_vector, vectors[key])), items[key])
+                for key in shortlist if key in items and vectors.get(key)
+            ),
+            key=lambda x: x[0], reverse=True,
+        )
+        if lexical:
+            ranked = self._fuse_ranks(
+                ranked, [items[key] for key in lexical if key in items and key not in shortlist],
+                lexical)
+        return [
+            SearchItem(
+                namespace=item.namespace,
+                key=item.key,
+                value=item.value,
+                created_at=item.created_at,
+                updated_at=item.updated_at,
+                score=float(score),
+            )
+            for score, item in ranked[op.offset:op.offset + op.limit]
+        ]
+
+    async def _get_items(
+        self, db: aiosqlite.Connection, keys: set
+    ) -> Dict[Tuple[str, str], Item]:
+        """Fetch items by (namespace, key).
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            keys (set): (namespace, key) pairs
+
+        Returns:
+            Dict[Tuple[str, str], Item]: The items found
+        """
+        found = {}
+        for ns, chunk in self._key_chunks(keys):
+            async with db.execute(
+                f"""
+                SELECT namespace, key, value, created_at, updated_at FROM items
+                WHERE namespace = ? AND key IN ({",".join("?" * len(chunk))})
+                """,
+                [ns, *chunk],
+            ) as cursor:
+                for ns, key, value, created_at, updated_at in await cursor.fetchall():
+                    found[(ns, key)] = Item(
+                        namespace=tuple(ns.split("/")),
+                        key=key,
+                        value=json.loads(value),
+                        created_at=datetime.fromisoformat(created_at),
+                        updated_at=datetime.fromisoformat(updated_at),
+                    )
+        return found
+
+    async def _get_vectors_for(
+        self, db: aiosqlite.Connection, keys: set
+    ) -> Dict[Tuple[str, str], List[List[float]]]:
+        """Fetch the full-precision vectors of some items.
+
+        Args:
+            db (aiosqlite.Connection): Database connection
+            keys (set): (namespace, key) pairs
+
+        Returns:
+            Dict[Tuple[str, str], List[List[float]]]: Vectors per item
+        """
+        found: Dict[Tuple[str, str], List[List[float]]] = {}
+        for ns, chunk in self._key_chunks(keys):
+            async with db.execute(
+                f"""
+                SELECT key, vector FROM vectors
+                WHERE namespace = ? AND key IN ({",".join("?" * len(chunk))})
+                """,
+                [ns, *chunk],
+            ) as cursor:
+                for key, vector in await cursor.fetchall():
+                    found.setdefault((ns, key), []).append(json.loads(vector))
+        return found
+
+    @staticmethod
+    def _key_chunks(keys: set, size: int = 500):
+        """Group (namespace, key) pairs by namespace, in chunks that fit in one query.
+
+        Args:
+            keys (set): (namespace, key) pairs
+            size (int): Keys per chunk
+
+        Yields:
+            Tuple[str, List[str]]: A namespace and some of its keys
+        """
+        by_namespace: Dict[str, List[str]] = {}
+        for ns, key in keys:
+            by_namespace.setdefault(ns, []).append(key)
+        for ns, names in by_namespace.items():
+            for start in range(0, len(names), size):
+                yield ns, names[start:start + size]
 
     def _extract_texts(
         self, put_ops: Dict[Tuple[Tuple[str, ...], str], PutOp]
@@ -621,6 +1307,8 @@ class SqliteStore(BaseStore):
 
             mask = Y_norm != 0
             similarities = np.zeros_like(Y_norm)
+            if X_norm == 0:
+                return similarities.tolist()
             similarities[mask] = np.dot(Y_arr[mask], X_arr) / (Y_norm[mask] * X_norm)
             return similarities.tolist()
         except ImportError:
@@ -1,9 +1,141 @@
 import json
+import threading
+from collections import deque
 from langchain_core.messages import BaseMessage, AIMessage, AIMessageChunk, ToolMessage
-from rich.console import Console, ConsoleDimensions
+from rich.console import Console, ConsoleOptions, RenderResult
 from rich.live import Live
 from rich.markdown import Markdown
 from rich.prompt import Confirm
+from rich.text import Text
+
+# Live refreshes per second while streaming
+REFRESH_PER_SECOND = 12
+
+
+def _fit_lines(lines: list[str], width: int, max_lines: int) -> tuple[list[str], int]:
+    """
+    Take lines from the end until they fill `max_lines` terminal rows at `width`.
+    Returns the fitted lines and the rows they use. If the cut falls inside a
+    code block, an opening ``` is added so the rest still renders as code.
+    """
+    fitted = deque()
+    height = 0
+    code_block_count = 0
+    for line in reversed(lines):
+        # Calculate wrapped line height, rounding up for safety
+        line_height = 1 + len(line) // width
+        if height + line_height > max_lines:
+            if code_block_count % 2 == 1:
+                fitted.appendleft("```")
+            break
+        fitted.appendleft(line)
+        height += line_height
+        if line.strip().startswith("```"):
+            code_block_count += 1
+    return list(fitted), height
+
+
+class _Block:
+    """A closed markdown block with its lines, heights and parsed Markdown cached."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.lines = text.splitlines()
+        self._width = None
+        self._height = 0
+        self._markdown = None
+        self._partial = (None, None)
+
+    def height(self, width: int) -> int:
+        if width != self._width:
+            self._width = width
+            self._height = sum(1 + len(line) // width for line in self.lines)
+        return self._height
+
+    def markdown(self) -> Markdown:
+        if self._markdown is None:
+            self._markdown = Markdown(self.text)
+        return self._markdown
+
+    def partial(self, width: int, max_lines: int) -> Markdown:
+        """Markdown of the last lines of the block that fit in `max_lines` rows."""
+        key, markdown = self._partial
+        if key != (width, max_lines):
+            fitted, _ = _fit_lines(self.lines, width, max_lines)
+            markdown = Markdown("\n".join(fitted))
+            self._partial = ((width, max_lines), markdown)
+        return markdown
+
+
+class IncrementalMarkdown:
+    """
+    Append-only markdown document rendered as a window onto its end.
+
+    Text is split into blocks at blank lines outside code fences. Closed blocks
+    are parsed once and keep their line heights, so an append only scans the new
+    text and a frame only re-parses the trailing open block and walks the blocks
+    that are visible. The window is computed when Live renders a frame, not on
+    every append.
+    """
+
+    def __init__(self, placeholder: str = ""):
+        self.placeholder = placeholder
+        self._lock = threading.Lock()
+        self._blocks: list[_Block] = []
+        self._tail = ""
+        # Scan position in the tail and whether it is inside a code fence
+        self._scan = 0
+        self._fence = False
+
+    def append(self, text: str) -> None:
+        with self._lock:
+            self._tail += text
+            while (end := self._tail.find("\n", self._scan)) != -1:
+                line = self._tail[self._scan:end]
+                self._scan = end + 1
+                stripped = line.strip()
+                if stripped.startswith("```"):
+                    self._fence = not self._fence
+                elif not stripped and not self._fence and self._tail[:end].strip():
+                    self._blocks.append(_Block(self._tail[:self._scan]))
+                    self._tail = self._tail[self._scan:]
+                    self._scan = 0
+
+    @property
+    def text(self) -> str:
+        with self._lock:
+            return "".join(block.text for block in self._blocks) + self._tail
+
+    def window(self, width: int, max_lines: int) -> list:
+        """Renderables for the end of the document that fit in `max_lines` rows."""
+        with self._lock:
+            # Every block takes at least one row
+            blocks = self._blocks[-max_lines:]
+            tail = self._tail
+        if not blocks and not tail.strip():
+            return [Markdown(self.placeholder)]
+
+        tail_lines, used = _fit_lines(tail.splitlines(), width, max_lines)
+        renderables = [Markdown("\n".join(tail_lines))] if tail_lines else []
+        for block in reversed(blocks):
+            remaining = max_lines - used
+            if remaining <= 0:
+                break
+            height = block.height(width)
+            if height > remaining:
+                renderables.append(block.partial(width, remaining))
+                break
+            # Blocks are rendered separately, so restore the blank line between them
+            renderables.append(Text())
+            renderables.append(block.markdown())
+            used += height
+        renderables.reverse()
+        return renderables
+
+    def __rich_console__(self, console: Console, options: ConsoleOptions) -> RenderResult:
+        height = options.height or console.size.height
+        yield from self.window(options.max_width, height - 3)  # Safety margin
+
 
 class OutputHandler:
     def __init__(self, text_only: bool = False, only_last_message: bool = False):
@@ -11,60 +143,71 @@ class OutputHandler:
         self.text_only = text_only
         self.only_last_message = only_last_message
         self.last_message = ""
-        if self.text_only:
-            self.md = ""
-        else:
-            self.md = "Thinking...\n"
+        self._doc = IncrementalMarkdown("" if self.text_only else "Thinking...")
         self._live = None
 
+    @property
+    def md(self) -> str:
+        return self._doc.text
+
     def start(self):
         if not self.text_only:
             self._live = Live(
-                Markdown(self.md), 
+                self._doc,
                 vertical_overflow="visible", 
                 screen=True,
-                console=self.console
+                console=self.console,
+                refresh_per_second=REFRESH_PER_SECOND,
             )
             self._live.start()
 
     def update(self, chunk: any):
-        self.md = self._parse_chunk(chunk, self.md)
+        self.update_markdown(self.render_chunk(chunk))
+
+    def render_chunk(self, chunk: any) -> str:
+        """Return the markdown a chunk of agent response adds to the output."""
+        return self._parse_chunk(chunk)
+
+    def update_markdown(self, delta: str):
+        """Append already rendered markdown, e.g. streamed from the agent daemon."""
+        self._doc.append(delta)
         if(self.only_last_message and self.text_only):
             # when only_last_message, we print in finish()
             return
         if self.text_only:
-            self.console.print(self._parse_chunk(chunk), end="")
-        else:
-            if self.md.startswith("Thinking...") and not self.md.strip("Thinking...").isspace():
-                self.md = self.md.strip("Thinking...").strip()
-            partial_md = self._truncate_md_to_fit(self.md, self.console.size)
-            self._live.update(Markdown(partial_md), refresh=True)
+            self.console.print(delta, end="")
+        # Otherwise Live picks the change up on its next frame
 
     def update_error(self, error: Exception):
         import traceback
         error = f"Error: {error}\n\nStack trace:\n```\n{traceback.format_exc()}```"
-        self.md += error
+        self._doc.append(error)
         if(self.only_last_message):
             self.console.print(error)
             return
         if self.text_only:
             self.console.print_exception()
-        else:
-            partial_md = self._truncate_md_to_fit(self.md, self.console.size)
-            self._live.update(Markdown(partial_md), refresh=True)
+        elif self._live:
+            self._live.refresh()
 
     def stop(self):
         if not self.text_only and self._live:
             self._live.stop()
 
     def confirm_tool_call(self, config: dict, chunk: any) -> bool:
-        if not self._is_tool_call_requested(chunk, config):
+        if not self.needs_confirmation(config, chunk):
             return True
+        return self.ask_confirmation()
 
+    def needs_confirmation(self, config: dict, chunk: any) -> bool:
+        return self._is_tool_call_requested(chunk, config)
+
+    def ask_confirmation(self) -> bool:
+        """Pause the live view and ask the user to confirm a pending tool call."""
         self.stop()
         is_confirmed = self._ask_tool_call_confirmation()
         if not is_confirmed:
-            self.md += "# Tool call denied"
+            self._doc.append("# Tool call denied")
             return False
             
         if not self.text_only:
@@ -130,35 +273,6 @@ class OutputHandler:
             md += "\n"
         return md
 
-    def _truncate_md_to_fit(self, md: str, dimensions: ConsoleDimensions) -> str:
-        """
-        Truncate the markdown to fit the console size, with few line safety margin.
-        """
-        lines = md.splitlines()
-        max_lines = dimensions.height - 3  # Safety margin
-        fitted_lines = []
-        current_height = 0
-        code_block_count = 0
-
-        for line in reversed(lines):
-            # Calculate wrapped line height, rounding up for safety
-            line_height = 1 + len(line) // dimensions.width
-
-            if current_height + line_height > max_lines:
-                # If we're breaking in the middle of code blocks, add closing ```
-                if code_block_count % 2 == 1:
-                    fitted_lines.insert(0, "```")
-                break
-
-            fitted_lines.insert(0, line)
-            current_height += line_height
-
-            # Track code block markers
-            if line.strip() == "```":
-                code_block_count += 1
-
-        return '\n'.join(fitted_lines) if fitted_lines else ''
-
     def _is_tool_call_requested(self, chunk: any, config: dict) -> bool:
         """
         Check if the chunk contains a tool call request and requires confirmation.
@@ -0,0 +1,135 @@
+"""Prompt assembly that keeps the prompt prefix stable from one model call to the next.
+
+Providers cache the longest prefix a request shares with a recent one (OpenAI
+automatically, Anthropic on marked breakpoints) and bill and process cached
+input tokens at a fraction of the cost. A prefix stops matching at the first
+byte that differs, so the agent's prompt is ordered from most to least stable:
+
+1. the system prompt, with `{today_datetime}` rendered as today's date and
+   `{memories}` as the user's standing memories, which only change when a
+   memory is saved or consolidated,
+2. tool definitions, sorted by name (sent by the provider integration before
+   the messages),
+3. the conversation, which only grows,
+4. a trailing context message with the time to the minute and the memories
+   retrieved for this query, rebuilt for every call and never stored in the
+   conversation.
+
+The context message is only added for the placeholders the system prompt uses,
+so a prompt without `{today_datetime}` or `{memories}` gets neither.
+"""
+
+from datetime import datetime
+from typing import Callable, List, Optional, Tuple
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import PromptTemplate
+from langgraph.store.base import BaseStore
+
+from .memory import get_memories
+
+# Id of the per-turn context message, so the response cache can recognise it
+CONTEXT_MESSAGE_ID = "turn-context"
+
+
+def prompt_time() -> str:
+    """Local time to the minute, e.g. `2025-06-01T14:05+02:00`, for `AgentState.today_datetime`."""
+    return datetime.now().astimezone().isoformat(timespec="minutes")
+
+
+def format_memories(memories: List[str]) -> str:
+    return "\n".join(f"- {memory}" for memory in memories)
+
+
+async def prompt_memories(store: BaseStore, user_id: str = "myself", query: Optional[str] = None,
+                          limit: int = 10) -> Tuple[str, str]:
+    """Memories for the prompt, split by how often they change.
+
+    Returns:
+        Tuple[str, str]: The standing memories (the first `limit` stored, independent
+            of the query) and the memories relevant to `query` that are not among
+            them, each formatted as a bullet list
+    """
+    standing = await get_memories(store, user_id, limit=limit)
+    relevant = []
+    if query:
+        relevant = [m for m in await get_memories(store, user_id, query=query, limit=limit)
+                    if m not in standing]
+    return format_memories(standing), format_memories(relevant)
+
+
+def build_prompt(system_prompt: str) -> Callable[[dict], List[BaseMessage]]:
+    """State modifier for `create_react_agent` that orders the prompt stable-first.
+
+    Args:
+        system_prompt (str): The configured system prompt, a template that may use
+            any `AgentState` field as a placeholder
+
+    Returns:
+        Callable[[dict], List[BaseMessage]]: Builds the model input from the agent state
+    """
+    template = PromptTemplate.from_template(system_prompt)
+    placeholders = set(template.input_variables)
+
+    def assemble(state: dict) -> List[BaseMessage]:
+        now = state.get("today_datetime", "")
+        values = {name: state.get(name, "") for name in placeholders}
+        if "today_datetime" in placeholders:
+            values["today_datetime"] = now[:10]
+        messages = [SystemMessage(content=template.format(**values)), *state["messages"]]
+
+        context = []
+        if "today_datetime" in placeholders and now:
+            context.append(f"Current time: {now}")
+        if "memories" in placeholders and state.get("context_memories"):
+            context.append(f"Memories relevant to this message:\n{state['context_memories']}")
+        if context:
+            messages.append(HumanMessage(
+                id=CONTEXT_MESSAGE_ID,
+                content="Context for this turn (added automatically, not written by the user):\n"
+                        + "\n".join(context)))
+        return messages
+
+    return assemble
+
+
+def stream_usage_kwargs(provider: str) -> dict:
+    """Extra `init_chat_model` arguments so streamed responses report token usage."""
+    # OpenAI (and OpenAI-compatible endpoints) only send usage when streaming if asked
+    return {"stream_usage": True} if provider == "openai" else {}
+
+
+class TokenUsage:
+    """Input, cached input and output tokens summed over the model calls of a run."""
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.cached_tokens = 0
+        self.output_tokens = 0
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TokenUsage":
+        usage = cls()
+        usage.input_tokens = data.get("input_tokens", 0)
+        usage.cached_tokens = data.get("cached_input_tokens", 0)
+        usage.output_tokens = data.get("output_tokens", 0)
+        return usage
+
+    def add(self, usage_metadata: Optional[dict]) -> None:
+        usage = usage_metadata or {}
+        self.input_tokens += usage.get("input_tokens", 0)
+        self.output_tokens += usage.get("output_tokens", 0)
+        # Reported as prompt_tokens_details.cached_tokens by OpenAI, cache_read_input_tokens by Anthropic
+        self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+    @property
+    def cache_ratio(self) -> float:
+        return self.cached_tokens / self.input_tokens if self.input_tokens else 0.0
+
+    def as_dict(self) -> dict:
+        return {"input_tokens": self.input_tokens, "cached_input_tokens": self.cached_tokens,
+                "output_tokens": self.output_tokens}
+
+    def __str__(self) -> str:
+        return (f"{self.input_tokens} input tokens ({self.cache_ratio:.0%} from the prompt cache), "
+                f"{self.output_tokens} output tokens")
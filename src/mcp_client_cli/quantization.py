@@ -0,0 +1,160 @@
+"""Compressed vector codes for approximate memory search.
+
+Two quantizers over unit-normalized vectors, both scored with asymmetric
+distance computation: the query stays in full precision and only the stored
+vectors are compressed.
+
+- `Int8Quantizer` stores each vector as int8 with one float scale, 4x smaller
+  than float32. Scores are a dot product with the dequantized rows.
+- `ProductQuantizer` splits vectors into `subspaces` slices and replaces each
+  slice with the index of its nearest of 256 k-means centroids, so a vector
+  takes `subspaces` bytes. The query's dot product with every centroid is
+  computed once (a lookup table), and a code's score is the sum of its
+  subspaces' table entries.
+
+Both only shortlist candidates; `SqliteStore` re-ranks the shortlist against
+the full-precision vectors.
+"""
+
+import io
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Rows scored per step, bounding the temporary float32 copies
+_CHUNK = 65536
+
+
+def normalize(X: np.ndarray) -> np.ndarray:
+    X = np.asarray(X, dtype=np.float32)
+    if X.ndim == 1:
+        return X / max(float(np.linalg.norm(X)), 1e-12)
+    return X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+
+
+class Int8Quantizer:
+    """Symmetric per-vector int8 scalar quantization."""
+
+    method = "int8"
+    dtype = np.int8
+
+    def encode(self, X: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Encode rows of X.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: int8 codes and one scale per row
+        """
+        X = normalize(X)
+        scales = np.maximum(np.abs(X).max(axis=1), 1e-12) / 127.0
+        codes = np.rint(X / scales[:, None]).astype(np.int8)
+        return codes, scales.astype(np.float32)
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        """Approximate cosine similarity of the query with every code."""
+        query = normalize(query)
+        out = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _CHUNK):
+            block = codes[start:start + _CHUNK].astype(np.float32)
+            out[start:start + _CHUNK] = (block @ query) * scales[start:start + _CHUNK]
+        return out
+
+    def to_bytes(self) -> Optional[bytes]:
+        return None
+
+
+class ProductQuantizer:
+    """Product quantization with 256 centroids per subspace (one byte each).
+
+    Args:
+        codebooks (np.ndarray): Centroids, shaped (subspaces, 256, dims // subspaces)
+    """
+
+    method = "pq"
+    dtype = np.uint8
+
+    def __init__(self, codebooks: np.ndarray):
+        self.codebooks = np.asarray(codebooks, dtype=np.float32)
+        self.subspaces, self.centroids, self.sub_dims = self.codebooks.shape
+
+    @classmethod
+    def fit(cls, X: np.ndarray, subspaces: int, iterations: int = 20,
+            seed: int = 0) -> "ProductQuantizer":
+        """Train the codebooks with k-means on a sample of vectors.
+
+        Raises:
+            ValueError: If `subspaces` does not divide the vector size, or there
+                are fewer than 256 training vectors
+        """
+        X = normalize(X)
+        n, dims = X.shape
+        if dims % subspaces:
+            raise ValueError(f"{subspaces} subspaces do not divide {dims} dimensions")
+        if n < 256:
+            raise ValueError(f"Product quantization needs at least 256 vectors, got {n}")
+        rng = np.random.default_rng(seed)
+        sub_dims = dims // subspaces
+        codebooks = np.empty((subspaces, 256, sub_dims), dtype=np.float32)
+        for s in range(subspaces):
+            part = np.ascontiguousarray(X[:, s * sub_dims:(s + 1) * sub_dims])
+            centroids = part[rng.choice(n, 256, replace=False)].copy()
+            for _ in range(iterations):
+                assignment = cls._nearest(part, centroids)
+                counts = np.bincount(assignment, minlength=256)
+                sums = np.zeros_like(centroids)
+                np.add.at(sums, assignment, part)
+                filled = counts > 0
+                # Empty clusters keep their previous centroid
+                centroids[filled] = sums[filled] / counts[filled, None]
+            codebooks[s] = centroids
+        return cls(codebooks)
+
+    @staticmethod
+    def _nearest(part: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        out = np.empty(len(part), dtype=np.int64)
+        c_norms = (centroids ** 2).sum(axis=1)
+        for start in range(0, len(part), _CHUNK):
+            block = part[start:start + _CHUNK]
+            # ||x - c||^2 up to the constant ||x||^2
+            out[start:start + _CHUNK] = np.argmin(c_norms - 2 * block @ centroids.T, axis=1)
+        return out
+
+    def encode(self, X: np.ndarray) -> Tuple[np.ndarray, None]:
+        """Encode rows of X.
+
+        Returns:
+            Tuple[np.ndarray, None]: uint8 codes, one per subspace
+        """
+        X = normalize(X)
+        codes = np.empty((len(X), self.subspaces), dtype=np.uint8)
+        for s in range(self.subspaces):
+            part = X[:, s * self.sub_dims:(s + 1) * self.sub_dims]
+            codes[:, s] = self._nearest(part, self.codebooks[s])
+        return codes, None
+
+    def scores(self, query: np.ndarray, codes: np.ndarray, scales=None) -> np.ndarray:
+        """Approximate cosine similarity of the query with every code."""
+        query = normalize(query).reshape(self.subspaces, self.sub_dims)
+        # (subspaces, 256): the query slice's dot product with each centroid
+        table = np.einsum("skd,sd->sk", self.codebooks, query)
+        out = np.zeros(len(codes), dtype=np.float32)
+        for s in range(self.subspaces):
+            out += table[s, codes[:, s]]
+        return out
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        np.save(buffer, self.codebooks, allow_pickle=False)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "ProductQuantizer":
+        return cls(np.load(io.BytesIO(data), allow_pickle=False))
+
+
+def top_candidates(scores: np.ndarray, count: int) -> np.ndarray:
+    """Indices of the `count` highest scores, best first."""
+    if count < len(scores):
+        part = np.argpartition(-scores, count)[:count]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
@@ -0,0 +1,336 @@
+"""Client-side rate limiting of model calls.
+
+Web sessions, scheduled tasks and batch prompts in one process share an API
+key. Every model call first takes capacity from that model's `RateLimiter`:
+
+- a request bucket and a token bucket refilled at `requests_per_minute` and
+  `tokens_per_minute` (token use is estimated up front and settled from the
+  reported usage afterwards),
+- a concurrency limit adapted AIMD-style: halved on a 429 (once per burst),
+  raised by one per `limit` successful calls, up to `max_concurrency`.
+
+A 429 before the response starts streaming also pauses the limiter for the
+provider's `retry-after`, and the call is retried after a jittered backoff, up
+to `max_retries` times (unless a router has another model to send it to).
+Time spent waiting for capacity is recorded per model and served with the
+other model stats.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from .config import LLMConfig, RateLimitConfig
+
+logger = logging.getLogger(__name__)
+
+# Rough size of a token, for estimating a request before the provider reports usage
+CHARS_PER_TOKEN = 4
+# Longest sleep between capacity checks while waiting for a concurrency slot
+POLL_SECONDS = 0.05
+# Retries without a retry-after sleep a random time up to min(cap, base * 2**attempt)
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 30.0
+# Queue waits kept for the exported percentiles
+WAIT_WINDOW = 500
+# 429s this soon after the last cut belong to the same burst and don't cut the limit again
+DECREASE_INTERVAL = 1.0
+
+
+def estimate_tokens(messages: List[BaseMessage]) -> int:
+    return sum(len(str(m.content)) for m in messages) // CHARS_PER_TOKEN + 1
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    """Seconds a rate-limited provider asked to wait.
+
+    Returns:
+        The `retry-after` delay, 0.0 for a 429 without one, or None if `error` is not a 429.
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and "RateLimit" not in type(error).__name__:
+        return None
+    headers = getattr(response, "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return max(0.0, float(headers["retry-after-ms"]) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if value:
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            try:
+                return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+            except (TypeError, ValueError):
+                pass
+    return 0.0
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute plus an AIMD concurrency limit.
+
+    Shared by every thread and event loop of the process: state is guarded by a
+    lock and waiters sleep on their own loop until capacity is free.
+    """
+
+    def __init__(self, name: str, settings: RateLimitConfig):
+        self.name = name
+        self.settings = settings
+        self._lock = threading.Lock()
+        self._updated = time.monotonic()
+        self._requests = float(settings.requests_per_minute or 0)
+        self._tokens = float(settings.tokens_per_minute or 0)
+        self._limit = float(settings.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self._waits: deque = deque(maxlen=WAIT_WINDOW)
+        self._counts = {"calls": 0, "throttled": 0, "retries": 0}
+
+    def _refill(self, now: float) -> None:
+        elapsed, self._updated = now - self._updated, now
+        rpm, tpm = self.settings.requests_per_minute, self.settings.tokens_per_minute
+        if rpm:
+            self._requests = min(rpm, self._requests + elapsed * rpm / 60)
+        if tpm:
+            self._tokens = min(tpm, self._tokens + elapsed * tpm / 60)
+
+    def _try_acquire(self, tokens: int) -> float:
+        """Take capacity for one call and return 0, or return how long to wait before trying again."""
+        rpm, tpm = self.settings.requests_per_minute, self.settings.tokens_per_minute
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._paused_until:
+                return self._paused_until - now
+            if self._in_flight >= int(self._limit):
+                return POLL_SECONDS
+            if rpm and self._requests < 1:
+                return (1 - self._requests) * 60 / rpm
+            # A call larger than the whole bucket waits for a full bucket rather than forever
+            needed = min(tokens, tpm) if tpm else 0
+            if tpm and self._tokens < needed:
+                return (needed - self._tokens) * 60 / tpm
+            if rpm:
+                self._requests -= 1
+            if tpm:
+                self._tokens -= tokens
+            self._in_flight += 1
+            self._counts["calls"] += 1
+            return 0.0
+
+    def _record_wait(self, waited: float) -> None:
+        with self._lock:
+            self._waits.append(waited)
+        if waited >= 1:
+            logger.info(f"[RateLimiter:{self.name}] Waited {waited:.1f}s for capacity")
+
+    async def acquire(self, tokens: int) -> float:
+        """Wait until a call estimated at `tokens` tokens may start. Returns the seconds waited."""
+        started = time.monotonic()
+        with self._lock:
+            self._waiting += 1
+        try:
+            while (wait := self._try_acquire(tokens)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            with self._lock:
+                self._waiting -= 1
+        waited = time.monotonic() - started
+        self._record_wait(waited)
+        return waited
+
+    def acquire_sync(self, tokens: int) -> float:
+        started = time.monotonic()
+        while (wait := self._try_acquire(tokens)) > 0:
+            time.sleep(wait)
+        waited = time.monotonic() - started
+        self._record_wait(waited)
+        return waited
+
+    def release(self, estimated: int, used: Optional[int] = None, succeeded: bool = True,
+                throttled: Optional[float] = None) -> None:
+        """Return a call's concurrency slot and adapt the limit.
+
+        Args:
+            estimated: Tokens taken from the bucket when the call started.
+            used: Tokens the call actually used, if known; the difference is settled with the bucket.
+            succeeded: Whether the call completed; only completed calls raise the limit.
+            throttled: The call's `retry_after` if it was rate limited, else None.
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if used is not None and self.settings.tokens_per_minute:
+                self._tokens -= used - estimated
+            if throttled is None:
+                if succeeded:
+                    self._limit = min(self.settings.max_concurrency, self._limit + 1 / self._limit)
+                return
+            self._counts["throttled"] += 1
+            now = time.monotonic()
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self._limit = max(1.0, self._limit / 2)
+                self._last_decrease = now
+            if throttled:
+                self._paused_until = max(self._paused_until, now + throttled)
+            if self.settings.requests_per_minute:
+                self._requests = min(self._requests, 0.0)
+        logger.warning(f"[RateLimiter:{self.name}] Rate limited, concurrency limit now {int(self._limit)}")
+
+    def backoff(self, attempt: int, delay: float) -> float:
+        """Jittered seconds to sleep before retry number `attempt` (0-based)."""
+        with self._lock:
+            self._counts["retries"] += 1
+        if delay:
+            return delay + random.uniform(0, BACKOFF_BASE)
+        return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+    def snapshot(self) -> dict:
+        """Current limits and queue-wait percentiles (seconds)."""
+        with self._lock:
+            self._refill(time.monotonic())
+            waits = sorted(self._waits)
+            state = {
+                "concurrency_limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "requests_available": round(self._requests, 1) if self.settings.requests_per_minute else None,
+                "tokens_available": int(self._tokens) if self.settings.tokens_per_minute else None,
+                **self._counts,
+            }
+        pick = lambda q: round(waits[min(len(waits) - 1, int(q * len(waits)))], 3) if waits else None
+        state["queue_wait"] = {"p50_s": pick(0.5), "p95_s": pick(0.95), "max_s": pick(1.0)}
+        return state
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(llm: LLMConfig) -> RateLimiter:
+    """The process-wide limiter of a model; one per provider, model, endpoint and settings."""
+    key = (llm.provider, llm.model, llm.base_url, llm.rate_limit)
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter(f"{llm.provider}:{llm.model}", llm.rate_limit)
+        return _limiters[key]
+
+
+def limiter_stats() -> dict:
+    """Snapshots of every limiter in the process, by model."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.snapshot() for limiter in limiters}
+
+
+def _usage(chunks: List[ChatGenerationChunk]) -> Optional[int]:
+    reported = [c.message.usage_metadata for c in chunks if getattr(c.message, "usage_metadata", None)]
+    if reported:
+        return sum(u.get("total_tokens", 0) for u in reported)
+    return None
+
+
+class RateLimitedChatModel(BaseChatModel):
+    """Chat model wrapper taking capacity from a `RateLimiter` and retrying 429s."""
+
+    model: BaseChatModel
+    limiter: RateLimiter
+    # False raises the first 429 instead, e.g. for a router that falls back on it
+    retry_throttled: bool = True
+
+    @property
+    def _llm_type(self) -> str:
+        return f"rate-limited-{self.model._llm_type}"
+
+    @property
+    def _max_retries(self) -> int:
+        return self.limiter.settings.max_retries if self.retry_throttled else 0
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.model.bind_tools(tools, **kwargs)
+        if isinstance(bound, BaseChatModel):
+            return self.model_copy(update={"model": bound})
+        return self.bind(**bound.kwargs)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        estimated = estimate_tokens(messages)
+        for attempt in range(self._max_retries + 1):
+            await self.limiter.acquire(estimated)
+            chunks: List[ChatGenerationChunk] = []
+            released = False
+            try:
+                async for chunk in self.model._astream(messages, stop=stop, **kwargs):
+                    chunks.append(chunk)
+                    # Providers report their own tokens when handed a run manager; do the same
+                    if run_manager:
+                        await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                    yield chunk
+                released = True
+                self.limiter.release(estimated, _usage(chunks))
+                return
+            except Exception as e:
+                delay = retry_after(e)
+                released = True
+                self.limiter.release(estimated, _usage(chunks), succeeded=False, throttled=delay)
+                # Once the answer has started streaming, a retry would repeat it
+                if delay is None or chunks or attempt == self._max_retries:
+                    raise
+                sleep = self.limiter.backoff(attempt, delay)
+                logger.info(f"[RateLimiter:{self.limiter.name}] Retrying in {sleep:.1f}s "
+                            f"(attempt {attempt + 2} of {self._max_retries + 1})")
+                await asyncio.sleep(sleep)
+            finally:
+                if not released:
+                    # Cancelled or closed mid-call
+                    self.limiter.release(estimated, _usage(chunks), succeeded=False)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        estimated = estimate_tokens(messages)
+        for attempt in range(self._max_retries + 1):
+            self.limiter.acquire_sync(estimated)
+            try:
+                result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                delay = retry_after(e)
+                self.limiter.release(estimated, succeeded=False, throttled=delay)
+                if delay is None or attempt == self._max_retries:
+                    raise
+                time.sleep(self.limiter.backoff(attempt, delay))
+                continue
+            usage = getattr(result.generations[0].message, "usage_metadata", None) if result.generations else None
+            self.limiter.release(estimated, usage.get("total_tokens") if usage else None)
+            return result
+
+
+def with_rate_limit(model: BaseChatModel, llm: LLMConfig, retry_throttled: bool = True) -> BaseChatModel:
+    """Put `model` behind the process-wide limiter of its config.
+
+    Args:
+        model: The chat model to wrap.
+        llm: The LLM config whose `rate_limit` section applies.
+        retry_throttled: Retry calls rejected with a 429; False raises the first one.
+    """
+    return RateLimitedChatModel(model=model, limiter=limiter_for(llm), retry_throttled=retry_throttled)
@@ -0,0 +1,286 @@
+"""Opt-in cache of chat model responses.
+
+Scheduled tasks and prompt templates often send the same conversation to the
+model again. When the response cache is enabled and the model is deterministic
+(temperature 0, or the caller opts in), `CachedChatModel` looks up each model
+call by a hash of the messages, the bound tool schemas and the model parameters.
+The time in the per-turn context message is hashed as the date only, so the same
+question asked later the same day still hits; a scheduled task that opts in runs
+every fire in a fresh thread, since its session's history would otherwise make
+each fire's conversation unique. A hit is replayed as a stream of small chunks,
+so streaming consumers (the web UI, the CLI's live output) see the same events as
+for a real call.
+
+Entries live in a SQLite file and expire after `ttl_seconds`; once the file
+holds more than `max_mb` of responses, the least recently used are evicted.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel, generate_from_stream
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from .config import AppConfig, ResponseCacheConfig
+from .const import RESPONSE_CACHE_DB
+from .prompt_builder import CONTEXT_MESSAGE_ID
+
+# Characters per replayed content chunk
+REPLAY_CHUNK_CHARS = 16
+# The minutes of the context message's "Current time: 2025-06-01T14:05+02:00"
+_CONTEXT_TIME = re.compile(r"^(Current time: \d{4}-\d{2}-\d{2})\S*", re.MULTILINE)
+
+
+class ResponseCache:
+    """SQLite table of model responses keyed by request hash, with TTL and size-based eviction.
+
+    One connection is shared by all threads and serialized by a lock; async callers
+    go through `asyncio.to_thread`.
+    """
+
+    def __init__(self, path: Path, ttl_seconds: float, max_bytes: int):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    message TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_responses_used_at ON responses (used_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the stored message dict for `key`, or None if missing or expired."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT message FROM responses WHERE key = ? AND created_at > ?",
+                               (key, now - self.ttl_seconds)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, message: dict) -> None:
+        """Store a message dict under `key`, then drop expired and least recently used entries."""
+        payload = json.dumps(message)
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                         (key, payload, len(payload), now, now))
+            conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl_seconds,))
+            excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                evict, freed = [], 0
+                for old_key, size in conn.execute("SELECT key, size FROM responses ORDER BY used_at"):
+                    if freed >= excess:
+                        break
+                    evict.append((old_key,))
+                    freed += size
+                conn.executemany("DELETE FROM responses WHERE key = ?", evict)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM responses")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def _canonical_messages(messages: List[BaseMessage]) -> list:
+    """The parts of a conversation that determine the response.
+
+    Message ids are dropped and tool call ids renumbered by position: both are
+    fresh on every run, so keeping them would make every key unique. For the same
+    reason the per-turn context message keeps only the date of its current time.
+    """
+    call_ids: dict = {}
+
+    def call_id(value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return call_ids.setdefault(value, f"call_{len(call_ids)}")
+
+    canonical = []
+    for message in messages:
+        content = message.content
+        if message.id == CONTEXT_MESSAGE_ID and isinstance(content, str):
+            content = _CONTEXT_TIME.sub(r"\1", content)
+        entry = {"type": message.type, "content": content}
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            entry["tool_calls"] = [{"name": c["name"], "args": c["args"], "id": call_id(c.get("id"))}
+                                   for c in tool_calls]
+        if getattr(message, "tool_call_id", None):
+            entry["tool_call_id"] = call_id(message.tool_call_id)
+        canonical.append(entry)
+    return canonical
+
+
+def cache_key(messages: List[BaseMessage], llm_string: str) -> str:
+    """Hash of the messages and the model's identifying parameters (including bound tools)."""
+    body = json.dumps({"messages": _canonical_messages(messages), "llm": llm_string},
+                      sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _restore(stored: dict) -> AIMessage:
+    """Rebuild a cached response with fresh tool call ids and without token usage (none was spent)."""
+    message = messages_from_dict([stored])[0]
+    tool_calls = [{**call, "id": f"call_{uuid.uuid4().hex[:24]}"} for call in message.tool_calls]
+    return AIMessage(content=message.content, tool_calls=tool_calls,
+                     response_metadata={**message.response_metadata, "response_cache": "hit"})
+
+
+def _replay(message: AIMessage) -> Iterator[ChatGenerationChunk]:
+    """Split a restored response into stream chunks."""
+    content = message.content
+    if isinstance(content, str) and content:
+        for start in range(0, len(content), REPLAY_CHUNK_CHARS):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=content[start:start + REPLAY_CHUNK_CHARS]))
+    elif content:
+        yield ChatGenerationChunk(message=AIMessageChunk(content=content))
+    if message.tool_calls:
+        yield ChatGenerationChunk(message=AIMessageChunk(
+            content="",
+            tool_call_chunks=[{"name": call["name"], "args": json.dumps(call["args"]),
+                               "id": call["id"], "index": i}
+                              for i, call in enumerate(message.tool_calls)],
+        ))
+    yield ChatGenerationChunk(message=AIMessageChunk(content="", response_metadata=message.response_metadata))
+
+
+def _storable(result: ChatResult) -> Optional[dict]:
+    """The dict to cache for a model result, or None if it should not be cached."""
+    if len(result.generations) != 1:
+        return None
+    message = result.generations[0].message
+    if not isinstance(message, AIMessage) or (not message.content and not message.tool_calls):
+        return None
+    if getattr(message, "invalid_tool_calls", None):
+        return None
+    return message_to_dict(AIMessage(content=message.content, tool_calls=message.tool_calls,
+                                     response_metadata=message.response_metadata))
+
+
+class CachedChatModel(BaseChatModel):
+    """Chat model wrapper answering repeated requests from a `ResponseCache`."""
+
+    model: BaseChatModel
+    response_cache: ResponseCache
+
+    @property
+    def _llm_type(self) -> str:
+        return f"cached-{self.model._llm_type}"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return self.model._identifying_params
+
+    def bind_tools(self, tools, **kwargs):
+        # Let the wrapped model format the tool schemas, then bind them to the wrapper
+        bound = self.model.bind_tools(tools, **kwargs)
+        if isinstance(bound, BaseChatModel):
+            return self.model_copy(update={"model": bound})
+        return self.bind(**bound.kwargs)
+
+    def _key(self, messages: List[BaseMessage], stop: Optional[List[str]], kwargs: dict) -> str:
+        return cache_key(messages, self.model._get_llm_string(stop=stop, **kwargs))
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        key = self._key(messages, stop, kwargs)
+        stored = await asyncio.to_thread(self.response_cache.get, key)
+        if stored is not None:
+            for chunk in _replay(_restore(stored)):
+                # Providers report their own tokens when handed a run manager; do the same
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+            return
+        chunks = []
+        async for chunk in self.model._astream(messages, stop=stop, run_manager=run_manager, **kwargs):
+            chunks.append(chunk)
+            yield chunk
+        # Only complete streams are stored; a cancelled or failed call never gets here
+        if chunks:
+            await self._store(key, generate_from_stream(iter(chunks)))
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        stored = await asyncio.to_thread(self.response_cache.get, key)
+        if stored is not None:
+            return ChatResult(generations=[ChatGeneration(message=_restore(stored))])
+        result = await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        await self._store(key, result)
+        return result
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        key = self._key(messages, stop, kwargs)
+        stored = self.response_cache.get(key)
+        if stored is not None:
+            return ChatResult(generations=[ChatGeneration(message=_restore(stored))])
+        result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        entry = _storable(result)
+        if entry:
+            self.response_cache.put(key, entry)
+        return result
+
+    async def _store(self, key: str, result: ChatResult) -> None:
+        entry = _storable(result)
+        if entry:
+            await asyncio.to_thread(self.response_cache.put, key, entry)
+
+
+@lru_cache(maxsize=None)
+def shared_cache(settings: ResponseCacheConfig) -> ResponseCache:
+    """One cache per configured database, shared by every model in the process."""
+    return ResponseCache(Path(settings.path).expanduser() if settings.path else RESPONSE_CACHE_DB,
+                         settings.ttl_seconds, int(settings.max_mb * 1024 * 1024))
+
+
+def with_response_cache(model: BaseChatModel, app_config: AppConfig, opt_in: bool = False) -> BaseChatModel:
+    """Wrap `model` in the response cache if it is enabled and responses are deterministic.
+
+    Args:
+        model: The chat model to wrap.
+        app_config: The config whose `response_cache` section and temperature decide.
+        opt_in: Cache even with a non-zero temperature (e.g. a scheduled task that asked for it).
+
+    Returns:
+        The wrapped model, or `model` itself when caching does not apply.
+    """
+    settings = app_config.response_cache
+    if not settings.enabled or (app_config.llm.temperature != 0 and not opt_in):
+        return model
+    return CachedChatModel(model=model, response_cache=shared_cache(settings))
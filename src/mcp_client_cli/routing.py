@@ -0,0 +1,255 @@
+"""Primary and fallback chat models with hedged requests.
+
+`RoutedChatModel` sends each call to the primary model from the `llm` config.
+If no chunk has streamed back after a deadline, it sends the same call to the
+next fallback and keeps whichever answers first; the other request is
+cancelled. A call that fails before streaming (e.g. a 429) moves on to the next
+model at once. The deadline is a percentile (p95 by default) of the model's
+recent first-chunk latencies, kept per model by the process-wide `latency_stats`,
+and `hedge_delay` until enough samples exist.
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from .config import LLMConfig
+from .rate_limit import with_rate_limit
+
+logger = logging.getLogger(__name__)
+
+# First-chunk latencies kept per model, and how many are needed before the percentile is trusted
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+# Never hedge sooner than this, however fast the model usually is
+MIN_HEDGE_DELAY = 0.25
+
+
+class LatencyStats:
+    """Recent first-chunk latencies and call outcomes per model, shared by the process."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples: Dict[str, deque] = {}
+        self._outcomes: Dict[str, Counter] = {}
+
+    def record(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self._window)).append(seconds)
+
+    def count(self, name: str, outcome: str) -> None:
+        """Count a call outcome: "won", "lost" (cancelled by a faster model), "failed" or "hedged"."""
+        with self._lock:
+            self._outcomes.setdefault(name, Counter())[outcome] += 1
+
+    def percentile(self, name: str, q: float) -> Optional[float]:
+        """The q-th percentile (0-100) of the model's first-chunk latency, or None with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+    def snapshot(self) -> dict:
+        """Per-model latency percentiles (seconds) and outcome counts."""
+        with self._lock:
+            names = set(self._samples) | set(self._outcomes)
+            samples = {name: sorted(self._samples.get(name, ())) for name in names}
+            outcomes = {name: dict(self._outcomes.get(name, {})) for name in names}
+        pick = lambda s, q: round(s[min(len(s) - 1, int(q * len(s)))], 3) if s else None
+        return {
+            name: {"samples": len(samples[name]), "p50_s": pick(samples[name], 0.5),
+                   "p95_s": pick(samples[name], 0.95), **outcomes[name]}
+            for name in sorted(names)
+        }
+
+
+latency_stats = LatencyStats()
+
+_closing: set = set()
+
+
+async def _first_chunk(stream: AsyncIterator[ChatGenerationChunk]) -> Optional[ChatGenerationChunk]:
+    try:
+        return await stream.__anext__()
+    except StopAsyncIteration:
+        return None
+
+
+async def _close(task: asyncio.Task, stream) -> None:
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    try:
+        await stream.aclose()
+    except Exception:
+        pass
+
+
+def _discard(task: asyncio.Task, stream) -> None:
+    """Cancel a losing request and close its stream without holding up the winner."""
+    task.cancel()
+    closer = asyncio.ensure_future(_close(task, stream))
+    _closing.add(closer)
+    closer.add_done_callback(_closing.discard)
+
+
+def model_name(llm: LLMConfig) -> str:
+    return f"{llm.provider}:{llm.model}"
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model trying `models` in order, hedging slow first chunks and falling back on errors."""
+
+    models: List[BaseChatModel]
+    names: List[str]
+    # Per-model keyword arguments bound by `bind_tools` (tool schemas differ between providers)
+    bound: List[dict] = []
+    hedge_percentile: Optional[float] = 95
+    hedge_delay: float = 5.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"models": [{"name": name, **model._identifying_params}
+                           for name, model in zip(self.names, self.models)],
+                "bound": self.bound}
+
+    def bind_tools(self, tools, **kwargs) -> "RoutedChatModel":
+        models, bound = [], []
+        for model in self.models:
+            binding = model.bind_tools(tools, **kwargs)
+            if isinstance(binding, BaseChatModel):
+                models.append(binding)
+                bound.append({})
+            else:
+                models.append(binding.bound)
+                bound.append(binding.kwargs)
+        return self.model_copy(update={"models": models, "bound": bound})
+
+    def _kwargs(self, index: int, kwargs: dict) -> dict:
+        return {**(self.bound[index] if self.bound else {}), **kwargs}
+
+    def _hedge_deadline(self, index: int) -> Optional[float]:
+        """Seconds to wait for model `index` to stream before hedging, or None to wait for it."""
+        if self.hedge_percentile is None:
+            return None
+        observed = latency_stats.percentile(self.names[index], self.hedge_percentile)
+        if observed is None:
+            return self.hedge_delay
+        return min(max(observed, MIN_HEDGE_DELAY), self.hedge_delay)
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        # Each attempt: task awaiting its first chunk -> (model index, stream, start time)
+        attempts: Dict[asyncio.Task, tuple] = {}
+        errors: List[Exception] = []
+        launched = 0
+        winner = None
+
+        def launch() -> None:
+            nonlocal launched
+            stream = self.models[launched]._astream(messages, stop=stop, **self._kwargs(launched, kwargs))
+            attempts[asyncio.ensure_future(_first_chunk(stream))] = (launched, stream, time.perf_counter())
+            launched += 1
+
+        launch()
+        try:
+            while winner is None:
+                deadline = self._hedge_deadline(launched - 1) if launched < len(self.models) else None
+                done, _ = await asyncio.wait(attempts, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    logger.info(f"[Router] No response from {self.names[launched - 1]} after {deadline:.2f}s, "
+                                f"hedging with {self.names[launched]}")
+                    latency_stats.count(self.names[launched], "hedged")
+                    launch()
+                    continue
+                for task in done:
+                    index, stream, started = attempts.pop(task)
+                    error = task.exception()
+                    if error is not None:
+                        logger.warning(f"[Router] {self.names[index]} failed: {error}")
+                        latency_stats.count(self.names[index], "failed")
+                        errors.append(error)
+                    elif winner is None:
+                        latency_stats.record(self.names[index], time.perf_counter() - started)
+                        latency_stats.count(self.names[index], "won")
+                        winner = (index, stream, task.result())
+                    else:
+                        _discard(task, stream)
+                if winner is None and not attempts:
+                    if launched == len(self.models):
+                        raise errors[0]
+                    logger.info(f"[Router] Falling back to {self.names[launched]}")
+                    launch()
+        finally:
+            for task, (index, stream, started) in attempts.items():
+                if winner is not None:
+                    # A lower bound on this model's latency, so losing doesn't hide slowness
+                    latency_stats.record(self.names[index], time.perf_counter() - started)
+                    latency_stats.count(self.names[index], "lost")
+                _discard(task, stream)
+
+        index, stream, first = winner
+        try:
+            chunk = first
+            while chunk is not None:
+                # Providers report their own tokens when handed a run manager; do the same
+                if run_manager:
+                    await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+                yield chunk
+                chunk = await _first_chunk(stream)
+        finally:
+            await stream.aclose()
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                         **kwargs: Any) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop=stop, **kwargs))
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None,
+                  **kwargs: Any) -> ChatResult:
+        # No event loop to race on; fall back on errors only
+        for index, model in enumerate(self.models):
+            try:
+                return model._generate(messages, stop=stop, run_manager=run_manager,
+                                       **self._kwargs(index, kwargs))
+            except Exception as e:
+                latency_stats.count(self.names[index], "failed")
+                if index == len(self.models) - 1:
+                    raise
+                logger.warning(f"[Router] {self.names[index]} failed: {e}; falling back to {self.names[index + 1]}")
+
+
+def init_routed_model(llm: LLMConfig, init: Callable[[LLMConfig], BaseChatModel]) -> BaseChatModel:
+    """Build the model described by `llm`, routed through its fallbacks if it has any.
+
+    Each model is put behind its process-wide rate limiter. Only the last model
+    in the chain retries 429s itself; the others raise the first one so the
+    router moves on to the next model at once.
+
+    Args:
+        llm: The LLM config; `llm.fallbacks` lists the fallback models in order.
+        init: Builds one chat model from an LLM config.
+
+    Returns:
+        The primary model itself when there are no fallbacks, else a `RoutedChatModel`.
+    """
+    if not llm.fallbacks:
+        return with_rate_limit(init(llm), llm)
+    configs = (llm, *llm.fallbacks)
+    return RoutedChatModel(models=[with_rate_limit(init(c), c, retry_throttled=i == len(configs) - 1)
+                                   for i, c in enumerate(configs)],
+                           names=[model_name(c) for c in configs],
+                           hedge_percentile=llm.hedge_percentile, hedge_delay=llm.hedge_delay)
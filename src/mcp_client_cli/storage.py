@@ -1,9 +1,12 @@
 from datetime import datetime, timedelta
+from pathlib import Path
 from typing import Optional, List
 from mcp import StdioServerParameters, types
+import asyncio
 import json
 import aiosqlite
 import uuid
+import weakref
 
 from .const import *
 
@@ -50,11 +53,20 @@ def save_tools_cache(server_param: StdioServerParameters, tools: List[types.Tool
 
 
 class ConversationManager:
-    """Manages conversation persistence in SQLite database."""
+    """Manages conversation persistence in SQLite database.
+
+    When given a shared connection (and the lock that serializes its writers), the
+    schema is created once and every call reuses that connection instead of
+    opening a new one.
+    """
     
-    def __init__(self, db_path: Path):
+    def __init__(self, db_path: Path, conn: Optional[aiosqlite.Connection] = None,
+                 lock: Optional[asyncio.Lock] = None):
         self.db_path = db_path
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = conn
+        self.lock = lock or asyncio.Lock()
+        self._is_setup = False
     
     async def _init_db(self, db) -> None:
         """Initialize database schema.
@@ -62,6 +74,8 @@ class ConversationManager:
         Args:
             db: The database connection object.
         """
+        if db is self.conn and self._is_setup:
+            return
         await db.execute("""
             CREATE TABLE IF NOT EXISTS last_conversation (
                 id INTEGER PRIMARY KEY,
@@ -69,18 +83,31 @@ class ConversationManager:
             )
         """)
         await db.commit()
+        if db is self.conn:
+            self._is_setup = True
     
+    async def setup(self) -> None:
+        """Create the schema on the shared connection."""
+        async with self.lock:
+            await self._init_db(self.conn)
+
     async def get_last_id(self) -> str:
         """Get the thread ID of the last conversation.
         
         Returns:
             str: The thread ID of the last conversation, or a new UUID if no conversation exists.
         """
+        if self.conn is not None:
+            async with self.lock:
+                return await self._get_last_id(self.conn)
         async with aiosqlite.connect(self.db_path) as db:
-            await self._init_db(db)
-            async with db.execute("SELECT thread_id FROM last_conversation LIMIT 1") as cursor:
-                row = await cursor.fetchone()
-            return row[0] if row else uuid.uuid4().hex
+            return await self._get_last_id(db)
+
+    async def _get_last_id(self, db) -> str:
+        await self._init_db(db)
+        async with db.execute("SELECT thread_id FROM last_conversation LIMIT 1") as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else uuid.uuid4().hex
     
     async def save_id(self, thread_id: str, db = None) -> None:
         """Save thread ID as the last conversation.
@@ -89,9 +116,13 @@ class ConversationManager:
             thread_id (str): The thread ID to save.
             db: The database connection object (optional).
         """
+        db = db or self.conn
         if db is None:
             async with aiosqlite.connect(self.db_path) as db:
                 await self._save_id(db, thread_id)
+        elif db is self.conn:
+            async with self.lock:
+                await self._save_id(db, thread_id)
         else:
             await self._save_id(db, thread_id)
     
@@ -109,4 +140,87 @@ class ConversationManager:
                 "INSERT INTO last_conversation (thread_id) VALUES (?)", 
                 (thread_id,)
             )
-            await db.commit()
\ No newline at end of file
+            await db.commit()
+
+
+class Storage:
+    """Long-lived connection to conversations.db shared by the checkpointer, the
+    memory store and the conversation manager.
+
+    The connection is opened once, in WAL mode, and the schemas are created once.
+    All three components serialize their transactions on the checkpointer's lock,
+    so they never interleave on the shared connection. Use `Storage.shared()` to
+    get the instance for the running event loop: the CLI and the daemon have one
+    loop for the whole process, and each web worker thread keeps its own loop.
+    """
+
+    _instances: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Storage]" = weakref.WeakKeyDictionary()
+
+    def __init__(self, db_path: Path = SQLITE_DB, index: Optional[dict] = None):
+        self.db_path = Path(db_path)
+        # Memory store IndexConfig; taken from the `embeddings` config section when None
+        self.index = index
+        self.conn: Optional[aiosqlite.Connection] = None
+        self.checkpointer = None
+        self.store = None
+        self.conversations: Optional[ConversationManager] = None
+        self._open_lock = asyncio.Lock()
+
+    @classmethod
+    async def shared(cls, db_path: Path = SQLITE_DB) -> "Storage":
+        """Return the open storage for the running event loop, opening it on first use."""
+        loop = asyncio.get_running_loop()
+        storage = cls._instances.get(loop)
+        if storage is None:
+            storage = cls._instances[loop] = cls(db_path)
+        await storage.open()
+        return storage
+
+    @classmethod
+    async def close_shared(cls) -> None:
+        """Close the storage of the running event loop, if one was opened."""
+        storage = cls._instances.pop(asyncio.get_running_loop(), None)
+        if storage is not None:
+            await storage.close()
+
+    async def open(self) -> None:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        from .embeddings import memory_index_config
+        from .memory import SqliteStore
+
+        async with self._open_lock:
+            if self.conn is not None:
+                return
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            conn = await aiosqlite.connect(self.db_path)
+            try:
+                await conn.executescript("""
+                    PRAGMA journal_mode=WAL;
+                    PRAGMA synchronous=NORMAL;
+                    PRAGMA busy_timeout=5000;
+                """)
+                checkpointer = AsyncSqliteSaver(conn)
+                await checkpointer.setup()
+                index = self.index if self.index is not None else memory_index_config()
+                store = SqliteStore(self.db_path, index=index, conn=conn, lock=checkpointer.lock)
+                await store.setup()
+                conversations = ConversationManager(self.db_path, conn=conn, lock=checkpointer.lock)
+                await conversations.setup()
+            except BaseException:
+                # The connection's worker thread would otherwise keep the process alive
+                await conn.close()
+                raise
+            self.conn, self.checkpointer, self.store, self.conversations = (
+                conn, checkpointer, store, conversations)
+
+    async def close(self) -> None:
+        if self.conn is not None:
+            conn, self.conn = self.conn, None
+            await conn.close()
+
+    async def __aenter__(self) -> "Storage":
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
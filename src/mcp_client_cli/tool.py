@@ -2,6 +2,7 @@ from typing import List, Type, Optional, Any
 from typing_extensions import override
 from pydantic import BaseModel
 from langchain_core.tools import BaseTool, BaseToolkit, ToolException
+from langchain_core.runnables import RunnableConfig
 from mcp import StdioServerParameters, types, ClientSession
 from mcp.client.stdio import stdio_client
 import pydantic
@@ -9,8 +10,10 @@ from pydantic_core import to_json
 from jsonschema_pydantic import jsonschema_to_pydantic
 import asyncio
 import json
+import time
 
 from .storage import *
+from .const import DEFAULT_TOOL_TIMEOUT
 
 class McpServerConfig(BaseModel):
     """Configuration for an MCP server.
@@ -23,16 +26,19 @@ class McpServerConfig(BaseModel):
         server_param (StdioServerParameters): Connection parameters for the server, including
             command, arguments and environment variables
         exclude_tools (list[str]): List of tool names to exclude from this server
+        tool_timeout (Optional[float]): Seconds a single tool call may take
     """
     
     server_name: str
     server_param: StdioServerParameters
     exclude_tools: list[str] = []
+    tool_timeout: Optional[float] = None
 
 class McpToolkit(BaseToolkit):
     name: str
     server_param: StdioServerParameters
     exclude_tools: list[str] = []
+    tool_timeout: Optional[float] = None
     _session: Optional[ClientSession] = None
     _tools: List[BaseTool] = []
     _client = None
@@ -125,20 +131,28 @@ class McpTool(BaseTool):
     def _run(self, **kwargs):
         raise NotImplementedError("Only async operations are supported")
 
-    async def _arun(self, **kwargs):
+    async def _arun(self, *, run_config: RunnableConfig = None, **kwargs):
         if not self.session:
             self.session = await self.toolkit._start_session()
 
         tool_name = self.name
         tool_args = kwargs
+        # Per-tool timeout, capped by the run's overall deadline if one was set
+        timeout = self.toolkit.tool_timeout or DEFAULT_TOOL_TIMEOUT
+        deadline = (run_config or {}).get("configurable", {}).get("deadline")
+        if deadline:
+            timeout = min(timeout, max(deadline - time.time(), 0))
         print(f"[McpTool:{tool_name}] Calling tool with args: {json.dumps(tool_args)}")
         try:
-            result = await self.session.call_tool(self.name, arguments=kwargs)
+            result = await asyncio.wait_for(self.session.call_tool(self.name, arguments=kwargs), timeout)
             content = to_json(result.content).decode()
             print(f"[McpTool:{tool_name}] Received result: isError={result.isError}, content={content[:200]}...")
             if result.isError:
                 raise ToolException(content)
             return content
+        except asyncio.TimeoutError:
+            print(f"[McpTool:{tool_name}] Timed out after {timeout:.0f}s")
+            return f"⚠️ {tool_name} timed out after {timeout:.0f}s"
         except Exception as e:
             # Surface tool errors as chat text
             if isinstance(e, ToolException):
@@ -185,7 +199,8 @@ async def convert_mcp_to_langchain_tools(server_config: McpServerConfig, force_r
     toolkit = McpToolkit(
         name=server_config.server_name, 
         server_param=server_config.server_param,
-        exclude_tools=server_config.exclude_tools
+        exclude_tools=server_config.exclude_tools,
+        tool_timeout=server_config.tool_timeout,
     )
     await toolkit.initialize(force_refresh=force_refresh)
     return toolkit
@@ -0,0 +1,205 @@
+"""Admission control and fair queuing for agent runs.
+
+At most `max_concurrent` agent runs execute at once across all sessions. Waiting
+runs are grouped by priority class (lower value runs first) and, within a class,
+served weighted round-robin across users so one busy user cannot starve others.
+Queued runs receive status events with their position and an ETA.
+"""
+import logging
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Callable, Optional
+
+logger = logging.getLogger("run_queue")
+
+PRIORITY_INTERACTIVE = int(os.getenv("AGENT_PRIORITY_INTERACTIVE", "0"))
+PRIORITY_SCHEDULED = int(os.getenv("AGENT_PRIORITY_SCHEDULED", "1"))
+
+@dataclass
+class QueuedRun:
+    session_id: str
+    user_id: str
+    priority: int
+    target: Callable[[], None]
+    notify: Optional[Callable[[dict], None]] = None
+    cancel: Optional[Callable[[], None]] = None
+    enqueued_at: float = field(default_factory=time.monotonic)
+
+class RunQueue:
+    """Bounded pool of agent run workers fed by a weighted fair queue."""
+
+    def __init__(self, max_concurrent: int = 4, weights: Optional[dict[str, int]] = None,
+                 initial_run_seconds: float = 30.0):
+        self.max_concurrent = max_concurrent
+        self.weights = weights or {}
+        self._cond = threading.Condition()
+        # priority -> user_id -> runs, in round-robin order
+        self._classes: dict[int, OrderedDict[str, deque[QueuedRun]]] = {}
+        # Runs the front user of a class may still take in the current round
+        self._credits: dict[tuple[int, str], int] = {}
+        self._queued: dict[str, QueuedRun] = {}
+        self._active: dict[str, QueuedRun] = {}
+        # Exponentially weighted average run duration, used for ETAs
+        self._avg_run_seconds = initial_run_seconds
+        self._workers: list[threading.Thread] = []
+
+    @classmethod
+    def from_env(cls) -> "RunQueue":
+        """Build from AGENT_MAX_CONCURRENT_RUNS and AGENT_USER_WEIGHTS ("user=2,other=3")."""
+        weights = {}
+        for pair in filter(None, os.getenv("AGENT_USER_WEIGHTS", "").split(",")):
+            user_id, _, weight = pair.partition("=")
+            weights[user_id.strip()] = max(int(weight or 1), 1)
+        return cls(int(os.getenv("AGENT_MAX_CONCURRENT_RUNS", "4")), weights)
+
+    def is_busy(self, session_id: str) -> bool:
+        """True if the session already has a run queued or executing."""
+        with self._cond:
+            return session_id in self._queued or session_id in self._active
+
+    def submit(self, session_id: str, user_id: str, target: Callable[[], None],
+               notify: Optional[Callable[[dict], None]] = None,
+               priority: int = PRIORITY_INTERACTIVE,
+               cancel: Optional[Callable[[], None]] = None) -> int:
+        """Queue a run. Returns its 1-based position, 0 if it can start right away.
+
+        `cancel` is called by `cancel()`, whether the run was dropped from the
+        queue or is already executing.
+        """
+        run = QueuedRun(session_id, user_id, priority, target, notify, cancel)
+        with self._cond:
+            self._ensure_workers()
+            users = self._classes.setdefault(priority, OrderedDict())
+            users.setdefault(user_id, deque()).append(run)
+            self._queued[session_id] = run
+            self._cond.notify()
+            idle = self.max_concurrent - len(self._active)
+            positions = self._positions()
+            position = positions.index(run) + 1
+        logger.info(f"Queued run session={session_id} user={user_id} priority={priority} "
+                    f"position={position} active={len(self._active)}")
+        self._notify_positions(positions)
+        return 0 if position <= idle else position
+
+    def cancel(self, session_id: str, priority: Optional[int] = None) -> Optional[str]:
+        """Drop a queued run or signal a running one.
+
+        Only runs of the given priority class are affected when `priority` is set.
+        Returns "queued" or "running" for the state the run was in, None if nothing matched.
+        """
+        with self._cond:
+            run = self._queued.get(session_id)
+            if run and priority in (None, run.priority):
+                users = self._classes[run.priority]
+                runs = users[run.user_id]
+                runs.remove(run)
+                if not runs:
+                    del users[run.user_id]
+                    self._credits.pop((run.priority, run.user_id), None)
+                del self._queued[session_id]
+                state = "queued"
+                positions = self._positions()
+            else:
+                run = self._active.get(session_id)
+                if not run or priority not in (None, run.priority):
+                    return None
+                state = "running"
+        logger.info(f"Cancelling {state} run session={session_id}")
+        if state == "queued":
+            self._notify_positions(positions)
+        if run.cancel:
+            run.cancel()
+        return state
+
+    # --- Internals ---
+    def _ensure_workers(self) -> None:
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(target=self._work, daemon=True,
+                                      name=f"agent-run-{len(self._workers)}")
+            self._workers.append(worker)
+            worker.start()
+
+    def _pop_from(self, priority: int, users: OrderedDict, credits: dict) -> QueuedRun:
+        """Weighted round-robin step on one priority class (mutates its arguments)."""
+        user_id, runs = next(iter(users.items()))
+        key = (priority, user_id)
+        remaining = credits.get(key, self.weights.get(user_id, 1))
+        run = runs.popleft()
+        remaining -= 1
+        if not runs:
+            del users[user_id]
+            credits.pop(key, None)
+        elif remaining <= 0:
+            users.move_to_end(user_id)
+            credits.pop(key, None)
+        else:
+            credits[key] = remaining
+        return run
+
+    def _pop(self) -> Optional[QueuedRun]:
+        for priority in sorted(self._classes):
+            users = self._classes[priority]
+            if users:
+                return self._pop_from(priority, users, self._credits)
+        return None
+
+    def _positions(self) -> list[QueuedRun]:
+        """Dispatch order of all queued runs, by simulating pops on a copy."""
+        order = []
+        credits = dict(self._credits)
+        for priority in sorted(self._classes):
+            users = OrderedDict((u, deque(runs)) for u, runs in self._classes[priority].items())
+            while users:
+                order.append(self._pop_from(priority, users, credits))
+        return order
+
+    def _notify_positions(self, order: list[QueuedRun]) -> None:
+        with self._cond:
+            busy_slots = len(self._active) >= self.max_concurrent
+            avg = self._avg_run_seconds
+        if not busy_slots:
+            return
+        for index, run in enumerate(order):
+            if not run.notify:
+                continue
+            eta = math.ceil((index + 1) / self.max_concurrent * avg)
+            try:
+                run.notify({
+                    "type": "status",
+                    "content": f"Queued: position {index + 1}, starting in about {eta}s",
+                    "position": index + 1,
+                    "eta_seconds": eta,
+                    "session_id": run.session_id,
+                })
+            except Exception as e:
+                logger.debug(f"Failed to notify queued run {run.session_id}: {e}")
+
+    def _work(self) -> None:
+        while True:
+            with self._cond:
+                while (run := self._pop()) is None:
+                    self._cond.wait()
+                del self._queued[run.session_id]
+                self._active[run.session_id] = run
+                positions = self._positions()
+            wait = time.monotonic() - run.enqueued_at
+            logger.info(f"Starting run session={run.session_id} user={run.user_id} after {wait:.2f}s in queue")
+            self._notify_positions(positions)
+            started = time.monotonic()
+            try:
+                run.target()
+            except Exception as e:
+                logger.error(f"Agent run for session {run.session_id} failed: {e}", exc_info=True)
+            finally:
+                duration = time.monotonic() - started
+                with self._cond:
+                    self._active.pop(run.session_id, None)
+                    self._avg_run_seconds = 0.8 * self._avg_run_seconds + 0.2 * duration
+                    positions = self._positions()
+                self._notify_positions(positions)
+
+run_queue = RunQueue.from_env()
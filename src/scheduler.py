@@ -1,6 +1,13 @@
 import os
+import copy
 import uuid
+import json
+import time
+import atexit
+import socket
+import hashlib
 import logging
+import threading
 
 # --- Logging config: file + console ---
 logging.basicConfig(
@@ -12,16 +19,25 @@ logging.basicConfig(
     ]
 )
 
+import heapq
+import itertools
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta
+from functools import lru_cache
 from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.jobstores.sqlalchemy import SQLAlchemyJobStore
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from croniter import croniter
-from sqlalchemy import create_engine, Column, String, Boolean, DateTime
+from sqlalchemy import (
+    create_engine, Column, String, Boolean, DateTime, Integer, Text, Index,
+    MetaData, Table, select, insert, update, delete, and_, or_, func, inspect, text,
+)
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from dateutil import parser as dtparser
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 import requests
 
 DB_PATH = os.path.join(os.path.dirname(__file__), '..', 'tasks.db')
@@ -38,6 +54,10 @@ class Task:
     enabled: bool
     created_at: datetime
     updated_at: datetime
+    # Let the response cache answer this task's model calls even at a non-zero temperature
+    cache_responses: bool = False
+    # IANA timezone the cron expression is evaluated in
+    timezone: str = "UTC"
 
 class TaskModel(Base):
     __tablename__ = 'tasks'
@@ -49,14 +69,101 @@ class TaskModel(Base):
     enabled = Column(Boolean, default=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    cache_responses = Column(Boolean, default=False)
+    timezone = Column(String, default="UTC")
+
+    __table_args__ = (
+        Index('ix_tasks_session_enabled_next', 'session_id', 'enabled', 'next_run'),
+    )
+
+@dataclass
+class TaskRun:
+    id: str
+    task_id: str
+    session_id: str
+    started_at: datetime
+    finished_at: datetime | None
+    status: str
+    latency_ms: int | None
+    input_tokens: int | None
+    output_tokens: int | None
+    output: str | None
+
+class TaskRunModel(Base):
+    __tablename__ = 'task_runs'
+    id = Column(String, primary_key=True)
+    task_id = Column(String, nullable=False)
+    session_id = Column(String, nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    finished_at = Column(DateTime)
+    # running | succeeded | failed | rejected | cancelled
+    status = Column(String, nullable=False, default="running")
+    latency_ms = Column(Integer)
+    input_tokens = Column(Integer)
+    output_tokens = Column(Integer)
+    output = Column(Text)
+
+    __table_args__ = (
+        # id breaks ties between runs started in the same instant, for keyset paging
+        Index('ix_task_runs_task_started_id', 'task_id', 'started_at', 'id'),
+        Index('ix_task_runs_session_started_id', 'session_id', 'started_at', 'id'),
+    )
 
 engine = create_engine(f'sqlite:///{DB_PATH}', connect_args={'check_same_thread': False})
 Session = sessionmaker(bind=engine)
 
-scheduler = BackgroundScheduler()
 logger = logging.getLogger("scheduler")
 
-SENT_LOG = os.path.join(os.path.dirname(__file__), '..', 'sent.log')
+# --- Dispatch scheduler ---
+# Jobs live in a persistent SQL job store shared by every process. All processes
+# start the scheduler paused (so they can add/remove jobs); only the holder of the
+# leader lease resumes it and actually fires tasks.
+JOBSTORE_URL = os.getenv("SCHEDULER_JOBSTORE_URL", f"sqlite:///{DB_PATH}")
+# "all": this process may become the dispatcher; "api": only manage jobs (use with a
+# standalone worker started via `python -m src.scheduler_worker`)
+SCHEDULER_ROLE = os.getenv("SCHEDULER_ROLE", "all").lower()
+MISFIRE_GRACE_SECONDS = int(os.getenv("SCHEDULER_MISFIRE_GRACE", "300"))
+COALESCE = os.getenv("SCHEDULER_COALESCE", "true").lower() in ("1", "true", "yes")
+LEASE_NAME = "scheduler"
+LEASE_TTL_SECONDS = int(os.getenv("SCHEDULER_LEASE_TTL", "15"))
+LEASE_RENEW_SECONDS = max(LEASE_TTL_SECONDS // 3, 1)
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+jobstore_engine = (
+    engine if JOBSTORE_URL == f"sqlite:///{DB_PATH}"
+    else create_engine(JOBSTORE_URL)
+)
+scheduler = BackgroundScheduler(
+    jobstores={"default": SQLAlchemyJobStore(engine=jobstore_engine)},
+    job_defaults={
+        "misfire_grace_time": MISFIRE_GRACE_SECONDS,
+        "coalesce": COALESCE,
+        "max_instances": 1,
+    },
+)
+# Process-local upkeep (run flushing, lease renewal); never paused
+housekeeping = BackgroundScheduler()
+_is_leader = False
+
+lease_metadata = MetaData()
+scheduler_lease = Table(
+    'scheduler_lease', lease_metadata,
+    Column('name', String, primary_key=True),
+    Column('holder', String, nullable=False),
+    Column('expires_at', DateTime, nullable=False),
+)
+
+# Run records are buffered in memory and written in one transaction per flush
+RUN_FLUSH_SIZE = 50
+RUN_FLUSH_SECONDS = 5
+_run_buffer: dict[str, dict] = {}
+_run_buffer_lock = threading.Lock()
+
+# Per-session task listing cache: session_id -> (version, tasks, etag). An entry is
+# reused while the session's task count and updated_at aggregates, read from the
+# database, still match, so writes by other workers and hosts are seen at once.
+_task_cache: dict[str, tuple[tuple, list[Task], str]] = {}
+_task_cache_lock = threading.Lock()
 
 # --- Util ---
 def _to_task(model: TaskModel) -> Task:
@@ -69,43 +176,198 @@ def _to_task(model: TaskModel) -> Task:
         enabled=model.enabled,
         created_at=model.created_at,
         updated_at=model.updated_at,
+        cache_responses=bool(model.cache_responses),
+        timezone=model.timezone or "UTC",
     )
 
-from zoneinfo import ZoneInfo
+def _to_run(model: TaskRunModel) -> TaskRun:
+    return TaskRun(
+        id=model.id,
+        task_id=model.task_id,
+        session_id=model.session_id,
+        started_at=model.started_at,
+        finished_at=model.finished_at,
+        status=model.status,
+        latency_ms=model.latency_ms,
+        input_tokens=model.input_tokens,
+        output_tokens=model.output_tokens,
+        output=model.output,
+    )
 
-def _schedule_job(task: Task, user_tz: str = "UTC"):
-    if not task.enabled:
-        logger.info(f"Not scheduling disabled task {task.id}")
+# --- Cron cache ---
+# Parsing cron expressions, ISO dates and building triggers is repeated on every
+# create/update/schedule/fire; cache the parsed forms keyed by expression and timezone.
+CRON_CACHE_SIZE = 1024
+
+@lru_cache(maxsize=CRON_CACHE_SIZE)
+def _cron_template(expr: str, tz_name: str) -> croniter | None:
+    """Parsed croniter for `expr`, or None if it is not a valid cron expression."""
+    if not croniter.is_valid(expr):
+        return None
+    return croniter(expr, datetime.now(ZoneInfo(tz_name)))
+
+def _cron_iter(expr: str, start: datetime, tz_name: str = "UTC") -> croniter | None:
+    """Fresh iterator positioned at `start` that shares the cached parse."""
+    template = _cron_template(expr, tz_name)
+    if template is None:
+        return None
+    itr = copy.copy(template)
+    itr.set_current(start)
+    return itr
+
+def _is_cron(expr: str) -> bool:
+    return _cron_template(expr, "UTC") is not None
+
+@lru_cache(maxsize=CRON_CACHE_SIZE)
+def _parse_date(expr: str) -> datetime:
+    return dtparser.parse(expr)
+
+@lru_cache(maxsize=CRON_CACHE_SIZE)
+def _trigger_for(expr: str, tz_name: str) -> CronTrigger | DateTrigger:
+    tz = ZoneInfo(tz_name)
+    if _is_cron(expr):
+        return CronTrigger.from_crontab(expr, timezone=tz)
+    dt = _parse_date(expr)
+    # Naive ISO dates are interpreted as UTC
+    dt = dt.replace(tzinfo=ZoneInfo("UTC")) if dt.tzinfo is None else dt
+    return DateTrigger(run_date=dt.astimezone(tz), timezone=tz)
+
+def _next_run(cron: str, tz_name: str = "UTC") -> datetime:
+    """Next fire time of a cron expression (evaluated in `tz_name`) or ISO date, as naive UTC."""
+    itr = _cron_iter(cron, datetime.now(ZoneInfo(tz_name)), tz_name)
+    when = itr.get_next(datetime) if itr else _parse_date(cron)
+    # Naive ISO dates are interpreted as UTC, as in _trigger_for
+    return when.astimezone(ZoneInfo("UTC")).replace(tzinfo=None) if when.tzinfo else when
+
+def _fire_times(task: Task, start: datetime, end: datetime, tz_name: str):
+    """Yield (fire_time, task_id) for `task` within [start, end) in ascending order.
+
+    The cron expression is expanded in the task's own timezone; fire times are
+    reported in `tz_name`.
+    """
+    tz = ZoneInfo(tz_name)
+    itr = _cron_iter(task.cron, start.astimezone(ZoneInfo(task.timezone)), task.timezone)
+    if itr is None:
+        when = _trigger_for(task.cron, task.timezone).run_date
+        if start <= when < end:
+            yield when.astimezone(tz), task.id
         return
-    job_id = f"task_{task.id}"
-    # Remove existing job
+    while True:
+        when = itr.get_next(datetime)
+        if when >= end:
+            return
+        yield when.astimezone(tz), task.id
+
+# --- Run history ---
+def record_run(run_id: str, **fields) -> None:
+    """Buffer a run insert/update; later calls for the same run are merged."""
+    with _run_buffer_lock:
+        _run_buffer.setdefault(run_id, {}).update(fields)
+        should_flush = len(_run_buffer) >= RUN_FLUSH_SIZE
+    if should_flush:
+        flush_runs()
+
+def finish_run(run_id: str, status: str, output: str | None = None,
+               input_tokens: int | None = None, output_tokens: int | None = None) -> None:
+    """Mark a run as finished. Latency is computed from the recorded start time at flush."""
+    record_run(
+        run_id,
+        status=status,
+        finished_at=datetime.utcnow(),
+        output=output,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+    )
+
+def flush_runs() -> None:
+    """Write all buffered run records in a single transaction."""
+    with _run_buffer_lock:
+        if not _run_buffer:
+            return
+        pending = dict(_run_buffer)
+        _run_buffer.clear()
+    sess = Session()
+    try:
+        existing = {
+            m.id: m for m in
+            sess.query(TaskRunModel).filter(TaskRunModel.id.in_(pending.keys())).all()
+        }
+        for run_id, fields in pending.items():
+            model = existing.get(run_id)
+            if model is None:
+                model = TaskRunModel(id=run_id)
+                sess.add(model)
+            for k, v in fields.items():
+                setattr(model, k, v)
+            if model.finished_at and model.started_at and model.latency_ms is None:
+                model.latency_ms = int((model.finished_at - model.started_at).total_seconds() * 1000)
+        sess.commit()
+        logger.debug(f"Flushed {len(pending)} task run records")
+    except Exception as e:
+        sess.rollback()
+        logger.error(f"Failed to flush task run records: {e}", exc_info=True)
+        # Put records back so the next flush retries them, without clobbering newer updates
+        with _run_buffer_lock:
+            for run_id, fields in pending.items():
+                _run_buffer[run_id] = {**fields, **_run_buffer.get(run_id, {})}
+    finally:
+        sess.close()
+
+def list_runs(session_id: str, task_id: str | None = None, limit: int = 20,
+              cursor: tuple[datetime, str] | None = None) -> list[TaskRun]:
+    """Return runs newest first, paginated by `cursor`.
+
+    The cursor is the exclusive `(started_at, id)` of the last run of the previous
+    page; the id keeps runs that started in the same instant from being skipped.
+    """
+    flush_runs()
+    sess = Session()
+    query = sess.query(TaskRunModel).filter(TaskRunModel.session_id == session_id)
+    if task_id:
+        query = query.filter(TaskRunModel.task_id == task_id)
+    if cursor:
+        started_at, run_id = cursor
+        query = query.filter(or_(
+            TaskRunModel.started_at < started_at,
+            and_(TaskRunModel.started_at == started_at, TaskRunModel.id < run_id),
+        ))
+    models = query.order_by(TaskRunModel.started_at.desc(), TaskRunModel.id.desc()).limit(limit).all()
+    runs = [_to_run(m) for m in models]
+    sess.close()
+    return runs
+
+def _remove_job(task_id: str) -> None:
+    job_id = f"task_{task_id}"
     try:
         scheduler.remove_job(job_id)
         logger.info(f"Removed existing scheduled job: {job_id}")
     except Exception as ex:
         logger.debug(f"No existing job to remove for {job_id}: {ex}")
+
+def _schedule_job(task: Task):
+    job_id = f"task_{task.id}"
+    if not task.enabled:
+        logger.info(f"Not scheduling disabled task {task.id}")
+        _remove_job(task.id)
+        return
+    # An existing job is overwritten in place by add_job(replace_existing=True)
     # Date or cron?
     try:
         dt = None
-        tz = ZoneInfo(user_tz)
-        logger.info(f"Scheduling job_id={job_id} for task_id={task.id} (cron/iso={task.cron}) in timezone={user_tz}")
-        if croniter.is_valid(task.cron):
-            trigger = CronTrigger.from_crontab(task.cron, timezone=tz)
-            dt = croniter(task.cron, datetime.now(tz)).get_next(datetime)
+        tz = ZoneInfo(task.timezone)
+        logger.info(f"Scheduling job_id={job_id} for task_id={task.id} (cron/iso={task.cron}) in timezone={task.timezone}")
+        trigger = _trigger_for(task.cron, task.timezone)
+        if isinstance(trigger, CronTrigger):
+            dt = _cron_iter(task.cron, datetime.now(tz), task.timezone).get_next(datetime)
             logger.info(f"CronTrigger: cron='{task.cron}', next_run_time={dt.isoformat()} (tz={tz})")
         else:
-            dt = dtparser.parse(task.cron)
-            if dt.tzinfo is None:
-                dt = dt.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz)
-                logger.debug(f"Parsed ISO as UTC, converted to tz={tz}: {dt.isoformat()}")
-            else:
-                dt = dt.astimezone(tz)
-                logger.debug(f"Parsed ISO as tz-aware, converted to tz={tz}: {dt.isoformat()}")
-            trigger = DateTrigger(run_date=dt, timezone=tz)
+            dt = trigger.run_date
             logger.info(f"DateTrigger: run_date={dt.isoformat()} (tz={tz})")
+        # Textual reference so the job pickles the same way from the web app and the worker
         scheduler.add_job(
-            lambda: _fire_task(task.id),
+            "src.scheduler:_fire_task",
             trigger,
+            args=[task.id],
             id=job_id,
             replace_existing=True,
         )
@@ -113,6 +375,13 @@ def _schedule_job(task: Task, user_tz: str = "UTC"):
     except Exception as e:
         logger.error(f"Failed to schedule task {task.id}: {e}", exc_info=True)
 
+def _reconcile_jobs(tasks: list[Task], removed_ids: list[str]) -> None:
+    """Bring the job store in line with a set of changed tasks in a single pass."""
+    for task_id in removed_ids:
+        _remove_job(task_id)
+    for task in tasks:
+        _schedule_job(task)
+
 def _fire_task(task_id: str):
     sess = Session()
     model = sess.query(TaskModel).filter_by(id=task_id).first()
@@ -121,36 +390,65 @@ def _fire_task(task_id: str):
         return
     task = _to_task(model)
     url = os.getenv("SELF_ROOT", "http://127.0.0.1:5001") + "/send_message"
+    run_id = uuid.uuid4().hex
+    record_run(run_id, task_id=task.id, session_id=task.session_id,
+               started_at=datetime.utcnow(), status="running")
+    # The run may finish in another process, which must find the row to update
+    flush_runs()
     try:
-        resp = requests.post(url, json={"message": task.message, "session_id": task.session_id}, timeout=5)
+        resp = requests.post(url, json={"message": task.message, "session_id": task.session_id,
+                                        "task_id": task.id, "task_run_id": run_id,
+                                        "cache_responses": task.cache_responses},
+                             timeout=5)
         logger.info(f"Scheduled task {task.id} fired: {resp.status_code}")
-        # Log to sent.log
-        with open(SENT_LOG, "a") as f:
-            f.write(f"{datetime.utcnow().isoformat()}\t{task.id}\n")
-        # Emit SSE event (optional, via Flask app context)
+        if resp.status_code == 429:
+            finish_run(run_id, "rejected", output=resp.text)
+        elif resp.status_code >= 400:
+            finish_run(run_id, "failed", output=resp.text)
+        # Otherwise the agent run reports completion through finish_run
         # Recompute next_run
-        if croniter.is_valid(task.cron):
-            next_run = croniter(task.cron, datetime.utcnow()).get_next(datetime)
-        else:
-            next_run = None
-        model.next_run = next_run
+        model.next_run = _next_run(task.cron, task.timezone) if _is_cron(task.cron) else None
         model.updated_at = datetime.utcnow()
         sess.commit()
     except Exception as e:
         logger.error(f"Failed to POST scheduled task {task.id}: {e}")
+        finish_run(run_id, "failed", output=str(e))
     finally:
         sess.close()
 
+def list_tasks_with_etag(session_id: str) -> tuple[list[Task], str]:
+    """Return the session's tasks and an ETag of their content, served from cache when unchanged.
+
+    Every write sets `updated_at` (deletes lower the count), so its aggregates,
+    read through the session index, identify the listing in every process. The
+    sum catches rewrites that do not raise the maximum, e.g. of rows stored in
+    local time before timestamps were kept in UTC.
+    """
+    table = TaskModel.__table__
+    with engine.connect() as conn:
+        version = tuple(conn.execute(
+            select(func.count(), func.max(table.c.updated_at), func.total(func.julianday(table.c.updated_at)))
+            .where(table.c.session_id == session_id)
+        ).one())
+        with _task_cache_lock:
+            cached = _task_cache.get(session_id)
+        if cached and cached[0] == version:
+            return cached[1], cached[2]
+        # Project columns straight into dataclasses instead of hydrating ORM objects
+        rows = conn.execute(select(table).where(table.c.session_id == session_id)).all()
+    tasks = [Task(**row._asdict()) for row in rows]
+    etag = hashlib.sha1(json.dumps([t.__dict__ for t in tasks], default=str).encode()).hexdigest()
+    with _task_cache_lock:
+        _task_cache[session_id] = (version, tasks, etag)
+    return tasks, etag
+
 def list_tasks(session_id: str) -> list[Task]:
-    sess = Session()
-    models = sess.query(TaskModel).filter_by(session_id=session_id).all()
-    tasks = [_to_task(m) for m in models]
-    sess.close()
-    return tasks
+    return list_tasks_with_etag(session_id)[0]
 
 def create_task(session_id: str, data: dict, tz: str = "UTC") -> Task:
     logger.debug(f"User timezone: {tz}")
-    now = datetime.now(ZoneInfo(tz))
+    # Timestamps are naive UTC everywhere, so max(updated_at) orders writes for the ETag
+    now = datetime.utcnow()
     task_id = uuid.uuid4().hex
     cron = data["cron"]
     logger.info(f"Creating task: id={task_id} session={session_id} cron={cron} tz={tz} message={data['message']}")
@@ -159,12 +457,8 @@ def create_task(session_id: str, data: dict, tz: str = "UTC") -> Task:
     logger.debug(f"User timezone: {tz}")
     logger.debug(f"Initial time (UTC): {now.isoformat()}")
     logger.debug(f"Cron expression: {cron}")
-    if croniter.is_valid(cron):
-        next_run = croniter(cron, now).get_next(datetime)
-        logger.info(f"Cron valid, computed next_run: {next_run.isoformat()}")
-    else:
-        next_run = dtparser.parse(cron)
-        logger.info(f"Non-cron input, parsed next_run: {next_run.isoformat()}")
+    next_run = _next_run(cron, tz)
+    logger.info(f"Computed next_run (UTC): {next_run.isoformat()}")
     model = TaskModel(
         id=task_id,
         session_id=session_id,
@@ -172,6 +466,8 @@ def create_task(session_id: str, data: dict, tz: str = "UTC") -> Task:
         cron=cron,
         next_run=next_run,
         enabled=data.get("enabled", True),
+        cache_responses=data.get("cache_responses", False),
+        timezone=tz,
         created_at=now,
         updated_at=now,
     )
@@ -180,12 +476,13 @@ def create_task(session_id: str, data: dict, tz: str = "UTC") -> Task:
     sess.commit()
     logger.info(f"Task committed to DB: id={model.id}, next_run={model.next_run.isoformat()}")
     task = _to_task(model)
-    _schedule_job(task, tz)
+    _schedule_job(task)
     logger.info(f"Scheduled job for task: id={task.id}, cron={task.cron}, next_run={task.next_run.isoformat()}, tz={tz}")
     sess.close()
     return task
 
-def update_task(task_id: str, patch: dict, tz: str = "UTC", session_id: str = None) -> Task:
+def update_task(task_id: str, patch: dict, tz: str | None = None, session_id: str = None) -> Task:
+    """Apply `patch` to a task; `tz`, if given, becomes the task's timezone."""
     sess = Session()
     model = sess.query(TaskModel).filter_by(id=task_id).first()
     if not model:
@@ -194,18 +491,15 @@ def update_task(task_id: str, patch: dict, tz: str = "UTC", session_id: str = No
     for k, v in patch.items():
         if hasattr(model, k):
             setattr(model, k, v)
-    # Recompute next_run if cron or enabled changed
-    if "cron" in patch or "enabled" in patch:
-        now = datetime.utcnow()
-        cron = model.cron
-        if croniter.is_valid(cron):
-            model.next_run = croniter(cron, now).get_next(datetime)
-        else:
-            model.next_run = dtparser.parse(cron)
+    if tz:
+        model.timezone = tz
+    # Recompute next_run if cron, enabled or timezone changed
+    if "cron" in patch or "enabled" in patch or tz:
+        model.next_run = _next_run(model.cron, model.timezone or "UTC")
     model.updated_at = datetime.utcnow()
     sess.commit()
     task = _to_task(model)
-    _schedule_job(task, tz)
+    _schedule_job(task)
     sess.close()
     return task
 
@@ -221,12 +515,301 @@ def delete_task(task_id: str) -> None:
             pass
     sess.close()
 
-def bootstrap(app):
+def timeline(session_id: str, start: datetime, end: datetime, tz: str = "UTC",
+             limit: int = 500) -> list[dict]:
+    """Upcoming fire times of all enabled tasks of a session within [start, end).
+
+    Each task's schedule is expanded in its own timezone and reported in `tz`.
+    Per-task iterators are merged lazily, so a frequent cron expression costs
+    no more than `limit` evaluations.
+    """
+    tasks = [t for t in list_tasks(session_id) if t.enabled]
+    merged = heapq.merge(*(_fire_times(t, start, end, tz) for t in tasks))
+    return [{"task_id": task_id, "time": when.isoformat()}
+            for when, task_id in itertools.islice(merged, limit)]
+
+# --- Batch operations ---
+TASK_FIELDS = ("message", "cron", "enabled", "cache_responses", "timezone")
+
+class BatchValidationError(ValueError):
+    """Raised when any operation of a batch is invalid; nothing is written."""
+    def __init__(self, errors: list[dict]):
+        super().__init__(f"{len(errors)} invalid operation(s)")
+        self.errors = errors
+
+def _validate_schedule(cron: str) -> None:
+    if not isinstance(cron, str):
+        raise ValueError("cron must be a string")
+    if _is_cron(cron):
+        return
+    try:
+        _parse_date(cron)
+    except (ValueError, OverflowError) as e:
+        raise ValueError(f"Invalid cron expression or ISO date: {cron!r}") from e
+
+def is_timezone(name) -> bool:
+    if not isinstance(name, str) or not name:
+        return False
+    try:
+        ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return False
+    return True
+
+def _op_error(op, create_ids: set) -> str | None:
+    """What is wrong with the shape of one batch op, checked before the database is touched."""
+    if not isinstance(op, dict):
+        return "Each op must be an object"
+    kind = op.get("op")
+    if kind not in ("create", "update", "delete"):
+        return f"Unknown op: {kind!r}"
+    if kind != "create" and not isinstance(op.get("id"), str):
+        return "id must be a string"
+    fields = op.get("task", {})
+    if not isinstance(fields, dict):
+        return "task must be an object"
+    if kind == "create":
+        if not fields.get("message") or not fields.get("cron"):
+            return "message and cron are required"
+        if "id" in fields:
+            if not isinstance(fields["id"], str) or not fields["id"]:
+                return "task id must be a non-empty string"
+            if fields["id"] in create_ids:
+                return f"Task id appears in more than one create: {fields['id']}"
+            create_ids.add(fields["id"])
+    if "message" in fields and not isinstance(fields["message"], str):
+        return "message must be a string"
+    for flag in ("enabled", "cache_responses"):
+        if flag in fields and not isinstance(fields[flag], bool):
+            return f"{flag} must be true or false"
+    if "timezone" in fields and not is_timezone(fields["timezone"]):
+        return f"Unknown timezone: {fields['timezone']!r}"
+    if "cron" in fields:
+        try:
+            _validate_schedule(fields["cron"])
+        except ValueError as e:
+            return str(e)
+    return None
+
+def batch_tasks(session_id: str, ops: list[dict], tz: str = "UTC") -> list[dict]:
+    """Apply create/update/delete operations atomically.
+
+    Each op is `{"op": "create", "task": {...}}`, `{"op": "update", "id": ..., "task": {...}}`
+    or `{"op": "delete", "id": ...}`. Every op is validated before anything is written;
+    all writes share one transaction and the job store is reconciled once afterwards.
+    """
+    create_ids: set[str] = set()
+    errors = []
+    for i, op in enumerate(ops):
+        error = _op_error(op, create_ids)
+        if error:
+            errors.append({"index": i, "error": error})
+    if errors:
+        raise BatchValidationError(errors)
+
+    ref_ids = {op["id"] for op in ops if op["op"] in ("update", "delete")}
+    sess = Session()
+    try:
+        owned = {
+            m.id: m for m in sess.query(TaskModel).filter(
+                TaskModel.id.in_(ref_ids), TaskModel.session_id == session_id)
+        } if ref_ids else {}
+        taken = {
+            row[0] for row in sess.query(TaskModel.id).filter(TaskModel.id.in_(create_ids))
+        } if create_ids else set()
+
+        for i, op in enumerate(ops):
+            if op["op"] != "create" and op["id"] not in owned:
+                errors.append({"index": i, "error": "Task not found"})
+            elif op["op"] == "create" and op.get("task", {}).get("id") in taken:
+                errors.append({"index": i, "error": f"Task id already exists: {op['task']['id']}"})
+        if errors:
+            raise BatchValidationError(errors)
+
+        now = datetime.utcnow()
+        results: list[tuple[str, TaskModel | str]] = []
+        removed: list[str] = []
+        for op in ops:
+            kind = op["op"]
+            fields = op.get("task") or {}
+            if kind == "create":
+                model = TaskModel(
+                    id=fields.get("id") or uuid.uuid4().hex,
+                    session_id=session_id,
+                    message=fields["message"],
+                    cron=fields["cron"],
+                    next_run=_next_run(fields["cron"], fields.get("timezone", tz)),
+                    enabled=fields.get("enabled", True),
+                    cache_responses=fields.get("cache_responses", False),
+                    timezone=fields.get("timezone", tz),
+                    created_at=now,
+                    updated_at=now,
+                )
+                sess.add(model)
+                results.append((kind, model))
+            elif kind == "update":
+                model = owned[op["id"]]
+                for k in TASK_FIELDS:
+                    if k in fields:
+                        setattr(model, k, fields[k])
+                if "cron" in fields or "enabled" in fields or "timezone" in fields:
+                    model.next_run = _next_run(model.cron, model.timezone or "UTC")
+                model.updated_at = now
+                results.append((kind, model))
+            else:
+                sess.delete(owned[op["id"]])
+                removed.append(op["id"])
+                results.append((kind, op["id"]))
+        # Snapshot before commit expires the ORM objects
+        response = [
+            {"op": kind, "id": target, "deleted": True} if kind == "delete"
+            else {"op": kind, "task": _to_task(target).__dict__}
+            for kind, target in results
+        ]
+        tasks = {
+            target.id: _to_task(target) for kind, target in results
+            if kind != "delete" and target.id not in removed
+        }
+        sess.commit()
+        logger.info(f"Batch applied for session={session_id}: {len(ops)} op(s)")
+    except Exception:
+        sess.rollback()
+        raise
+    finally:
+        sess.close()
+    _reconcile_jobs(list(tasks.values()), removed)
+    return response
+
+def import_tasks(session_id: str, records, tz: str = "UTC") -> list[dict]:
+    """Import task records (e.g. parsed NDJSON lines) as one batch.
+
+    Records whose `id` belongs to this session update that task; all others are created.
+    """
+    records = list(records)
+    ids = [r.get("id") for r in records if r.get("id")]
+    sess = Session()
+    existing = {
+        row[0] for row in sess.query(TaskModel.id).filter(
+            TaskModel.id.in_(ids), TaskModel.session_id == session_id)
+    } if ids else set()
+    sess.close()
+    ops = []
+    for record in records:
+        fields = {k: record[k] for k in ("id", *TASK_FIELDS) if k in record}
+        if record.get("id") in existing:
+            fields.pop("id")
+            ops.append({"op": "update", "id": record["id"], "task": fields})
+        else:
+            ops.append({"op": "create", "task": fields})
+    return batch_tasks(session_id, ops, tz)
+
+def iter_tasks(session_id: str, batch_size: int = 500):
+    """Yield a session's tasks without loading them all at once."""
+    table = TaskModel.__table__
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(
+            select(table).where(table.c.session_id == session_id).order_by(table.c.created_at))
+        for row in result:
+            yield Task(**row._asdict())
+
+# --- Leader election ---
+def _try_acquire_lease() -> bool:
+    """Take or renew the dispatcher lease. Returns True if this process holds it."""
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=LEASE_TTL_SECONDS)
+    with jobstore_engine.begin() as conn:
+        result = conn.execute(
+            update(scheduler_lease)
+            .where(scheduler_lease.c.name == LEASE_NAME)
+            .where(or_(scheduler_lease.c.holder == INSTANCE_ID, scheduler_lease.c.expires_at < now))
+            .values(holder=INSTANCE_ID, expires_at=expires_at)
+        )
+        if result.rowcount:
+            return True
+    try:
+        with jobstore_engine.begin() as conn:
+            conn.execute(insert(scheduler_lease).values(
+                name=LEASE_NAME, holder=INSTANCE_ID, expires_at=expires_at))
+        return True
+    except IntegrityError:
+        # Someone else holds a live lease
+        return False
+
+def _release_lease() -> None:
+    try:
+        with jobstore_engine.begin() as conn:
+            conn.execute(delete(scheduler_lease)
+                         .where(scheduler_lease.c.name == LEASE_NAME)
+                         .where(scheduler_lease.c.holder == INSTANCE_ID))
+    except Exception as e:
+        logger.debug(f"Failed to release scheduler lease: {e}")
+
+def _renew_leadership() -> None:
+    global _is_leader
+    try:
+        leader = _try_acquire_lease()
+    except Exception as e:
+        logger.error(f"Scheduler lease check failed: {e}")
+        leader = False
+    if leader and not _is_leader:
+        logger.info(f"Acquired scheduler lease ({INSTANCE_ID}); dispatching jobs")
+        scheduler.resume()
+    elif not leader and _is_leader:
+        logger.warning(f"Lost scheduler lease ({INSTANCE_ID}); pausing dispatch")
+        scheduler.pause()
+    elif leader:
+        # Pick up jobs added by other processes since the last wakeup
+        scheduler.wakeup()
+    _is_leader = leader
+
+def _start(dispatch: bool) -> None:
     Base.metadata.create_all(engine)
-    # Schedule all enabled tasks
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    # ...and drop the ones they replaced
+    with engine.begin() as conn:
+        for name in ("ix_task_runs_task_started", "ix_task_runs_session_started"):
+            conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+    # ...and columns added since the table was created
+    columns = {c["name"] for c in inspect(engine).get_columns("tasks")}
+    if "cache_responses" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN cache_responses BOOLEAN DEFAULT 0"))
+    if "timezone" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE tasks ADD COLUMN timezone VARCHAR DEFAULT 'UTC'"))
+    lease_metadata.create_all(jobstore_engine)
+    scheduler.start(paused=True)
+    # Add jobs missing from the persistent store (e.g. tasks created before it existed);
+    # existing jobs are left alone so their misfire state survives restarts.
     sess = Session()
     for model in sess.query(TaskModel).filter_by(enabled=True).all():
-        _schedule_job(_to_task(model))
+        if scheduler.get_job(f"task_{model.id}") is None:
+            _schedule_job(_to_task(model))
     sess.close()
-    scheduler.start()
-    logger.info("Scheduler started")
+    housekeeping.add_job(flush_runs, "interval", seconds=RUN_FLUSH_SECONDS,
+                         id="flush_task_runs", replace_existing=True)
+    if dispatch:
+        housekeeping.add_job(_renew_leadership, "interval", seconds=LEASE_RENEW_SECONDS,
+                             id="renew_leadership", next_run_time=datetime.now(),
+                             replace_existing=True)
+        atexit.register(_release_lease)
+    atexit.register(flush_runs)
+    housekeeping.start()
+    logger.info(f"Scheduler started (instance={INSTANCE_ID}, dispatch={dispatch})")
+
+def bootstrap(app):
+    _start(dispatch=SCHEDULER_ROLE != "api")
+
+def run_worker() -> None:
+    """Run the scheduler as a standalone dispatcher process."""
+    _start(dispatch=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Scheduler worker stopping")
+        housekeeping.shutdown(wait=False)
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,13 @@
+"""Standalone scheduler worker.
+
+Run with `python -m src.scheduler_worker` next to web processes started with
+SCHEDULER_ROLE=api so that task dispatch does not depend on the web server.
+"""
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from src.scheduler import run_worker
+
+if __name__ == "__main__":
+    run_worker()
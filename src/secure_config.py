@@ -1,4 +1,5 @@
 import os
+import threading
 from pathlib import Path
 from cryptography.fernet import Fernet
 import json
@@ -6,6 +7,13 @@ import base64
 from typing import Optional, Tuple
 
 class SecureConfig:
+    """Encrypted Telegram credentials.
+
+    The pepper and key are read once at startup. Decrypted credentials are cached
+    in memory together with the file's mtime and size, so repeated lookups only
+    stat the file and decrypt again only after it changes.
+    """
+
     def __init__(self):
         self.pepper_path = Path("/etc/alex-ai-agent/pepper")
         self.credentials_path = Path.home() / ".alex-ai-agent" / "credentials.enc"
@@ -22,6 +30,11 @@ class SecureConfig:
         
         # Load or generate encryption key
         self._load_or_generate_key()
+        self._fernet = Fernet(self.key)
+        self._pepper = self._read_pepper()
+        self._lock = threading.Lock()
+        # ((st_mtime_ns, st_size), decrypted credentials) of the file last read
+        self._cache: Optional[Tuple[Tuple[int, int], Optional[Tuple[int, str]]]] = None
     
     def _load_or_generate_key(self):
         """Load or generate the encryption key."""
@@ -35,19 +48,24 @@ class SecureConfig:
                 f.write(self.key)
             key_path.chmod(0o600)  # Only owner can read/write
     
-    def _get_pepper(self) -> bytes:
+    def _read_pepper(self) -> bytes:
         """Read the server-only pepper."""
         try:
             with open(self.pepper_path, "r") as f:
                 return f.read().strip().encode()
         except FileNotFoundError:
             print(f"Warning: Pepper file not found at {self.pepper_path}")
-            # Generate a temporary pepper if the file doesn't exist
+            # Generate a temporary pepper if the file doesn't exist; it lasts for
+            # this process only, so credentials saved with it do not survive a restart
             return os.urandom(32)  # 32 bytes = 256 bits
+
+    def _get_pepper(self) -> bytes:
+        """Return the pepper read at startup."""
+        return self._pepper
     
     def _encrypt_credentials(self, api_id: int, api_hash: str) -> str:
         """Encrypt credentials with pepper."""
-        f = Fernet(self.key)
+        f = self._fernet
         data = json.dumps({
             "api_id": api_id,
             "api_hash": api_hash
@@ -59,11 +77,13 @@ class SecureConfig:
     def _decrypt_credentials(self, encrypted_data: str) -> Optional[Tuple[int, str]]:
         """Decrypt credentials and verify pepper."""
         try:
-            f = Fernet(self.key)
-            decrypted = f.decrypt(encrypted_data.encode())
+            decrypted = self._fernet.decrypt(encrypted_data.encode())
+            pepper = self._get_pepper()
+            if not decrypted.endswith(pepper):
+                print("Error decrypting credentials: pepper mismatch")
+                return None
             # Remove pepper from the end
-            data = decrypted[:-len(self._get_pepper())]
-            creds = json.loads(data)
+            creds = json.loads(decrypted[:-len(pepper)])
             return creds["api_id"], creds["api_hash"]
         except Exception as e:
             print(f"Error decrypting credentials: {e}")
@@ -73,26 +93,40 @@ class SecureConfig:
         """Save encrypted credentials to file."""
         try:
             encrypted = self._encrypt_credentials(api_id, api_hash)
-            with open(self.credentials_path, "w") as f:
-                f.write(encrypted)
+            with self._lock:
+                with open(self.credentials_path, "w") as f:
+                    f.write(encrypted)
+                self._cache = (self._stamp(), (api_id, api_hash))
             return True
         except Exception as e:
             print(f"Error saving credentials: {e}")
             return False
     
-    def load_credentials(self) -> Optional[Tuple[int, str]]:
-        """Load and decrypt credentials from file."""
-        if not self.credentials_path.exists():
-            return None
+    def _stamp(self) -> Optional[Tuple[int, int]]:
         try:
-            with open(self.credentials_path, "r") as f:
-                encrypted = f.read()
-                if not encrypted:  # Empty file
-                    return None
-            return self._decrypt_credentials(encrypted)
-        except Exception as e:
-            print(f"Error loading credentials: {e}")
+            stat = self.credentials_path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load_credentials(self) -> Optional[Tuple[int, str]]:
+        """Load and decrypt credentials, from memory unless the file changed."""
+        stamp = self._stamp()
+        if stamp is None:
             return None
+        cache = self._cache
+        if cache is not None and cache[0] == stamp:
+            return cache[1]
+        with self._lock:
+            try:
+                with open(self.credentials_path, "r") as f:
+                    encrypted = f.read()
+                creds = self._decrypt_credentials(encrypted) if encrypted else None  # Empty file
+            except Exception as e:
+                print(f"Error loading credentials: {e}")
+                return None
+            self._cache = (stamp, creds)
+            return creds
     
     def credentials_exist(self) -> bool:
         """Check if credentials exist and are valid."""
@@ -1,5 +1,12 @@
-from flask import Blueprint, request, jsonify, session
-from src.scheduler import list_tasks, create_task, update_task, delete_task
+from flask import Blueprint, request, jsonify, session, Response, stream_with_context
+from src.scheduler import (
+    list_tasks_with_etag, create_task, update_task, delete_task, list_runs,
+    batch_tasks, import_tasks, iter_tasks, BatchValidationError, timeline, is_timezone,
+)
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import json
+from dateutil import parser as dtparser
 import os
 from flask_login import login_required as _login_required
 import logging
@@ -19,7 +26,33 @@ tasks_bp = Blueprint("tasks_bp", __name__)
 @login_required
 def get_tasks():
     session_id = session["session_id"]
-    return jsonify([t.__dict__ for t in list_tasks(session_id)])
+    tasks, etag = list_tasks_with_etag(session_id)
+    if request.if_none_match.contains(etag):
+        return '', 304, {"ETag": f'"{etag}"', "Cache-Control": "no-cache"}
+    resp = jsonify([t.__dict__ for t in tasks])
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+@tasks_bp.route("/tasks/timeline", methods=["GET"])
+@login_required
+def get_timeline():
+    """Fire times of all the session's tasks between ?from= and ?to= (default: next 7 days)."""
+    session_id = session["session_id"]
+    tz = request.args.get("timezone", "UTC")
+    try:
+        zone = ZoneInfo(tz)
+        start = request.args.get("from")
+        start = dtparser.isoparse(start) if start else datetime.now(zone)
+        end = request.args.get("to")
+        end = dtparser.isoparse(end) if end else start + timedelta(days=7)
+        start = start if start.tzinfo else start.replace(tzinfo=zone)
+        end = end if end.tzinfo else end.replace(tzinfo=zone)
+        limit = min(max(int(request.args.get("limit", 500)), 1), 5000)
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid timeline parameter: {e}"}), 400
+    events = timeline(session_id, start, end, tz, limit)
+    return jsonify({"from": start.isoformat(), "to": end.isoformat(), "events": events})
 
 @tasks_bp.route("/tasks", methods=["POST"])
 @login_required
@@ -39,7 +72,8 @@ def post_task():
 def put_task(task_id):
     session_id = session["session_id"]
     patch = request.get_json()
-    tz = patch.get("timezone", "UTC")
+    # Without a timezone the task keeps the one it was created with
+    tz = patch.get("timezone")
     t = update_task(task_id, patch, tz, session_id)
     return jsonify(t.__dict__)
 
@@ -48,3 +82,86 @@ def put_task(task_id):
 def delete_task_route(task_id):
     delete_task(task_id)
     return '', 204
+
+@tasks_bp.route("/tasks:batch", methods=["POST"])
+@login_required
+def batch_tasks_route():
+    session_id = session["session_id"]
+    data = request.get_json() or {}
+    ops = data.get("ops")
+    if not isinstance(ops, list):
+        return jsonify({"error": "ops must be a list"}), 400
+    tz = data.get("timezone", "UTC")
+    if not is_timezone(tz):
+        return jsonify({"error": f"Unknown timezone: {tz!r}"}), 400
+    try:
+        results = batch_tasks(session_id, ops, tz)
+    except BatchValidationError as e:
+        return jsonify({"error": str(e), "errors": e.errors}), 400
+    return jsonify({"results": results})
+
+@tasks_bp.route("/tasks:import", methods=["POST"])
+@login_required
+def import_tasks_route():
+    """Import NDJSON (one task object per line), read from the request stream."""
+    session_id = session["session_id"]
+    tz = request.args.get("timezone", "UTC")
+    if not is_timezone(tz):
+        return jsonify({"error": f"Unknown timezone: {tz!r}"}), 400
+    records, errors = [], []
+    for lineno, line in enumerate(request.stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            errors.append({"line": lineno, "error": f"Invalid JSON: {e}"})
+            continue
+        if not isinstance(record, dict):
+            errors.append({"line": lineno, "error": "Expected a JSON object"})
+            continue
+        records.append(record)
+    if errors:
+        return jsonify({"error": f"{len(errors)} invalid line(s)", "errors": errors}), 400
+    try:
+        results = import_tasks(session_id, records, tz)
+    except BatchValidationError as e:
+        return jsonify({"error": str(e), "errors": e.errors}), 400
+    return jsonify({"imported": len(results), "results": results})
+
+@tasks_bp.route("/tasks:export", methods=["GET"])
+@login_required
+def export_tasks_route():
+    session_id = session["session_id"]
+
+    def generate():
+        for task in iter_tasks(session_id):
+            yield json.dumps(task.__dict__, default=lambda o: o.isoformat()) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson",
+                    headers={"Content-Disposition": "attachment; filename=tasks.ndjson"})
+
+def _runs_page(session_id: str, task_id: str | None = None):
+    try:
+        limit = min(max(int(request.args.get("limit", 20)), 1), 100)
+        # Opaque to clients: "<started_at>|<run id>" of the last run on the previous page
+        cursor = request.args.get("cursor")
+        if cursor:
+            started_at, _, run_id = cursor.rpartition("|")
+            cursor = (dtparser.isoparse(started_at), run_id)
+    except ValueError as e:
+        return jsonify({"error": f"Invalid pagination parameter: {e}"}), 400
+    runs = list_runs(session_id, task_id=task_id, limit=limit, cursor=cursor)
+    next_cursor = f"{runs[-1].started_at.isoformat()}|{runs[-1].id}" if len(runs) == limit else None
+    return jsonify({"runs": [r.__dict__ for r in runs], "next_cursor": next_cursor})
+
+@tasks_bp.route("/tasks/<task_id>/runs", methods=["GET"])
+@login_required
+def get_task_runs(task_id):
+    return _runs_page(session["session_id"], task_id)
+
+@tasks_bp.route("/runs", methods=["GET"])
+@login_required
+def get_runs():
+    return _runs_page(session["session_id"])
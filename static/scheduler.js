@@ -14,6 +14,7 @@ const previewPill = document.getElementById('previewPill');
 const submitBtn = document.getElementById('submitBtn');
 const msgInput = document.getElementById('msg');
 const enabledInput = document.getElementById('enabled');
+const cacheResponsesInput = document.getElementById('cacheResponses');
 
 function getDtIso() {
   if (!dateInput.value || !timeInput.value) return null;
@@ -148,10 +149,14 @@ function rruleToCron(rruleObj, dtIso) {
   return `${getMinutes(dtIso)} ${getHours(dtIso)} * * *`;
 }
 
+let lastTasks = [];
+
 async function fetchTasks() {
+  // The server sends an ETag with Cache-Control: no-cache, so the browser
+  // revalidates and unchanged lists come back as 304 from its HTTP cache.
   const res = await fetch('/api/tasks');
-  const tasks = await res.json();
-  renderTasks(tasks);
+  lastTasks = await res.json();
+  renderTasks(lastTasks);
 }
 
 function renderTasks(tasks) {
@@ -165,6 +170,7 @@ function renderTasks(tasks) {
       <td><input type="checkbox" ${t.enabled ? 'checked' : ''} onchange="updateTask('${t.id}', {enabled:this.checked})"></td>
       <td>
         <button onclick="editTask('${t.id}')">Edit</button>
+        <button onclick="showRuns('${t.id}')">Runs</button>
         <button onclick="deleteTask('${t.id}')">Delete</button>
       </td>
     </tr>`;
@@ -173,6 +179,48 @@ function renderTasks(tasks) {
   document.getElementById('taskTableWrap').innerHTML = html;
 }
 
+let runsTaskId = null;
+let runsNextCursor = null;
+
+window.showRuns = async function(id, append = false) {
+  const params = new URLSearchParams({limit: 20});
+  if (append && runsNextCursor) params.set('cursor', runsNextCursor);
+  const res = await fetch(`/api/tasks/${id}/runs?${params}`);
+  const page = await res.json();
+  runsTaskId = id;
+  runsNextCursor = page.next_cursor;
+  renderRuns(page.runs, append);
+}
+
+// Run fields include model and tool output; never let them be parsed as markup
+function escapeHtml(value) {
+  return String(value ?? '').replace(/[&<>"']/g, c => ({'&':'&amp;','<':'&lt;','>':'&gt;','"':'&quot;',"'":'&#39;'}[c]));
+}
+
+function renderRuns(runs, append) {
+  const wrap = document.getElementById('runsWrap');
+  let rows = '';
+  for (const r of runs) {
+    const tokens = r.input_tokens != null ? `${r.input_tokens} / ${r.output_tokens}` : '';
+    rows += `<tr>
+      <td>${escapeHtml(new Date(r.started_at).toLocaleString())}</td>
+      <td>${escapeHtml(r.status)}</td>
+      <td>${r.latency_ms != null ? escapeHtml((r.latency_ms / 1000).toFixed(1) + 's') : ''}</td>
+      <td>${escapeHtml(tokens)}</td>
+      <td>${escapeHtml(r.output)}</td>
+    </tr>`;
+  }
+  if (append) {
+    wrap.querySelector('table').insertAdjacentHTML('beforeend', rows);
+  } else {
+    wrap.innerHTML = `<h3>Runs for ${escapeHtml(runsTaskId.slice(0,8))}</h3><table class="task-table"><tr><th>Started</th><th>Status</th><th>Latency</th><th>Tokens (in / out)</th><th>Output</th></tr>${rows}</table>`;
+  }
+  wrap.querySelector('.more-runs')?.remove();
+  if (runsNextCursor) {
+    wrap.insertAdjacentHTML('beforeend', `<button class="more-runs" onclick="showRuns('${runsTaskId}', true)">Load more</button>`);
+  }
+}
+
 window.updateTask = async function(id, patch) {
   await fetch(`/api/tasks/${id}`, {method:'PUT',headers:{'Content-Type':'application/json'},body:JSON.stringify(patch)});
   fetchTasks();
@@ -185,12 +233,11 @@ window.deleteTask = async function(id) {
 }
 
 window.editTask = async function(id) {
-  const res = await fetch('/api/tasks');
-  const tasks = await res.json();
-  const t = tasks.find(x=>x.id===id);
+  const t = lastTasks.find(x=>x.id===id);
   if (!t) return;
   msgInput.value = t.message;
   enabledInput.checked = t.enabled;
+  cacheResponsesInput.checked = !!t.cache_responses;
   // Parse cron or ISO
   if (/^\d{4}-\d{2}-\d{2}T/.test(t.cron)) {
     // ISO
@@ -237,6 +284,7 @@ document.getElementById('taskForm').onsubmit = async function(e) {
   e.preventDefault();
   const msg = msgInput.value;
   const enabled = enabledInput.checked;
+  const cache_responses = cacheResponsesInput.checked;
   const dtIso = getDtIso();
   let cronOrIso = '';
   switch (recurrenceRule) {
@@ -261,7 +309,7 @@ document.getElementById('taskForm').onsubmit = async function(e) {
   }
   if (!cronOrIso) return;
   const userTz = Intl.DateTimeFormat().resolvedOptions().timeZone;
-  const data = {message:msg, cron:cronOrIso, enabled, timezone: userTz };
+  const data = {message:msg, cron:cronOrIso, enabled, cache_responses, timezone: userTz };
   if (editMode && editingTaskId) {
     await fetch(`/api/tasks/${editingTaskId}`, {method:'PUT',headers:{'Content-Type':'application/json'},body:JSON.stringify(data)});
     editMode = false; editingTaskId = null;